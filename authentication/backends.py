@@ -0,0 +1,133 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from leads.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def token_cache_key(key):
+    # Raw token keys never appear in the cache. v2: the entry is the user's
+    # id and is_active flag, not the pickled Token and User.
+    return f'auth:token:v2:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_token_cache():
+    return caches[settings.AUTH_TOKEN_CACHE]
+
+
+def forget_token(key):
+    """Drop a token from the cache; called whenever it is deleted or its user changes."""
+    try:
+        get_token_cache().delete(token_cache_key(key))
+    except Exception as exc:
+        logger.warning(f'Could not evict token from the cache: {str(exc)}')
+
+
+class CachedUser(SimpleLazyObject):
+    """
+    The user of a cached token. ``pk``, ``id`` and ``is_active`` come from
+    the cache, so permission checks need no query; anything else loads the
+    user from the database on first use.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, is_active):
+        super().__init__(lambda: get_user_model()._default_manager.get(pk=user_id))
+        self.__dict__.update(pk=user_id, id=user_id, is_active=is_active)
+
+    def __bool__(self):
+        # `request.user and request.user.is_authenticated` (IsAuthenticated)
+        return True
+
+
+def cache_entry(user):
+    return {'user_id': user.pk, 'is_active': user.is_active}
+
+
+class TokenKeyParser(TokenAuthentication):
+    """Parses the Authorization header like TokenAuthentication but returns the key."""
+
+    def authenticate_credentials(self, key):
+        return key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps the token's user id and is_active flag
+    in the cache for AUTH_TOKEN_CACHE_TIMEOUT seconds, so an authenticated
+    request does not query the database. Nothing else about the user (the
+    password hash in particular) is cached.
+
+    The entry is evicted when the token is deleted (logout, password change,
+    admin) or its user is saved (deactivation, password reset). With the
+    Redis cache the eviction reaches every web process. If the cache is
+    unavailable the token is checked against the database as usual.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        try:
+            entry = get_token_cache().get(cache_key)
+        except Exception as exc:
+            logger.warning(f'Token cache unavailable: {str(exc)}')
+            record_cache_lookup('auth_token', 'error')
+            return super().authenticate_credentials(key)
+        record_cache_lookup('auth_token', 'hit' if entry is not None else 'miss')
+        if entry is not None:
+            return self.cached_credentials(key, entry)
+
+        user, token = super().authenticate_credentials(key)
+        try:
+            get_token_cache().set(cache_key, cache_entry(user), timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        except Exception as exc:
+            logger.warning(f'Could not cache token: {str(exc)}')
+        return user, token
+
+    async def aauthenticate(self, request):
+        """authenticate() for the async lead views (leads.async_views)."""
+        key = TokenKeyParser().authenticate(request)
+        if key is None:
+            return None
+        cache_key = token_cache_key(key)
+        try:
+            entry = await get_token_cache().aget(cache_key)
+        except Exception as exc:
+            logger.warning(f'Token cache unavailable: {str(exc)}')
+            record_cache_lookup('auth_token', 'error')
+            return await self.alookup(key)
+        record_cache_lookup('auth_token', 'hit' if entry is not None else 'miss')
+        if entry is not None:
+            return self.cached_credentials(key, entry)
+
+        user, token = await self.alookup(key)
+        try:
+            await get_token_cache().aset(cache_key, cache_entry(user), timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        except Exception as exc:
+            logger.warning(f'Could not cache token: {str(exc)}')
+        return user, token
+
+    def cached_credentials(self, key, entry):
+        if not entry['is_active']:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        # request.auth: the token without its row; token.user would query.
+        return CachedUser(entry['user_id'], entry['is_active']), self.get_model()(key=key, user_id=entry['user_id'])
+
+    async def alookup(self, key):
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
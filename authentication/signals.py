@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .backends import forget_token
+
+
+def evict(key, using):
+    forget_token(key)
+    # Again after commit, in case a concurrent request re-cached the token
+    # before the change became visible.
+    transaction.on_commit(lambda: forget_token(key), using=using)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, using, **kwargs):
+    evict(instance.key, using)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def evict_user_tokens(sender, instance, created, using, update_fields=None, **kwargs):
+    if created or update_fields == frozenset(['last_login']):
+        return
+    for key in Token.objects.using(using).filter(user=instance).values_list('key', flat=True):
+        evict(key, using)
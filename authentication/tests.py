@@ -1,3 +1,83 @@
 from django.test import TestCase
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from unittest import mock
+from asgiref.sync import async_to_sync
+from .backends import CachedTokenAuthentication, token_cache_key
 
-# Create your tests here.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_CACHE_TIMEOUT=0)
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def token_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('lead-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query for query in queries.captured_queries if 'authtoken_token' in query['sql']]
+
+    def test_token_is_checked_once(self):
+        self.assertEqual(len(self.token_queries()), 1)
+        self.assertEqual(self.token_queries(), [])
+        self.assertIsNotNone(cache.get(token_cache_key(self.token.key)))
+
+    def test_cache_holds_only_user_id_and_is_active(self):
+        self.token_queries()
+        self.assertEqual(cache.get(token_cache_key(self.token.key)), {'user_id': self.user.id, 'is_active': True})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('lead-list')).status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries.captured_queries if 'auth_user' in query['sql']])
+
+    def test_async_lookup_caches_the_same_entry(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        authenticate = async_to_sync(CachedTokenAuthentication().aauthenticate)
+
+        self.assertEqual(authenticate(request)[0], self.user)
+        self.assertEqual(cache.get(token_cache_key(self.token.key)), {'user_id': self.user.id, 'is_active': True})
+        with self.assertNumQueries(0):
+            user, token = authenticate(request)
+            self.assertEqual((user.pk, user.is_authenticated, token.key), (self.user.id, True, self.token.key))
+
+    def test_logout_evicts_token(self):
+        self.token_queries()
+        response = self.client.post(reverse('logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        response = self.client.get(reverse('lead-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_change_password_evicts_old_token(self):
+        self.token_queries()
+        response = self.client.post(reverse('change_password'), {
+            'old_password': 'testpass', 'new_password': 'new-password-123',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('lead-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['new_token']}")
+        self.assertEqual(self.client.get(reverse('lead-list')).status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_is_rejected(self):
+        self.token_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('lead-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_errors_fall_back_to_database(self):
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError('redis down')):
+            self.assertEqual(len(self.token_queries()), 1)
@@ -0,0 +1,155 @@
+"""
+Throughput and latency of lead intake and list reads under gunicorn sync
+workers vs uvicorn workers serving the async views (LEAD_ASYNC_API).
+
+Both servers run as subprocesses against the benchmark database, with the
+same number of worker processes, and send the intake emails synchronously
+to a local SMTP sink that answers after --smtp-delay ms (a remote relay).
+A sync worker is blocked for the whole SMTP exchange; an async worker keeps
+serving other requests meanwhile.
+
+    python -m benchmarks.asgi_intake --workers 4 --concurrency 64 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import benchmark_database, summarize
+
+from aiosmtpd.controller import Controller  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from leads.models import Lead  # noqa: E402
+
+SERVERS = {
+    'gunicorn (sync workers)': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'lead_managment_app.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+    ],
+    'uvicorn (async views)': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'lead_managment_app.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+    ],
+}
+
+
+class SlowSinkHandler:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def database_url():
+    db = connection.settings_dict
+    return f"postgresql://{db['USER']}:{db['PASSWORD']}@{db['HOST'] or 'localhost'}:{db['PORT'] or 5432}/{db['NAME']}"
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'{base_url}/api/leads/', timeout=1)
+        except urllib.error.HTTPError:
+            return  # 401: the app is answering
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not start')
+
+
+def load(base_url, token, requests, concurrency):
+    """Half intake POSTs, half list GETs; returns (requests per second, latency samples in ms)."""
+    def one(i):
+        if i % 2:
+            request = urllib.request.Request(
+                f'{base_url}/api/leads/?page_size=20', headers={'Authorization': f'Token {token}'})
+        else:
+            body = json.dumps({'first_name': 'Bench', 'last_name': 'Lead', 'email': f'{uuid.uuid4().hex}@example.com'})
+            request = urllib.request.Request(
+                f'{base_url}/api/leads/', data=body.encode(), headers={'Content-Type': 'application/json'})
+        started = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    return requests / (time.perf_counter() - started), samples
+
+
+def run(name, args, env, token):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(SERVERS[name](port, args.workers), env=env)
+    try:
+        wait_until_up(base_url)
+        load(base_url, token, args.concurrency, args.concurrency)  # warm up every worker
+        return load(base_url, token, args.requests, args.concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+        Lead.objects.all().delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--smtp-delay', type=float, default=50, help='milliseconds per message')
+    args = parser.parse_args()
+
+    smtp_port = free_port()
+    controller = Controller(SlowSinkHandler(args.smtp_delay / 1000), hostname='127.0.0.1', port=smtp_port)
+    controller.start()
+    results = {}
+    try:
+        with benchmark_database():
+            user = User.objects.create_user(username='bench', password='bench')
+            token = Token.objects.create(user=user).key
+            env = {
+                **os.environ,
+                'DATABASE_URL': database_url(),
+                'DB_CONN_MAX_AGE': '0',
+                'CACHE_BACKEND': 'locmem',
+                'LEAD_CACHE_TIMEOUT': '0',  # every list read goes to the database
+                'LEAD_EMAIL_DELIVERY': 'sync',
+                'EMAIL_HOST': '127.0.0.1',
+                'EMAIL_PORT': str(smtp_port),
+                'EMAIL_USE_TLS': 'False',
+                'EMAIL_HOST_USER': '',
+            }
+            for name in SERVERS:
+                results[name] = run(name, args, env, token)
+            connection.close()
+    finally:
+        controller.stop()
+
+    for name, (throughput, samples) in results.items():
+        stats = summarize(samples)
+        print(f"{name:<25} {throughput:8.1f} req/s  p50 {stats['p50']:7.1f} ms  "
+              f"p95 {stats['p95']:7.1f} ms  p99 {stats['p99']:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
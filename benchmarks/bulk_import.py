@@ -0,0 +1,42 @@
+"""
+Time a bulk import of N generated leads through LeadImporter.
+
+    python -m benchmarks.bulk_import --rows 100000
+"""
+import argparse
+import io
+import time
+
+from benchmarks.utils import benchmark_database
+
+from django.conf import settings  # noqa: E402
+
+from leads.importer import LeadImporter, parse_rows  # noqa: E402
+
+
+def generate_csv(rows):
+    lines = ['first_name,last_name,email']
+    lines.extend(f'First{n},Last{n},lead{n}@example.com' for n in range(rows))
+    return io.BytesIO(('\n'.join(lines) + '\n').encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--chunk-size', type=int, default=settings.LEAD_IMPORT_CHUNK_SIZE)
+    parser.add_argument('--send-emails', action='store_true')
+    args = parser.parse_args()
+
+    with benchmark_database():
+        stream = generate_csv(args.rows)
+        importer = LeadImporter(chunk_size=args.chunk_size, send_emails=args.send_emails)
+        started = time.perf_counter()
+        result = importer.run(parse_rows(stream, 'csv'))
+        elapsed = time.perf_counter() - started
+
+    print(f"imported {result['created']} rows ({result['failed']} rejected) "
+          f"in {elapsed:.1f}s = {result['created'] / elapsed:,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
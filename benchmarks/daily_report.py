@@ -0,0 +1,58 @@
+"""
+Daily lead report build time on a large table: the old three COUNT queries
+filtered with created_at__date vs one conditional aggregate over a half-open
+range, 30-day totals from Lead vs from the LeadDailyStats rollup, and the
+rollup-backed stats endpoint.
+
+    python -m benchmarks.daily_report --leads 2000000
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.utils import benchmark_database, generate_leads, summarize, timed
+
+from django.utils import timezone  # noqa: E402
+
+from leads.models import Lead  # noqa: E402
+from leads.stats import build_daily_report, day_bounds, intake_stats, lead_counts, reconcile_stats, rollup_counts, stats_window  # noqa: E402
+
+
+def three_queries(day):
+    leads = Lead.objects.filter(created_at__date=day)
+    return leads.count(), leads.filter(state='PENDING').count(), leads.filter(state='REACHED_OUT').count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=2000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        started = time.perf_counter()
+        generate_leads(args.leads)
+        print(f'Generated {args.leads} leads in {time.perf_counter() - started:.1f} s')
+        started = time.perf_counter()
+        rows = reconcile_stats()
+        print(f"Built {rows['day']} daily and {rows['hour']} hourly rollup rows in {time.perf_counter() - started:.1f} s")
+
+        day = timezone.localdate() - datetime.timedelta(days=1)
+        month_start = day - datetime.timedelta(days=29)
+        cases = {
+            'day: 3 queries, created_at__date': lambda: three_queries(day),
+            'day: 1 aggregate, half-open range': lambda: lead_counts(*day_bounds(day)),
+            '30 days: aggregate over Lead': lambda: lead_counts(*day_bounds(month_start, day)),
+            '30 days: LeadDailyStats rollup': lambda: rollup_counts(month_start, day),
+            'full daily report': lambda: build_daily_report(day),
+            'stats endpoint: 30 days by day': lambda: intake_stats(*stats_window('day'), 'day'),
+            'stats endpoint: 24 hours by hour': lambda: intake_stats(*stats_window('hour'), 'hour'),
+        }
+        results = {name: summarize(timed(func, args.repeat)) for name, func in cases.items()}
+
+    for name, stats in results.items():
+        print(f"{name:<36} p50 {stats['p50']:8.2f} ms  p95 {stats['p95']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
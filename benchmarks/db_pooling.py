@@ -0,0 +1,53 @@
+"""
+Latency of GET /api/leads/{id}/ with a new database connection per request
+vs a persistent connection (CONN_MAX_AGE > 0).
+
+Run it against the same kind of database the app uses: the gap grows with
+connection setup cost (TCP + TLS to a remote host).
+
+    python -m benchmarks.db_pooling --requests 500
+"""
+import argparse
+
+from benchmarks.utils import benchmark_database, summarize, timed
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from leads.models import Lead  # noqa: E402
+
+
+def run(client, url, conn_max_age, requests):
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    client.get(url)  # warm up
+    return summarize(timed(lambda: client.get(url), requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        user = User.objects.create_user(username='bench', password='bench')
+        token = Token.objects.create(user=user)
+        lead = Lead.objects.create(first_name='Bench', last_name='Lead', email='bench@example.com')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        url = f'/api/leads/{lead.pk}/'
+
+        results = {
+            'new connection per request (CONN_MAX_AGE=0)': run(client, url, 0, args.requests),
+            'persistent connection (CONN_MAX_AGE=60)': run(client, url, 60, args.requests),
+        }
+        connection.close()
+
+    for name, stats in results.items():
+        print(f"{name:<45} p50 {stats['p50']:6.2f} ms  p95 {stats['p95']:6.2f} ms  p99 {stats['p99']:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
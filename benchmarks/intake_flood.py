@@ -0,0 +1,105 @@
+"""
+Latency of legitimate lead submissions while one client floods
+POST /api/leads/ with resume uploads, with and without the intake limits
+(leads.throttling).
+
+Legitimate clients each submit from their own IP at a steady pace; the
+flood comes from a single IP as fast as its threads can send. Requests go
+through the full Django stack in-process, one thread per client. Run it
+with Redis as the cache (the default) so the limits behave as in production.
+
+    python -m benchmarks.intake_flood --duration 30 --flood-threads 16
+"""
+import argparse
+import itertools
+import threading
+import time
+
+from benchmarks.utils import benchmark_database, summarize
+
+from django.core.cache import cache  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.client import BOUNDARY, encode_multipart  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from leads.models import Lead  # noqa: E402
+
+LIMITS_OFF = {'LEAD_CREATE_IP_RATE': '', 'LEAD_CREATE_EMAIL_RATE': '', 'LEAD_CREATE_MAX_CONCURRENCY': 0}
+LIMITS_ON = {'LEAD_CREATE_IP_RATE': '20/m', 'LEAD_CREATE_EMAIL_RATE': '5/h', 'LEAD_CREATE_MAX_CONCURRENCY': 16}
+
+# Not the test client's MULTIPART_CONTENT, which would make it encode the body again.
+FLOOD_CONTENT_TYPE = f'multipart/form-data;boundary={BOUNDARY}'
+
+emails = itertools.count()
+
+
+def legitimate(ip, pace, stop, samples):
+    client = Client(raise_request_exception=False)
+    while not stop.is_set():
+        data = {'first_name': 'Bench', 'last_name': 'Lead', 'email': f'lead{next(emails)}@example.com'}
+        started = time.perf_counter()
+        if client.post('/api/leads/', data, REMOTE_ADDR=ip).status_code == 201:
+            samples.append((time.perf_counter() - started) * 1000)
+        time.sleep(pace)
+    connection.close()
+
+
+def flood(body, stop, counts):
+    client = Client(raise_request_exception=False)
+    while not stop.is_set():
+        code = client.post('/api/leads/', body, content_type=FLOOD_CONTENT_TYPE, REMOTE_ADDR='203.0.113.66').status_code
+        counts[code] = counts.get(code, 0) + 1
+    connection.close()
+
+
+def run(args, limits, with_flood):
+    cache.clear()
+    stop = threading.Event()
+    samples, counts = [], {}
+    # Encoded once, so the flood threads spend their time sending.
+    body = encode_multipart(BOUNDARY, {
+        'first_name': 'Flood', 'last_name': 'Bot', 'email': 'bot@example.com',
+        'resume': SimpleUploadedFile('resume.pdf', b'%PDF-1.4 ' + b'x' * (args.resume_kb * 1024)),
+    })
+    threads = [threading.Thread(target=legitimate, args=(f'198.51.100.{i}', args.pace, stop, samples))
+               for i in range(1, args.clients + 1)]
+    if with_flood:
+        threads += [threading.Thread(target=flood, args=(body, stop, counts)) for _ in range(args.flood_threads)]
+    with override_settings(**limits):
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    Lead.objects.all().delete()
+    return summarize(samples), len(samples), counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=30, help='seconds per scenario')
+    parser.add_argument('--clients', type=int, default=4, help='legitimate clients')
+    # 3 seconds keeps a legitimate client within the 20/m per-IP rate.
+    parser.add_argument('--pace', type=float, default=3.0, help='seconds between submissions of a legitimate client')
+    parser.add_argument('--flood-threads', type=int, default=16)
+    parser.add_argument('--resume-kb', type=int, default=1024, help='resume size sent by the flood')
+    args = parser.parse_args()
+
+    with benchmark_database():
+        scenarios = {
+            'no flood': run(args, LIMITS_OFF, with_flood=False),
+            'flood, no limits': run(args, LIMITS_OFF, with_flood=True),
+            'flood, limits on': run(args, LIMITS_ON, with_flood=True),
+        }
+
+    for name, (stats, accepted, counts) in scenarios.items():
+        flood_summary = ', '.join(f'{code}: {n}' for code, n in sorted(counts.items())) or '-'
+        print(f"{name:<18} legitimate p50 {stats['p50']:7.1f} ms  p95 {stats['p95']:7.1f} ms  "
+              f"p99 {stats['p99']:7.1f} ms  ({accepted} accepted)  flood responses {flood_summary}")
+
+
+if __name__ == '__main__':
+    main()
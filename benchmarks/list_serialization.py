@@ -0,0 +1,62 @@
+"""
+Lead list rows per second: LeadListSerializer and JSONRenderer vs the
+read-optimized path (list_values, list_data and ORJSONRenderer).
+
+"query + render" times reading a page from the database and rendering it;
+"render" times only turning an already fetched page into JSON bytes.
+
+    python -m benchmarks.list_serialization --page-size 200 --repeat 200
+"""
+import argparse
+
+from benchmarks.utils import benchmark_database, generate_leads, summarize, timed
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from leads.models import Lead  # noqa: E402
+from leads.renderers import ORJSONRenderer  # noqa: E402
+from leads.serializers import LeadListSerializer, list_data, list_values  # noqa: E402
+
+
+def serializer_render(page):
+    return JSONRenderer().render({'results': LeadListSerializer(page, many=True).data})
+
+
+def fast_render(page):
+    return ORJSONRenderer().render({'results': list_data(page)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=10_000)
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        generate_leads(args.leads)
+        leads = Lead.objects.order_by('-created_at', '-id')
+        instances = list(leads[:args.page_size])
+        rows = list(list_values(leads)[:args.page_size])
+        assert serializer_render(instances) == fast_render(rows)
+
+        results = {
+            'serializer': {
+                'query + render': timed(lambda: serializer_render(list(leads[:args.page_size])), args.repeat),
+                'render': timed(lambda: serializer_render(instances), args.repeat),
+            },
+            'values + orjson': {
+                'query + render': timed(lambda: fast_render(list(list_values(leads)[:args.page_size])), args.repeat),
+                'render': timed(lambda: fast_render(rows), args.repeat),
+            },
+        }
+
+    for name, stages in results.items():
+        for stage, samples in stages.items():
+            stats = summarize(samples)
+            print(f"{name:<16} {stage:<15} {args.page_size / stats['mean'] * 1000:>10,.0f} rows/s  "
+                  f"p50 {stats['p50']:6.2f} ms  p95 {stats['p95']:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Lead list page latency at increasing depth: keyset cursor vs OFFSET.
+
+    python -m benchmarks.pagination --leads 1000000
+"""
+import argparse
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.utils import benchmark_database, generate_leads, summarize, timed
+
+from rest_framework.pagination import LimitOffsetPagination  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from leads.models import Lead  # noqa: E402
+from leads.pagination import LeadCursorPagination  # noqa: E402
+from leads.serializers import LeadListSerializer  # noqa: E402
+
+factory = APIRequestFactory()
+
+
+def offset_page(depth, page_size):
+    request = Request(factory.get('/api/leads/', {'limit': page_size, 'offset': depth}))
+    paginator = LimitOffsetPagination()
+    page = paginator.paginate_queryset(Lead.objects.order_by('-created_at', '-id'), request)
+    return paginator.get_paginated_response(LeadListSerializer(page, many=True).data)
+
+
+def keyset_cursor(depth, page_size):
+    """Build the cursor a client would hold after paging down to ``depth``."""
+    if depth == 0:
+        return {}
+    anchor = Lead.objects.order_by('-created_at', '-id')[depth - 1]
+    paginator = LeadCursorPagination()
+    paginator.base_url = 'http://testserver/api/leads/'
+    link = paginator.encode_cursor(anchor, reverse=False)
+    return {'cursor': parse_qs(urlsplit(link).query)['cursor'][0]}
+
+
+def keyset_page(params, page_size):
+    request = Request(factory.get('/api/leads/', {'page_size': page_size, **params}))
+    paginator = LeadCursorPagination()
+    page = paginator.paginate_queryset(Lead.objects.all(), request)
+    return paginator.get_paginated_response(LeadListSerializer(page, many=True).data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=1_000_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        generate_leads(args.leads)
+        depths = [0, 1_000, 10_000, 100_000, args.leads // 2, args.leads - args.page_size]
+        print(f'{"depth":>10} {"offset p50 ms":>14} {"keyset p50 ms":>14}')
+        for depth in sorted(set(d for d in depths if 0 <= d < args.leads)):
+            offset = summarize(timed(lambda: offset_page(depth, args.page_size), args.repeat))
+            params = keyset_cursor(depth, args.page_size)
+            keyset = summarize(timed(lambda: keyset_page(params, args.page_size), args.repeat))
+            print(f'{depth:>10} {offset["p50"]:>14.2f} {keyset["p50"]:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Resume full-text search latency on synthetic resumes: the GIN-indexed
+tsvector search (rank + snippets for one page) vs an ILIKE scan of the text.
+
+    python -m benchmarks.resume_search --resumes 100000
+"""
+import argparse
+import time
+
+from benchmarks.utils import benchmark_database, generate_leads, summarize, timed
+
+from django.db import connection  # noqa: E402
+
+from leads.models import ResumeDocument  # noqa: E402
+from leads.search import add_snippets, backfill_index, search_resumes  # noqa: E402
+
+SKILLS = [
+    'python', 'django', 'postgresql', 'java', 'spring', 'kotlin', 'react', 'typescript', 'kubernetes',
+    'terraform', 'litigation', 'contracts', 'negotiation', 'compliance', 'immigration', 'paralegal',
+    'accounting', 'marketing', 'sales', 'recruiting', 'leadership', 'agile', 'scrum', 'design',
+]
+FILLER = [
+    'experience', 'years', 'team', 'project', 'managed', 'developed', 'client', 'support', 'senior',
+    'worked', 'with', 'and', 'the', 'responsible', 'for', 'delivered', 'improved', 'process',
+]
+QUERIES = ['python', 'python django', '"contracts negotiation"', 'immigration -litigation', 'kotlin terraform']
+
+
+def generate_resumes(count, words):
+    """
+    One processed ResumeDocument per lead of ``words`` random words, weighted
+    so that each skill appears in roughly 5% of the resumes.
+    """
+    generate_leads(count)
+    vocabulary = SKILLS + FILLER * 300
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO leads_resumedocument
+                (lead_id, idempotency_key, file_name, status, checksum, backup_name, text,
+                 metadata, error, attempts, created_at)
+            SELECT lead.id, lead.id || ':bench.pdf', 'resumes/bench.pdf', 'DONE', '', '',
+                   (SELECT string_agg((%s::text[])[1 + floor(random() * %s)::int], ' ')
+                    FROM generate_series(1, %s) AS word WHERE lead.id > 0),
+                   '{}', '', 1, now()
+            FROM leads_lead AS lead
+            """,
+            [vocabulary, len(vocabulary), words],
+        )
+
+
+def ilike_scan(*terms):
+    documents = ResumeDocument.objects.all()
+    for term in terms:
+        documents = documents.filter(text__icontains=term)
+    return list(documents.order_by('-id').values_list('id', flat=True)[:20])
+
+
+def ranked_page(text):
+    return add_snippets(search_resumes(text, limit=20), text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--resumes', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        started = time.perf_counter()
+        generate_resumes(args.resumes, args.words)
+        print(f'Generated {args.resumes} resumes in {time.perf_counter() - started:.1f} s')
+        started = time.perf_counter()
+        indexed = backfill_index(chunk_size=5000, workers=4)
+        print(f'Indexed {indexed} resumes in {time.perf_counter() - started:.1f} s')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE leads_resumedocument')
+
+        results = {}
+        for text in QUERIES:
+            results[f'tsvector: {text}'] = summarize(timed(lambda: ranked_page(text), args.repeat))
+        results['ILIKE scan: kotlin terraform'] = summarize(
+            timed(lambda: ilike_scan('kotlin', 'terraform'), max(args.repeat // 4, 1)))
+
+    for name, stats in results.items():
+        print(f"{name:<38} p50 {stats['p50']:8.2f} ms  p95 {stats['p95']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Messages per second: one SMTP connection per email vs the batched mailer.
+
+Runs against a local aiosmtpd server, so TLS and network latency are not
+included; against a real relay the gap is larger.
+
+    python -m benchmarks.smtp_delivery --messages 500 --batch-size 100
+"""
+import argparse
+import os
+import socket
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lead_managment_app.settings')
+django.setup()
+
+from aiosmtpd.controller import Controller  # noqa: E402
+from django.core.mail import EmailMessage, get_connection, send_mail  # noqa: E402
+
+from leads.mailer import BatchMailer  # noqa: E402
+
+
+class SinkHandler:
+    async def handle_DATA(self, server, session, envelope):
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def bench_per_message(count, smtp):
+    started = time.perf_counter()
+    for i in range(count):
+        send_mail(f'Lead {i}', 'body', 'noreply@example.com', ['attorney@example.com'],
+                  connection=get_connection(**smtp))
+    return count / (time.perf_counter() - started)
+
+
+def bench_batched(count, smtp, batch_size):
+    mailer = BatchMailer(connection=get_connection(**smtp))
+    messages = [EmailMessage(f'Lead {i}', 'body', 'noreply@example.com', ['attorney@example.com'])
+                for i in range(count)]
+    started = time.perf_counter()
+    for offset in range(0, count, batch_size):
+        mailer.send_batch(messages[offset:offset + batch_size])
+    mailer.close()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    port = free_port()
+    controller = Controller(SinkHandler(), hostname='127.0.0.1', port=port)
+    controller.start()
+    smtp = {
+        'backend': 'leads.email_backend.CustomEmailBackend',
+        'host': '127.0.0.1',
+        'port': port,
+        'use_tls': False,
+        'username': '',
+        'password': '',
+    }
+    try:
+        per_message = bench_per_message(args.messages, smtp)
+        batched = bench_batched(args.messages, smtp, args.batch_size)
+    finally:
+        controller.stop()
+
+    print(f'connection per message: {per_message:8.1f} msg/s')
+    print(f'batched mailer:         {batched:8.1f} msg/s ({batched / per_message:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Benchmark suite for the lead API: throughput and p50/p95/p99 latency of
+intake, list pages, lead detail, resume downloads, mark_reached_out, token
+login and the daily report task, written as JSON and optionally compared
+with a saved baseline.
+
+Runs in a throwaway test database on the configured PostgreSQL, with the
+configured Redis as the cache and a local SMTP stand-in (aiosmtpd) taking
+every email. Requests go through the full Django stack in-process, from
+``--concurrency`` threads. Data and request order come from ``--seed``, so
+two runs with the same arguments do the same work.
+
+    python -m benchmarks.suite --leads 100000 --output baseline.json
+    python -m benchmarks.suite --leads 100000 --baseline baseline.json --tolerance 0.2
+
+With ``--baseline`` the exit status is 1 when a scenario's throughput fell
+or its p95 latency rose by more than the tolerance, or when it had errors.
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.smtp_delivery import SinkHandler, free_port
+from benchmarks.utils import benchmark_database, generate_leads, generate_resumes, summarize
+
+from aiosmtpd.controller import Controller  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from leads.models import Lead  # noqa: E402
+from leads.stats import reconcile_stats  # noqa: E402
+from leads.tasks import send_daily_lead_report  # noqa: E402
+
+PASSWORD = 'bench-password'
+
+
+class Scenario:
+    """``request(client, i)`` makes the i-th request and returns its status code."""
+
+    def __init__(self, name, expected, request):
+        self.name = name
+        self.expected = expected
+        self.request = request
+
+
+def build_scenarios(args, lead_ids, resume_ids, token):
+    rng = random.Random(args.seed)
+    auth = {'HTTP_AUTHORIZATION': f'Token {token}'}
+    details = [rng.choice(lead_ids) for _ in range(args.requests)]
+    resumes = [rng.choice(resume_ids) for _ in range(args.requests)] if resume_ids else []
+    reached_out = rng.sample(lead_ids, min(args.requests, len(lead_ids)))
+
+    # Cursors of the first pages, walked once up front; request i reads page i % len(pages).
+    pages, url = [], f'/api/leads/?page_size={args.page_size}'
+    client = Client()
+    while url and len(pages) < args.requests:
+        pages.append(url)
+        url = client.get(url, **auth).json()['next']
+
+    def intake(client, i):
+        data = {'first_name': 'Bench', 'last_name': str(i), 'email': f'bench{i}@example.com'}
+        return client.post('/api/leads/', data).status_code
+
+    def daily_report(client, i):
+        send_daily_lead_report.apply(throw=True)
+        return 200
+
+    return [
+        Scenario('intake', 201, intake),
+        Scenario('list', 200, lambda client, i: client.get(pages[i % len(pages)], **auth).status_code),
+        Scenario('detail', 200, lambda client, i: client.get(f'/api/leads/{details[i]}/', **auth).status_code),
+        Scenario('resume_download', 200, lambda client, i: download(client, f'/api/leads/{resumes[i]}/resume/', auth)),
+        Scenario('mark_reached_out', 200, lambda client, i: client.post(
+            f'/api/leads/{reached_out[i % len(reached_out)]}/mark_reached_out/', **auth).status_code),
+        Scenario('token_login', 200, lambda client, i: client.post(
+            '/api/auth/login/', {'username': 'bench', 'password': PASSWORD}, content_type='application/json').status_code),
+        Scenario('daily_report', 200, daily_report),
+    ]
+
+
+def download(client, url, auth):
+    response = client.get(url, **auth)
+    if response.streaming:
+        b''.join(response.streaming_content)
+        response.close()
+    return response.status_code
+
+
+def run(scenario, requests, concurrency, warmup):
+    """
+    Make ``warmup`` untimed requests, then ``requests`` from ``concurrency``
+    threads; return the latencies (ms), the errors and the elapsed seconds.
+    """
+    client = Client(raise_request_exception=False)
+    for i in range(min(warmup, requests)):
+        scenario.request(client, i)
+    cache.clear()
+    samples, errors = [], []
+    indexes = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        client = Client(raise_request_exception=False)
+        while True:
+            with lock:
+                i = next(indexes, None)
+            if i is None:
+                break
+            started = time.perf_counter()
+            try:
+                code = scenario.request(client, i)
+            except Exception as exc:
+                code = type(exc).__name__
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples.append(elapsed)
+                if code != scenario.expected:
+                    errors.append(code)
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - started
+
+
+def report(samples, errors, seconds):
+    stats = summarize(samples)
+    return {
+        'requests': len(samples),
+        'errors': len(errors),
+        'throughput': len(samples) / seconds,
+        'p50_ms': stats['p50'],
+        'p95_ms': stats['p95'],
+        'p99_ms': stats['p99'],
+        'mean_ms': stats['mean'],
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a line per regression against ``baseline``; scenarios missing from either side are skipped."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['errors']:
+            regressions.append(f"{name}: {result['errors']} errors")
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput']:.1f}/s, baseline {base['throughput']:.1f}/s")
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms, baseline {base['p95_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=100_000)
+    parser.add_argument('--resumes', type=int, default=1_000, help='leads that get a resume')
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests before each scenario')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenarios', help='comma-separated subset, e.g. list,detail')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed fractional change before failing')
+    args = parser.parse_args()
+
+    port = free_port()
+    controller = Controller(SinkHandler(), hostname='127.0.0.1', port=port)
+    controller.start()
+    overrides = {
+        'EMAIL_BACKEND': 'leads.email_backend.CustomEmailBackend',
+        'EMAIL_HOST': '127.0.0.1',
+        'EMAIL_PORT': port,
+        'EMAIL_USE_TLS': False,
+        'EMAIL_USE_SSL': False,
+        'EMAIL_HOST_USER': '',
+        'EMAIL_HOST_PASSWORD': '',
+        'LEAD_EMAIL_DELIVERY': 'sync',
+        'LEAD_EMAIL_RATE_LIMIT': '',
+        # The suite measures the endpoints, not the intake limits.
+        'LEAD_CREATE_IP_RATE': '',
+        'LEAD_CREATE_EMAIL_RATE': '',
+        'LEAD_CREATE_MAX_CONCURRENCY': 0,
+    }
+    try:
+        with tempfile.TemporaryDirectory() as media_root, benchmark_database(), \
+                override_settings(MEDIA_ROOT=media_root, **overrides):
+            generate_leads(args.leads)
+            reconcile_stats()
+            resume_ids = generate_resumes(args.resumes)
+            lead_ids = list(Lead.objects.values_list('id', flat=True))
+            token = Token.objects.create(user=User.objects.create_user(username='bench', password=PASSWORD)).key
+
+            scenarios = build_scenarios(args, lead_ids, resume_ids, token)
+            if args.scenarios:
+                wanted = set(args.scenarios.split(','))
+                scenarios = [scenario for scenario in scenarios if scenario.name in wanted]
+            if not resume_ids:
+                scenarios = [scenario for scenario in scenarios if scenario.name != 'resume_download']
+            results = {}
+            for scenario in scenarios:
+                results[scenario.name] = report(*run(scenario, args.requests, args.concurrency, args.warmup))
+    finally:
+        controller.stop()
+
+    output = {
+        'meta': {
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'leads': args.leads,
+            'resumes': args.resumes,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'page_size': args.page_size,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('leads') != args.leads or baseline['meta'].get('concurrency') != args.concurrency:
+            print('warning: the baseline was run with different --leads or --concurrency', file=sys.stderr)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.baseline} (tolerance {args.tolerance:.0%})', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Queries and latency per authenticated request with DRF's TokenAuthentication
+vs CachedTokenAuthentication.
+
+    python -m benchmarks.token_auth --requests 500
+"""
+import argparse
+
+from benchmarks.utils import benchmark_database, summarize, timed
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings  # noqa: E402
+from rest_framework.authentication import TokenAuthentication  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from authentication.backends import CachedTokenAuthentication  # noqa: E402
+from leads.models import Lead  # noqa: E402
+from leads.views import LeadViewSet  # noqa: E402
+
+
+def run(client, url, authentication_class, requests):
+    LeadViewSet.authentication_classes = [authentication_class]
+    cache.clear()
+    client.get(url)  # warm up (and fill the token cache)
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+    return len(queries.captured_queries), summarize(timed(lambda: client.get(url), requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    # The lead response cache is off so only authentication differs.
+    with benchmark_database(), override_settings(LEAD_CACHE_TIMEOUT=0):
+        user = User.objects.create_user(username='bench', password='bench')
+        token = Token.objects.create(user=user)
+        lead = Lead.objects.create(first_name='Bench', last_name='Lead', email='bench@example.com')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        url = f'/api/leads/{lead.pk}/'
+
+        results = {
+            'TokenAuthentication': run(client, url, TokenAuthentication, args.requests),
+            'CachedTokenAuthentication': run(client, url, CachedTokenAuthentication, args.requests),
+        }
+
+    for name, (queries, stats) in results.items():
+        print(f"{name:<27} {queries} queries/request  p50 {stats['p50']:6.2f} ms  "
+              f"p95 {stats['p95']:6.2f} ms  p99 {stats['p99']:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
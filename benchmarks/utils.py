@@ -0,0 +1,100 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks never touch the configured database: they run inside a
+throwaway test database created and destroyed the same way the test
+runner does it.
+"""
+import contextlib
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lead_managment_app.settings')
+django.setup()
+
+from django.core.files.base import ContentFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from leads.models import Lead  # noqa: E402
+from leads.storage import resume_storage  # noqa: E402
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    # generate_leads() and the search migrations are PostgreSQL-only.
+    if connection.vendor != 'postgresql':
+        raise SystemExit(f'The benchmarks need PostgreSQL; DATABASE_URL points at {connection.vendor}.')
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def generate_leads(count, days=365):
+    """
+    Insert ``count`` synthetic leads spread over the last ``days`` days,
+    generated server-side so a million rows take seconds, not minutes.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO leads_lead (first_name, last_name, email, resume, resume_upload, state, created_at, updated_at)
+            SELECT 'First' || n, 'Last' || n, 'lead' || n || '@example.com', '', '',
+                   CASE WHEN n %% 3 = 0 THEN 'REACHED_OUT' ELSE 'PENDING' END,
+                   now() - (n %% (%s * 86400)) * interval '1 second',
+                   now()
+            FROM generate_series(1, %s) AS n
+            """,
+            [days, count],
+        )
+        cursor.execute('ANALYZE leads_lead')
+
+
+def generate_resumes(count):
+    """
+    Store ``count`` distinct small PDF resumes and attach them to the first
+    ``count`` leads. Returns the ids of those leads.
+    """
+    leads = list(Lead.objects.order_by('id')[:count])
+    for lead in leads:
+        content = f'%PDF-1.4\n% Resume of {lead.first_name} {lead.last_name}\n'.encode() + b'x' * 16 * 1024
+        lead.resume = resume_storage().save('resumes/resume.pdf', ContentFile(content))
+    Lead.objects.bulk_update(leads, ['resume'], batch_size=1000)
+    return [lead.pk for lead in leads]
+
+
+def timed(func, repeat):
+    """Run ``func`` ``repeat`` times and return the samples in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'mean': statistics.fmean(samples),
+    }
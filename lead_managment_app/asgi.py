@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lead_managment_app.settings')
+# Under ASGI every request runs its ORM calls in a thread of its own, so a
+# persistent connection would be left behind per thread: connect per request
+# (through PgBouncer in production) instead.
+os.environ.setdefault('LEAD_ASYNC_API', 'True')
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from leads import probes
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -37,8 +38,11 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('leads.urls')),
+    path('api/', include('leads.async_urls' if settings.LEAD_ASYNC_API else 'leads.urls')),
     path('api/auth/', include('authentication.urls')),
+    path('health/', probes.health, name='health'),
+    path('ready/', probes.ready, name='ready'),
+    path('metrics', probes.metrics_view, name='metrics'),
     
     # API Documentation
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Lead
+from .models import EmailOutbox, Lead, LeadDailyStats, LeadHourlyStats, ResumeBlob, ResumeDocument
 
 @admin.register(Lead)
 class LeadAdmin(admin.ModelAdmin):
@@ -7,4 +7,45 @@ class LeadAdmin(admin.ModelAdmin):
     list_filter = ('state', 'created_at')
     search_fields = ('first_name', 'last_name', 'email')
     readonly_fields = ('created_at', 'updated_at')
-    ordering = ('-created_at',)
\ No newline at end of file
+    ordering = ('-created_at',)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at')
+    ordering = ('-created_at',)
+
+@admin.register(LeadDailyStats)
+class LeadDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('day', 'state', 'count')
+    list_filter = ('state',)
+    date_hierarchy = 'day'
+    ordering = ('-day', 'state')
+
+
+@admin.register(LeadHourlyStats)
+class LeadHourlyStatsAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'state', 'count')
+    list_filter = ('state',)
+    date_hierarchy = 'hour'
+    ordering = ('-hour', 'state')
+
+
+@admin.register(ResumeDocument)
+class ResumeDocumentAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'lead', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('file_name', 'checksum')
+    readonly_fields = ('idempotency_key', 'checksum', 'size', 'backup_name', 'metadata',
+                       'created_at', 'started_at', 'processed_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(ResumeBlob)
+class ResumeBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'created_at', 'updated_at')
+    search_fields = ('name', 'checksum')
+    readonly_fields = ('name', 'checksum', 'size', 'ref_count', 'created_at', 'updated_at')
+    ordering = ('-created_at',)
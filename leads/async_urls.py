@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as viewset_urlpatterns
+
+# The async views take over these paths; everything else is LeadViewSet.
+urlpatterns = [
+    path('leads/', async_views.lead_list, name='lead-list'),
+    path('leads/<int:pk>/', async_views.lead_detail, name='lead-detail'),
+    path('leads/<int:pk>/resume/', async_views.lead_resume, name='lead-resume'),
+] + viewset_urlpatterns
@@ -0,0 +1,178 @@
+"""
+Async versions of the lead endpoints that spend most of their time waiting:
+intake (create, with the intake emails sent over aiosmtplib), the list, the
+detail view and the resume download. They are mounted ahead of the
+LeadViewSet routes by leads.async_urls when LEAD_ASYNC_API is on and the
+app is served by an ASGI server (uvicorn); every other method on these
+paths is handed to LeadViewSet in a worker thread.
+
+The responses, status codes, error bodies, cache entries and permissions
+are the same as LeadViewSet's.
+"""
+import functools
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from authentication.backends import CachedTokenAuthentication
+from .cache import aget_or_compute
+from .downloads import aserve_file, resume_filename
+from .emails import asend_intake_emails
+from .filters import LeadFilterBackend
+from .idempotency import REPLAYED, IdempotentRequest, apending_duplicate
+from .models import Lead
+from .pagination import LeadCursorPagination
+from .renderers import ORJSONRenderer
+from .serializers import LeadCreateSerializer, LeadDetailSerializer, list_data, list_values
+from .throttling import LeadCreateThrottle, acreate_slot, check_email_rate, ip_wait
+from .views import LeadViewSet, save_lead
+
+PARSERS = [JSONParser(), FormParser(), MultiPartParser()]
+
+lead_list_view = LeadViewSet.as_view({'get': 'list', 'post': 'create'})
+lead_detail_view = LeadViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None, renderer=None):
+    return HttpResponse((renderer or JSONRenderer()).render(data), status=status, content_type='application/json',
+                        headers=headers)
+
+
+def api_view(methods, fallback):
+    """
+    Run the async view for ``methods`` and pass any other method to the
+    sync ``fallback`` view. API errors are rendered the way DRF's default
+    exception handler renders them.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            try:
+                return await view(Request(request, parsers=PARSERS), *args, **kwargs)
+            except Http404:
+                return json_response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+            except exceptions.APIException as exc:
+                headers = {}
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    headers['WWW-Authenticate'] = CachedTokenAuthentication().authenticate_header(request)
+                if getattr(exc, 'wait', None):
+                    headers['Retry-After'] = str(math.ceil(exc.wait))
+                detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return json_response(detail, status=exc.status_code, headers=headers)
+        # What csrf_exempt does; the decorator only wraps sync views before Django 5.0.
+        # LeadViewSet (the fallback) checks CSRF for session users itself.
+        wrapper.csrf_exempt = True
+        # The same actions as the fallback, so metrics and query budgets
+        # (leads.query_budget) treat both alike.
+        wrapper.cls, wrapper.actions = fallback.cls, fallback.actions
+        return wrapper
+    return decorator
+
+
+async def authenticate(request):
+    """
+    Token authentication, then the session, as in DEFAULT_AUTHENTICATION_CLASSES.
+    Raises NotAuthenticated when neither identifies an active user.
+    """
+    result = await CachedTokenAuthentication().aauthenticate(request)
+    user = result[0] if result else await sync_to_async(get_user)(request._request)
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    request.user = user
+    return user
+
+
+@api_view({'GET', 'POST'}, lead_list_view)
+async def lead_list(request):
+    if request.method == 'POST':
+        return await create_lead(request)
+
+    await authenticate(request)
+
+    async def compute():
+        queryset = LeadFilterBackend().filter_queryset(request, Lead.objects.all(), None)
+        paginator = LeadCursorPagination()
+        page = await paginator.apaginate_queryset(list_values(queryset), request)
+        return paginator.get_paginated_data(list_data(page))
+
+    data, hit = await aget_or_compute('list', request, compute)
+    return json_response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'}, renderer=ORJSONRenderer())
+
+
+async def create_lead(request):
+    delay = await sync_to_async(ip_wait)(LeadCreateThrottle().get_ident(request))
+    if delay:
+        raise exceptions.Throttled(math.ceil(delay))
+    async with acreate_slot():
+        # Multipart bodies are parsed (and resumes spooled to disk) in a worker thread.
+        data = await sync_to_async(lambda: request.data)()
+        idempotent = IdempotentRequest(request)
+        stored = await idempotent.abegin()
+        if stored is not None:
+            return json_response(stored['data'], status=stored['status'], headers=REPLAYED)
+        try:
+            data, status_code = await save_new_lead(request, data)
+            await idempotent.afinish(status_code, data)
+            return json_response(data, status=status_code)
+        finally:
+            await idempotent.arelease()
+
+
+async def save_new_lead(request, data):
+    serializer = LeadCreateSerializer(data=data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    await sync_to_async(check_email_rate)(serializer.validated_data['email'])
+    duplicate = await apending_duplicate(serializer.validated_data['email'])
+    if duplicate is not None:
+        return LeadCreateSerializer(duplicate, context={'request': request}).data, status.HTTP_200_OK
+
+    if settings.LEAD_EMAIL_DELIVERY == 'outbox' or serializer.validated_data.get('resume'):
+        # One transaction for the lead, its outbox rows and the resume document.
+        lead = await sync_to_async(save_lead)(serializer)
+    else:
+        lead = await serializer.acreate()
+    if settings.LEAD_EMAIL_DELIVERY != 'outbox':
+        await asend_intake_emails(lead)
+    return serializer.data, status.HTTP_201_CREATED
+
+
+@api_view({'GET'}, lead_detail_view)
+async def lead_detail(request, pk):
+    await authenticate(request)
+
+    async def compute():
+        lead = await aget_lead(pk)
+        return LeadDetailSerializer(lead, context={'request': request}).data
+
+    data, hit = await aget_or_compute('detail', request, compute)
+    return json_response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+
+@api_view({'GET'}, LeadViewSet.as_view({'get': 'resume'}))
+async def lead_resume(request, pk):
+    await authenticate(request)
+    lead = await aget_lead(pk)
+    if not lead.resume:
+        return json_response({'detail': 'Resume not found'}, status=status.HTTP_404_NOT_FOUND)
+    return await aserve_file(request, lead.resume, filename=resume_filename(lead))
+
+
+async def aget_lead(pk):
+    try:
+        return await Lead.objects.aget(pk=pk)
+    except Lead.DoesNotExist:
+        raise Http404
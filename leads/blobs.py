@@ -0,0 +1,180 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Lead, ResumeBlob, ResumeDocument
+from .storage import blob_checksum, resume_storage
+
+logger = logging.getLogger(__name__)
+
+# Directory of the content-addressed resumes (Lead.resume upload_to)
+BLOB_DIRECTORY = Lead._meta.get_field('resume').upload_to.strip('/')
+
+BATCH_SIZE = 500
+
+
+def adjust_blob_refs(changes, using='default'):
+    """
+    Add ``changes`` ({blob name: n}) to the reference counts, creating the
+    rows of new blobs. Names that are not content-addressed (uploads from
+    before leads.storage) are ignored. On PostgreSQL this is one INSERT ...
+    ON CONFLICT, like the stats rollups.
+    """
+    rows = sorted((name, n) for name, n in changes.items() if n and blob_checksum(name))
+    if not rows:
+        return
+    now = timezone.now()
+    storage = resume_storage()
+    sizes = {name: storage.size(name) if n > 0 and storage.exists(name) else 0 for name, n in rows}
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        with transaction.atomic(using=using):
+            for name, n in rows:
+                blobs = ResumeBlob.objects.using(using).filter(name=name)
+                if not blobs.update(ref_count=F('ref_count') + n, updated_at=now):
+                    ResumeBlob.objects.using(using).create(
+                        name=name, checksum=blob_checksum(name), size=sizes[name], ref_count=n
+                    )
+        return
+
+    table = ResumeBlob._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+    params = [value for name, n in rows for value in (name, blob_checksum(name), sizes[name], n, now, now)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO "{table}" ("name", "checksum", "size", "ref_count", "created_at", "updated_at") '
+            f'VALUES {values} ON CONFLICT ("name") DO UPDATE SET '
+            f'"ref_count" = "{table}"."ref_count" + EXCLUDED."ref_count", "updated_at" = EXCLUDED."updated_at"',
+            params,
+        )
+
+
+def replace_blob_ref(old_name, new_name, using='default'):
+    """Move one reference from ``old_name`` to ``new_name``; either may be empty."""
+    changes = Counter()
+    changes[new_name] += 1
+    changes[old_name] -= 1
+    adjust_blob_refs(changes, using=using)
+
+
+def count_references(names=None, using='default'):
+    """
+    Count the lead resumes and resume backups pointing at each blob, for
+    all blobs or only ``names``: {blob name: n}.
+    """
+    references = Counter()
+    sources = (
+        (Lead.objects.using(using), 'resume'),
+        (ResumeDocument.objects.using(using), 'backup_name'),
+    )
+    for queryset, field in sources:
+        if names is None:
+            queryset = queryset.filter(**{f'{field}__startswith': f'{BLOB_DIRECTORY}/'})
+        else:
+            queryset = queryset.filter(**{f'{field}__in': names})
+        rows = queryset.order_by().values(field).annotate(n=Count('id')).values_list(field, 'n')
+        for name, n in rows:
+            if blob_checksum(name):
+                references[name] += n
+    return references
+
+
+def recount_blob_refs(dry_run=False, using='default'):
+    """
+    Recount every reference count from Lead and ResumeDocument and correct
+    the drifted ones. On PostgreSQL the blob table is locked first, so
+    uploads meanwhile wait and are counted on top. Returns the number of
+    blobs that were (or, with ``dry_run``, would be) corrected.
+    """
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql' and not dry_run:
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE "{ResumeBlob._meta.db_table}" IN EXCLUSIVE MODE')
+        actual = count_references(using=using)
+        stored = dict(ResumeBlob.objects.using(using).values_list('name', 'ref_count'))
+        deltas = {
+            name: actual.get(name, 0) - stored.get(name, 0)
+            for name in actual.keys() | stored.keys()
+            if actual.get(name, 0) != stored.get(name, 0)
+        }
+        if not dry_run:
+            adjust_blob_refs(deltas, using=using)
+    return len(deltas)
+
+
+def delete_blob_file(storage, name, cutoff, dry_run=False):
+    """
+    Delete the file of an unreferenced blob unless it was stored again
+    after ``cutoff``. Returns the bytes freed, or None when it was kept.
+    """
+    if not storage.exists(name) or storage.get_modified_time(name) >= cutoff:
+        return None
+    size = storage.size(name)
+    if not dry_run:
+        storage.delete(name)
+    return size
+
+
+def collect_blobs(grace=None, dry_run=False, using='default'):
+    """
+    Delete the blobs no lead or backup has referenced for ``grace`` seconds
+    (LEAD_RESUME_BLOB_GRACE by default), and blob files that never got a
+    row, e.g. from an upload whose lead was rolled back. A blob still
+    referenced despite its count is kept and its count corrected.
+
+    Returns {'blobs': rows deleted, 'files': files deleted, 'bytes': freed}.
+    """
+    grace = settings.LEAD_RESUME_BLOB_GRACE if grace is None else grace
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    storage = resume_storage()
+    collected = Counter(blobs=0, files=0, bytes=0)
+
+    def delete_files(names):
+        for name in names:
+            size = delete_blob_file(storage, name, cutoff, dry_run)
+            if size is not None:
+                collected['files'] += 1
+                collected['bytes'] += size
+
+    unused = list(
+        ResumeBlob.objects.using(using)
+        .filter(ref_count__lte=0, updated_at__lt=cutoff)
+        .values_list('name', flat=True)
+    )
+    for start in range(0, len(unused), BATCH_SIZE):
+        batch = unused[start:start + BATCH_SIZE]
+        references = count_references(batch, using=using)
+        with transaction.atomic(using=using):
+            blobs = list(
+                ResumeBlob.objects.using(using).select_for_update()
+                .filter(name__in=batch, ref_count__lte=0, updated_at__lt=cutoff)
+                .values_list('name', 'ref_count')
+            )
+            drifted = {name: references[name] - ref_count for name, ref_count in blobs if references[name]}
+            if drifted:
+                logger.warning(f'Corrected reference counts of {len(drifted)} blobs still in use')
+            deleted = [name for name, _ in blobs if name not in drifted]
+            collected['blobs'] += len(deleted)
+            if not dry_run:
+                adjust_blob_refs(drifted, using=using)
+                ResumeBlob.objects.using(using).filter(name__in=deleted).delete()
+        delete_files(deleted)
+
+    names = list(storage.blobs(BLOB_DIRECTORY))
+    for start in range(0, len(names), BATCH_SIZE):
+        batch = names[start:start + BATCH_SIZE]
+        known = set(ResumeBlob.objects.using(using).filter(name__in=batch).values_list('name', flat=True))
+        orphans = [name for name in batch if name not in known]
+        if not orphans:
+            continue
+        references = count_references(orphans, using=using)
+        if references and not dry_run:
+            adjust_blob_refs(references, using=using)
+        delete_files(name for name in orphans if name not in references)
+    return dict(collected)
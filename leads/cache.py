@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'leads:version'
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 1.0
+LOCK_POLL = 0.02
+
+_MISSING = object()
+_counters = {'hits': 0, 'misses': 0, 'errors': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+    record_cache_lookup('leads', name)
+
+
+def stats():
+    """Return this process's cache hit/miss/error counters."""
+    with _counters_lock:
+        return dict(_counters)
+
+
+def reset_stats():
+    with _counters_lock:
+        for name in _counters:
+            _counters[name] = 0
+
+
+def get_version():
+    """
+    Return the current generation of cached lead data. Every write to leads
+    bumps it, so entries of older generations are never read again and
+    simply expire.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+async def aget_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, 1, timeout=None)
+        version = await cache.aget(VERSION_KEY, 1)
+    return version
+
+
+def invalidate():
+    """Invalidate every cached lead list page and detail payload."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+    except Exception as exc:
+        _count('errors')
+        logger.warning(f'Could not invalidate the lead cache: {str(exc)}')
+
+
+def make_key(scope, request, *parts):
+    return versioned_key(scope, request, get_version(), parts)
+
+
+async def amake_key(scope, request, *parts):
+    return versioned_key(scope, request, await aget_version(), parts)
+
+
+def versioned_key(scope, request, version, parts):
+    """
+    Build a versioned key from the absolute URL (links in list responses
+    include the host) with the query parameters in a canonical order.
+    """
+    query = sorted((name, sorted(values)) for name, values in request.query_params.lists())
+    raw = repr((request.build_absolute_uri(request.path), query, parts))
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f'leads:{scope}:v{version}:{digest}'
+
+
+def get_or_compute(scope, request, compute, *parts):
+    """
+    Return ``(value, hit)`` for the cached value of ``compute()``.
+
+    On a miss only one caller per key recomputes the value (the lock is taken
+    with ``cache.add``); others wait up to ``LOCK_WAIT`` seconds for it to
+    appear before computing it themselves. Cache errors are logged and the
+    value is computed directly, so an unavailable Redis never fails a request.
+    """
+    timeout = settings.LEAD_CACHE_TIMEOUT
+    if not timeout:
+        return compute(), False
+    try:
+        key = make_key(scope, request, *parts)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _count('hits')
+            return value, True
+
+        lock_key = f'{key}:lock'
+        locked = cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+        if not locked:
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL)
+                value = cache.get(key, _MISSING)
+                if value is not _MISSING:
+                    _count('hits')
+                    return value, True
+    except Exception as exc:
+        _count('errors')
+        logger.warning(f'Lead cache unavailable, reading from the database: {str(exc)}')
+        return compute(), False
+
+    _count('misses')
+    try:
+        value = compute()
+        try:
+            cache.set(key, value, timeout=timeout)
+        except Exception as exc:
+            _count('errors')
+            logger.warning(f'Could not store {key} in the lead cache: {str(exc)}')
+        return value, False
+    finally:
+        if locked:
+            try:
+                cache.delete(lock_key)
+            except Exception:
+                pass
+
+
+async def aget_or_compute(scope, request, compute, *parts):
+    """
+    get_or_compute for the async views: ``compute`` is a coroutine function
+    and waiting for another caller's value does not block the event loop.
+    Entries are shared with the sync views.
+    """
+    timeout = settings.LEAD_CACHE_TIMEOUT
+    if not timeout:
+        return await compute(), False
+    try:
+        key = await amake_key(scope, request, *parts)
+        value = await cache.aget(key, _MISSING)
+        if value is not _MISSING:
+            _count('hits')
+            return value, True
+
+        lock_key = f'{key}:lock'
+        locked = await cache.aadd(lock_key, 1, timeout=LOCK_TIMEOUT)
+        if not locked:
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL)
+                value = await cache.aget(key, _MISSING)
+                if value is not _MISSING:
+                    _count('hits')
+                    return value, True
+    except Exception as exc:
+        _count('errors')
+        logger.warning(f'Lead cache unavailable, reading from the database: {str(exc)}')
+        return await compute(), False
+
+    _count('misses')
+    try:
+        value = await compute()
+        try:
+            await cache.aset(key, value, timeout=timeout)
+        except Exception as exc:
+            _count('errors')
+            logger.warning(f'Could not store {key} in the lead cache: {str(exc)}')
+        return value, False
+    finally:
+        if locked:
+            try:
+                await cache.adelete(lock_key)
+            except Exception:
+                pass
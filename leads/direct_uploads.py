@@ -0,0 +1,138 @@
+import functools
+import logging
+import os
+import re
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import ResumeDocument
+from .uploads import RESUME_SIGNATURES
+
+logger = logging.getLogger(__name__)
+
+RESUME_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+
+class UploadRejected(Exception):
+    """The uploaded object is missing or not an acceptable resume."""
+
+
+def enabled():
+    return bool(settings.LEAD_RESUME_UPLOAD_BUCKET)
+
+
+def s3_client():
+    return get_client(settings.LEAD_RESUME_UPLOAD_ENDPOINT_URL, settings.LEAD_RESUME_UPLOAD_REGION)
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(endpoint_url, region):
+    # boto3 is only needed when direct uploads are enabled.
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint_url or None,
+        region_name=region or None,
+        # Path-style URLs for MinIO and other S3-compatible services
+        config=Config(signature_version='s3v4', s3={'addressing_style': 'path' if endpoint_url else 'auto'}),
+    )
+
+
+def is_upload_key(key):
+    """Whether ``key`` has the form of a key handed out by presign_upload."""
+    pattern = rf"{re.escape(settings.LEAD_RESUME_UPLOAD_PREFIX)}[0-9a-f]{{32}}\.({'|'.join(RESUME_SIGNATURES)})"
+    return re.fullmatch(pattern, key or '') is not None
+
+
+def presign_upload(file_name, size):
+    """
+    Return a new object key and a pre-signed URL that accepts one PUT of
+    ``size`` bytes to it, valid for LEAD_RESUME_UPLOAD_EXPIRES seconds. The
+    client must send the returned headers with the upload.
+    """
+    extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+    key = f'{settings.LEAD_RESUME_UPLOAD_PREFIX}{uuid.uuid4().hex}.{extension}'
+    content_type = RESUME_CONTENT_TYPES[extension]
+    url = s3_client().generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': settings.LEAD_RESUME_UPLOAD_BUCKET,
+            'Key': key,
+            'ContentType': content_type,
+            # Signed, so the store refuses a body of any other length.
+            'ContentLength': size,
+        },
+        ExpiresIn=settings.LEAD_RESUME_UPLOAD_EXPIRES,
+    )
+    return {
+        'key': key,
+        'url': url,
+        'method': 'PUT',
+        'headers': {'Content-Type': content_type},
+        'expires_in': settings.LEAD_RESUME_UPLOAD_EXPIRES,
+    }
+
+
+def fetch_upload(key, spool):
+    """
+    Download the object ``key`` into the file ``spool`` after checking its
+    size, then check its leading bytes. Raises UploadRejected.
+    """
+    from botocore.exceptions import ClientError
+
+    client = s3_client()
+    bucket = settings.LEAD_RESUME_UPLOAD_BUCKET
+    try:
+        head = client.head_object(Bucket=bucket, Key=key)
+    except ClientError as exc:
+        if exc.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            raise UploadRejected('The uploaded resume was not found.')
+        raise
+    if head['ContentLength'] > settings.MAX_UPLOAD_SIZE:
+        raise UploadRejected(f'File size must be no more than {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB')
+
+    client.download_fileobj(bucket, key, spool)
+    spool.seek(0)
+    extension = os.path.splitext(key)[1].lstrip('.')
+    signature = RESUME_SIGNATURES[extension]
+    if spool.read(len(signature)) != signature:
+        raise UploadRejected(f'The file content is not a valid {extension.upper()} document.')
+    spool.seek(0)
+
+
+def import_upload(lead):
+    """
+    Move the lead's direct upload into resume storage and make it the
+    lead's resume, then delete the object. A rejected upload is recorded as
+    a FAILED ResumeDocument and dropped; returns whether the lead now has
+    its resume. Storage errors propagate so the task retries.
+    """
+    key = lead.resume_upload
+    extension = os.path.splitext(key)[1].lstrip('.')
+    try:
+        with tempfile.TemporaryFile() as spool:
+            fetch_upload(key, spool)
+            lead.resume.save(f'resume.{extension}', File(spool), save=False)
+    except UploadRejected as exc:
+        logger.warning(f'Rejected resume upload {key} for lead {lead.pk}: {str(exc)}')
+        ResumeDocument.objects.get_or_create(
+            idempotency_key=f'{lead.pk}:{key}',
+            defaults={'lead': lead, 'file_name': key, 'status': ResumeDocument.Status.FAILED, 'error': str(exc)},
+        )
+        imported = False
+    else:
+        imported = True
+
+    lead.resume_upload = ''
+    lead.save(update_fields=['resume', 'resume_upload', 'updated_at'])
+    s3_client().delete_object(Bucket=settings.LEAD_RESUME_UPLOAD_BUCKET, Key=key)
+    return imported
@@ -0,0 +1,161 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+
+from .storage import blob_checksum
+
+OFFLOAD_MODES = ('', 'nginx', 'sendfile')
+
+# A single byte range; multipart/byteranges is not offered.
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def resume_filename(lead):
+    """Download name of a lead's resume: <last>_<first>_resume.<ext>."""
+    return f"{lead.last_name}_{lead.first_name}_resume{lead.resume.name[lead.resume.name.rfind('.'):]}"
+
+
+def file_etag(field_file):
+    """
+    Strong ETag of a stored file: the checksum of a content-addressed file
+    (leads.storage), otherwise its size and modification time.
+    """
+    checksum = blob_checksum(field_file.name)
+    if checksum:
+        return quote_etag(checksum)
+    stat = os.stat(field_file.path)
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+
+def etag_matches(etag, header):
+    etags = parse_etags(header or '')
+    return '*' in etags or etag in etags
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) byte offsets, end exclusive, that a Range
+    ``header`` asks for, None to send the whole file (no, malformed, invalid
+    or multiple ranges), or () when the range is unsatisfiable.
+    """
+    match = BYTE_RANGE.match((header or '').replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-N: the last N bytes
+        suffix = int(last)
+        return (max(size - suffix, 0), size) if suffix else ()
+    start = int(first)
+    if last and int(last) < start:
+        # bytes=5-3 is invalid rather than unsatisfiable: ignore the header.
+        return None
+    if start >= size:
+        return ()
+    return start, min(int(last) + 1, size) if last else size
+
+
+class FileRange:
+    """
+    Read-only view of ``length`` bytes of an open file from its current
+    position. It keeps ``fileno()``, so gunicorn's wsgi.file_wrapper still
+    hands it to os.sendfile (bounded by Content-Length) instead of copying
+    it through Python.
+    """
+
+    def __init__(self, handle, length):
+        self.handle = handle
+        self.remaining = length
+
+    def fileno(self):
+        return self.handle.fileno()
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.handle.close()
+
+
+def serve_file(request, field_file, filename):
+    """
+    Send a stored file as an attachment named ``filename``.
+
+    With LEAD_RESUME_OFFLOAD set, the response only carries X-Accel-Redirect
+    (nginx) or X-Sendfile and the front proxy sends the bytes. Otherwise the
+    file is streamed from here: gunicorn sends it with os.sendfile, and
+    Range and If-Range requests get 206 responses. Either way a matching
+    If-None-Match gets a 304 before the file is opened.
+    """
+    mode = settings.LEAD_RESUME_OFFLOAD
+    if mode not in OFFLOAD_MODES:
+        raise ImproperlyConfigured(f"LEAD_RESUME_OFFLOAD must be one of: {', '.join(OFFLOAD_MODES)}")
+
+    etag = file_etag(field_file)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag_matches(etag, request.headers.get('If-None-Match')):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if mode:
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if mode == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.LEAD_RESUME_OFFLOAD_PREFIX.rstrip('/') + '/' + field_file.name)
+        else:
+            response['X-Sendfile'] = field_file.path
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+    size = field_file.size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or etag_matches(etag, if_range):
+        byte_range = parse_range(request.headers.get('Range'), size)
+    if byte_range == ():
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    handle = open(field_file.path, 'rb')
+    if byte_range is None:
+        response = FileResponse(handle, as_attachment=True, filename=filename, content_type=content_type,
+                                headers=headers)
+    else:
+        start, end = byte_range
+        handle.seek(start)
+        response = FileResponse(FileRange(handle, end - start), as_attachment=True, filename=filename,
+                                content_type=content_type, status=206, headers=headers)
+        response['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+        response['Content-Length'] = end - start
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+async def aserve_file(request, field_file, filename):
+    """
+    serve_file for the async views. A file streamed from here is read in a
+    worker thread one block at a time instead of being iterated
+    synchronously by the ASGI handler.
+    """
+    response = await sync_to_async(serve_file)(request, field_file, filename)
+    filelike = getattr(response, 'file_to_stream', None)
+    if filelike is not None:
+        response.streaming_content = aread_blocks(filelike, response.block_size)
+    return response
+
+
+async def aread_blocks(filelike, block_size):
+    read = sync_to_async(filelike.read, thread_sensitive=False)
+    while block := await read(block_size):
+        yield block
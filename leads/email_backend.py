@@ -1,9 +1,28 @@
 import ssl
+
+from django.conf import settings
 from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
 
+from .metrics import smtp_timer
+
+
+def smtp_ssl_context():
+    """
+    TLS context for every SMTP connection, sync and async: the server
+    certificate is verified unless EMAIL_SSL_CERTVERIFY is False.
+    """
+    context = ssl.create_default_context()
+    if not settings.EMAIL_SSL_CERTVERIFY:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
 class CustomEmailBackend(SMTPBackend):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.ssl_context = ssl.create_default_context()
-        self.ssl_context.check_hostname = False
-        self.ssl_context.verify_mode = ssl.CERT_NONE 
\ No newline at end of file
+        self.ssl_context = smtp_ssl_context()
+
+    def send_messages(self, email_messages):
+        with smtp_timer('smtp'):
+            return super().send_messages(email_messages)
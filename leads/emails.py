@@ -0,0 +1,213 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .mailer import asend_messages, get_mailer
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def prospect_email(lead):
+    """Return (subject, message, recipients) for the prospect confirmation."""
+    subject = 'Thank you for your submission'
+    message = f'Dear {lead.first_name},\n\nThank you for submitting your information. Our team will review your submission and contact you soon.\n\nBest regards,\nThe Team'
+    return subject, message, [lead.email]
+
+
+def attorney_email(lead):
+    """Return (subject, message, recipients) for the attorney notification."""
+    subject = 'New Lead Submission'
+    message = f'A new lead has been submitted:\n\nName: {lead.first_name} {lead.last_name}\nEmail: {lead.email}\n\nPlease check the lead management system for more details.'
+    return subject, message, [settings.ATTORNEY_EMAIL]
+
+
+async def asend_intake_emails(lead):
+    """Send both intake emails for a lead from an async view, over one connection."""
+    await asend_messages([
+        EmailMessage(subject=subject, body=message, from_email=settings.DEFAULT_FROM_EMAIL, to=recipients)
+        for subject, message, recipients in (prospect_email(lead), attorney_email(lead))
+    ])
+
+
+def enqueue_lead_emails(lead):
+    """
+    Write the intake emails for a lead to the outbox.
+
+    Must be called inside the transaction that creates the lead so that
+    the lead and its emails are committed (or rolled back) together.
+    """
+    return enqueue_intake_emails([lead])
+
+
+def enqueue_intake_emails(leads):
+    """Write the intake emails for many leads with a single INSERT."""
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(lead=lead, subject=subject, body=message, recipients=recipients)
+        for lead in leads
+        for subject, message, recipients in (prospect_email(lead), attorney_email(lead))
+    ])
+
+
+def dispatch_outbox(outbox_ids):
+    """
+    Queue a delivery job for the given outbox rows.
+
+    A broker outage must not fail the request that already committed the
+    lead, so errors are only logged; the rows stay PENDING and are picked
+    up by ``drain_email_outbox``.
+    """
+    from .tasks import deliver_outbox_emails
+
+    try:
+        deliver_outbox_emails.delay(outbox_ids)
+    except Exception as exc:
+        logger.warning(f'Could not queue outbox emails {outbox_ids}, leaving them for the drain: {str(exc)}')
+
+
+def dispatch_delivery_worker():
+    """
+    Start a batched delivery run now rather than at the next beat tick.
+    Used after bulk writes to the outbox; failures are only logged.
+    """
+    from .tasks import deliver_email_batches
+
+    try:
+        deliver_email_batches.delay()
+    except Exception as exc:
+        logger.warning(f'Could not start the email delivery worker, leaving emails for the next run: {str(exc)}')
+
+
+def claim_outbox(outbox_ids=None, limit=None):
+    """
+    Mark pending outbox emails SENDING for this worker and return them.
+
+    The claim is its own short transaction: rows are locked with SKIP LOCKED
+    only while they are marked, so concurrent workers and the drain command
+    never claim the same email and no lock is held while SMTP is slow. A
+    claim older than LEAD_OUTBOX_LEASE seconds is considered abandoned
+    (worker killed) and the email is claimed again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.LEAD_OUTBOX_LEASE)
+    with transaction.atomic():
+        pending = (
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=EmailOutbox.Status.PENDING)
+                | Q(status=EmailOutbox.Status.SENDING, claimed_at__lt=stale)
+            )
+            .order_by('created_at')
+        )
+        if outbox_ids is not None:
+            pending = pending.filter(id__in=outbox_ids)
+        if limit:
+            pending = pending[:limit]
+        rows = list(pending)
+        EmailOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+            status=EmailOutbox.Status.SENDING, claimed_at=now, attempts=F('attempts') + 1,
+        )
+    for row in rows:
+        row.status = EmailOutbox.Status.SENDING
+        row.claimed_at = now
+        row.attempts += 1
+    return rows
+
+
+def record_delivery(row, error=None):
+    """
+    Save the outcome of sending a claimed email: SENT, or back to PENDING
+    for a retry until LEAD_OUTBOX_MAX_ATTEMPTS, then FAILED. Nothing is
+    saved if the claim has been taken over by another worker meanwhile.
+    """
+    if error is None:
+        changes = {'status': EmailOutbox.Status.SENT, 'sent_at': timezone.now()}
+    elif row.attempts >= settings.LEAD_OUTBOX_MAX_ATTEMPTS:
+        changes = {'status': EmailOutbox.Status.FAILED, 'last_error': str(error)}
+    else:
+        changes = {'status': EmailOutbox.Status.PENDING, 'last_error': str(error)}
+    EmailOutbox.objects.filter(
+        pk=row.pk, status=EmailOutbox.Status.SENDING, claimed_at=row.claimed_at,
+    ).update(**changes)
+
+
+def deliver_outbox(outbox_ids=None, limit=None, mailer=None):
+    """
+    Send pending outbox emails over the worker's long-lived SMTP connection.
+
+    Emails are claimed first (claim_outbox), then sent as one batch outside
+    any transaction, and each email's result is saved. Returns the number
+    of emails sent.
+    """
+    rows = claim_outbox(outbox_ids, limit)
+    if not rows:
+        return 0
+
+    mailer = mailer or get_mailer()
+    messages = [
+        EmailMessage(
+            subject=row.subject,
+            body=row.body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=row.recipients,
+        )
+        for row in rows
+    ]
+    sent = 0
+    for row, error in zip(rows, mailer.send_batch(messages)):
+        if error is not None:
+            logger.error(f'Failed to send outbox email {row.id}: {str(error)}')
+            record_delivery(row, error)
+            continue
+        record_delivery(row)
+        sent += 1
+    return sent
+
+
+def wait_for_batch(batch_size, linger, deadline):
+    """
+    Block until a full batch is pending, or until the oldest pending email
+    has lingered for ``linger`` seconds, or until ``deadline``. Returns 0
+    once the outbox has stayed empty for ``linger`` seconds.
+    """
+    started = time.monotonic()
+    first_seen = None
+    while True:
+        pending = EmailOutbox.objects.filter(status=EmailOutbox.Status.PENDING)[:batch_size].count()
+        now = time.monotonic()
+        if pending >= batch_size or now >= deadline:
+            return pending
+        if pending:
+            if first_seen is None:
+                first_seen = now
+            if now - first_seen >= linger:
+                return pending
+        elif now - started >= linger:
+            return 0
+        time.sleep(min(max(linger / 4, 0.05), max(deadline - now, 0)))
+
+
+def run_delivery(batch_size=None, linger=None, max_runtime=None):
+    """
+    Deliver outbox emails in batches until the outbox is empty or
+    ``max_runtime`` seconds have passed, so an idle run frees its Celery
+    worker instead of polling. Returns the number of emails sent.
+    """
+    batch_size = batch_size or settings.LEAD_OUTBOX_BATCH_SIZE
+    linger = settings.LEAD_EMAIL_BATCH_LINGER if linger is None else linger
+    max_runtime = settings.LEAD_EMAIL_WORKER_RUNTIME if max_runtime is None else max_runtime
+    deadline = time.monotonic() + max_runtime
+    total = 0
+    while True:
+        if not wait_for_batch(batch_size, linger, deadline):
+            return total
+        total += deliver_outbox(limit=batch_size)
+        if time.monotonic() >= deadline:
+            return total
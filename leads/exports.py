@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+
+EXPORT_FIELDS = ['id', 'first_name', 'last_name', 'email', 'state', 'created_at', 'updated_at']
+
+
+def isoformat(value):
+    """Render datetimes the way the JSON API does (UTC as 'Z')."""
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+# Leading characters a spreadsheet treats as the start of a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    """Quote user-supplied text with ``'`` so spreadsheets don't evaluate it."""
+    if value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_rows(queryset, chunk_size):
+    """
+    Iterate over the export columns with a server-side cursor, fetching
+    ``chunk_size`` rows at a time instead of materialising the queryset.
+    """
+    return queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def stream_csv(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    # Send the header straight away, before the first chunk is fetched.
+    yield _drain(buffer)
+    for count, (pk, first_name, last_name, email, state, created_at, updated_at) in enumerate(rows, 1):
+        writer.writerow([pk, csv_cell(first_name), csv_cell(last_name), csv_cell(email), state,
+                         isoformat(created_at), isoformat(updated_at)])
+        if count % chunk_size == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def stream_ndjson(rows, chunk_size):
+    lines = []
+    for pk, first_name, last_name, email, state, created_at, updated_at in rows:
+        lines.append(json.dumps({
+            'id': pk,
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': email,
+            'state': state,
+            'created_at': isoformat(created_at),
+            'updated_at': isoformat(updated_at),
+        }, ensure_ascii=False))
+        if len(lines) == chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
@@ -0,0 +1,85 @@
+"""
+Text and metadata extraction for resumes.
+
+This module must not import Django: its functions run in a spawned process
+pool (see leads.resumes) that never calls django.setup().
+"""
+import re
+import shutil
+import subprocess
+
+RESUME_FORMATS = ('pdf', 'doc', 'docx')
+
+# Runs of printable text in a legacy Word file, as UTF-16LE or 8-bit text.
+DOC_TEXT_RUNS = re.compile(rb'(?:[\x20-\x7e\t\r\n]\x00){4,}|[\x20-\x7e\t\r\n]{4,}')
+
+
+class ExtractionError(Exception):
+    """The file cannot be read; retrying will not help."""
+
+
+def extract(path, file_format):
+    """
+    Return ``{'text': ..., 'metadata': {...}}`` for the resume at ``path``.
+    Raises ExtractionError for unsupported or unreadable files.
+    """
+    extractors = {'pdf': extract_pdf, 'docx': extract_docx, 'doc': extract_doc}
+    if file_format not in extractors:
+        raise ExtractionError(f'Unsupported resume format: {file_format}')
+    try:
+        text, metadata = extractors[file_format](path)
+    except ExtractionError:
+        raise
+    except Exception as exc:
+        # Parser exceptions may not survive pickling back to the worker.
+        raise ExtractionError(f'Could not read {file_format.upper()} file: {exc}')
+    # PostgreSQL text columns cannot hold NUL characters.
+    text = text.replace('\x00', '').strip()
+    metadata['words'] = len(text.split())
+    return {'text': text, 'metadata': {key: value for key, value in metadata.items() if value not in (None, '')}}
+
+
+def extract_pdf(path):
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+    info = reader.metadata
+    return text, {
+        'pages': len(reader.pages),
+        'title': info.title if info else None,
+        'author': info.author if info else None,
+    }
+
+
+def extract_docx(path):
+    import docx
+
+    document = docx.Document(path)
+    parts = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append('\t'.join(cell.text for cell in row.cells))
+    properties = document.core_properties
+    return '\n'.join(parts), {'title': properties.title, 'author': properties.author}
+
+
+def extract_doc(path):
+    """
+    Legacy Word 97-2003 files: use antiword when it is installed, otherwise
+    fall back to the printable text runs in the file.
+    """
+    antiword = shutil.which('antiword')
+    if antiword:
+        result = subprocess.run([antiword, path], capture_output=True, timeout=60)
+        if result.returncode == 0:
+            return result.stdout.decode('utf-8', 'replace'), {}
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    if not data.startswith(b'\xd0\xcf\x11\xe0'):
+        raise ExtractionError('Not a Word 97-2003 document.')
+    runs = []
+    for match in DOC_TEXT_RUNS.finditer(data):
+        run = match.group()
+        runs.append(run.decode('utf-16-le' if run[1:2] == b'\x00' else 'latin-1', 'replace'))
+    return '\n'.join(runs), {}
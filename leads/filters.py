@@ -0,0 +1,102 @@
+import datetime
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Lead
+
+
+class LeadFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters for the lead list, each backed by an index:
+
+    - ``state``: (state, created_at)
+    - ``created_after`` / ``created_before``: created_at, or (state, created_at)
+      together with ``state``. The range is half-open: after <= created_at < before.
+    - ``email``: case-insensitive prefix on LOWER(email)
+    - ``name``: case-insensitive prefix on LOWER(first_name) or LOWER(last_name)
+    - ``search``: the ``email`` and ``name`` prefixes combined with OR
+    """
+    params = ('state', 'created_after', 'created_before', 'email', 'name', 'search')
+
+    def has_filters(self, request):
+        """Whether the query string holds at least one non-empty filter."""
+        return any(request.query_params.get(param, '').strip() for param in self.params)
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        state = params.get('state')
+        if state:
+            if state not in Lead.LeadState.values:
+                raise ValidationError({'state': f"Invalid state. Must be one of: {', '.join(Lead.LeadState.values)}"})
+            queryset = queryset.filter(state=state)
+
+        created_after = self.parse_moment(params, 'created_after')
+        if created_after:
+            queryset = queryset.filter(created_at__gte=created_after)
+        created_before = self.parse_moment(params, 'created_before')
+        if created_before:
+            queryset = queryset.filter(created_at__lt=created_before)
+
+        email = params.get('email', '').strip().lower()
+        if email:
+            queryset = queryset.alias(email_lower=Lower('email')).filter(email_lower__startswith=email)
+
+        name = params.get('name', '').strip().lower()
+        if name:
+            queryset = queryset.alias(**self.name_aliases()).filter(self.name_prefix(name))
+
+        search = params.get('search', '').strip().lower()
+        if search:
+            queryset = queryset.alias(email_lower=Lower('email'), **self.name_aliases()).filter(
+                self.name_prefix(search) | Q(email_lower__startswith=search)
+            )
+        return queryset
+
+    def name_aliases(self):
+        return {'first_name_lower': Lower('first_name'), 'last_name_lower': Lower('last_name')}
+
+    def name_prefix(self, value):
+        return Q(first_name_lower__startswith=value) | Q(last_name_lower__startswith=value)
+
+    def parse_moment(self, params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            moment = parse_datetime(value)
+            if moment is None:
+                day = parse_date(value)
+                moment = day and datetime.datetime.combine(day, datetime.time.min)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            ('state', 'Only leads in this state.'),
+            ('created_after', 'Only leads created at or after this ISO 8601 date/datetime.'),
+            ('created_before', 'Only leads created before this ISO 8601 date/datetime.'),
+            ('email', 'Case-insensitive email prefix.'),
+            ('name', 'Case-insensitive first or last name prefix.'),
+            ('search', 'Case-insensitive prefix of the email, first name or last name.'),
+        ]
+        return [
+            {
+                'name': name,
+                'required': False,
+                'in': 'query',
+                'description': description,
+                'schema': {'type': 'string'},
+            }
+            for name, description in parameters
+        ]
@@ -0,0 +1,179 @@
+"""
+Idempotent lead intake.
+
+A client may send an ``Idempotency-Key`` header with ``POST /api/leads/``.
+The first request with a key stores its response in the cache for
+LEAD_IDEMPOTENCY_TTL seconds; a retry with the same key and body gets that
+response back (with ``Idempotent-Replayed: true``) without touching the
+database or SMTP. A retry that arrives while the first request is still
+running gets 409, and a key reused with a different body gets 422.
+
+With LEAD_DEDUPE_PENDING on, a submission for an email that already has a
+PENDING lead returns that lead with 200 instead of creating another one.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Lead
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Longest a first request may hold its key before a retry may run again.
+LOCK_TIMEOUT = 60
+REPLAYED = {'Idempotent-Replayed': 'true'}
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is already being processed.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_idempotency_cache():
+    return caches[settings.LEAD_IDEMPOTENCY_CACHE]
+
+
+def request_fingerprint(data):
+    """Digest of the submitted fields; uploads count by name and size."""
+    items = []
+    for name in sorted(data):
+        values = data.getlist(name) if hasattr(data, 'getlist') else [data[name]]
+        for value in values:
+            if hasattr(value, 'read'):
+                value = ('file', value.name, value.size)
+            items.append((name, value))
+    return hashlib.sha256(repr(items).encode('utf-8')).hexdigest()
+
+
+class IdempotentRequest:
+    """
+    The idempotency state of one intake request. Use as::
+
+        stored = idempotent.begin()
+        if stored is not None:
+            ...  # replay stored['status'] and stored['data']
+        try:
+            ...  # create the lead
+            idempotent.finish(status_code, data)
+        finally:
+            idempotent.release()
+
+    Every step is a no-op for a request without the header. Cache errors
+    are logged and the request is processed as if it had none, so an
+    unavailable Redis never fails an intake.
+    """
+
+    def __init__(self, request):
+        self.key = request.headers.get(HEADER)
+        if self.key is not None and not 0 < len(self.key) <= MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f'Must be 1 to {MAX_KEY_LENGTH} characters.'})
+        self.request = request
+        self.locked = False
+        if self.key is not None:
+            digest = hashlib.sha256(self.key.encode('utf-8')).hexdigest()
+            self.cache_key = f'leads:idempotency:{digest}'
+            self.lock_key = f'{self.cache_key}:lock'
+
+    def begin(self):
+        """Return the stored response of an earlier request with this key, or claim the key."""
+        if self.key is None:
+            return None
+        try:
+            stored = get_idempotency_cache().get(self.cache_key)
+            if stored is None:
+                self.locked = get_idempotency_cache().add(self.lock_key, 1, timeout=LOCK_TIMEOUT)
+                if not self.locked:
+                    # The first request may have finished in between.
+                    stored = get_idempotency_cache().get(self.cache_key)
+        except Exception as exc:
+            return self.unavailable(exc)
+        return self.check(stored)
+
+    async def abegin(self):
+        if self.key is None:
+            return None
+        try:
+            stored = await get_idempotency_cache().aget(self.cache_key)
+            if stored is None:
+                self.locked = await get_idempotency_cache().aadd(self.lock_key, 1, timeout=LOCK_TIMEOUT)
+                if not self.locked:
+                    stored = await get_idempotency_cache().aget(self.cache_key)
+        except Exception as exc:
+            return self.unavailable(exc)
+        return self.check(stored)
+
+    def check(self, stored):
+        if stored is None:
+            if not self.locked:
+                raise IdempotencyConflict()
+            return None
+        if stored['fingerprint'] != request_fingerprint(self.request.data):
+            raise IdempotencyKeyReused()
+        return stored
+
+    def unavailable(self, exc):
+        logger.warning(f'Idempotency cache unavailable, processing the request: {str(exc)}')
+        self.key = None
+        return None
+
+    def finish(self, status_code, data):
+        """Store a successful response for LEAD_IDEMPOTENCY_TTL seconds."""
+        if self.locked:
+            try:
+                get_idempotency_cache().set(self.cache_key, self.stored(status_code, data),
+                                            timeout=settings.LEAD_IDEMPOTENCY_TTL)
+            except Exception as exc:
+                logger.warning(f'Could not store the response for an Idempotency-Key: {str(exc)}')
+
+    async def afinish(self, status_code, data):
+        if self.locked:
+            try:
+                await get_idempotency_cache().aset(self.cache_key, self.stored(status_code, data),
+                                                   timeout=settings.LEAD_IDEMPOTENCY_TTL)
+            except Exception as exc:
+                logger.warning(f'Could not store the response for an Idempotency-Key: {str(exc)}')
+
+    def stored(self, status_code, data):
+        return {'fingerprint': request_fingerprint(self.request.data), 'status': status_code, 'data': dict(data)}
+
+    def release(self):
+        if self.locked:
+            self.locked = False
+            try:
+                get_idempotency_cache().delete(self.lock_key)
+            except Exception:
+                pass
+
+    async def arelease(self):
+        if self.locked:
+            self.locked = False
+            try:
+                await get_idempotency_cache().adelete(self.lock_key)
+            except Exception:
+                pass
+
+
+def pending_duplicate(email):
+    """The newest PENDING lead for ``email`` when LEAD_DEDUPE_PENDING is on (the (email, state) index)."""
+    if not settings.LEAD_DEDUPE_PENDING:
+        return None
+    return Lead.objects.filter(email=email, state=Lead.LeadState.PENDING).first()
+
+
+async def apending_duplicate(email):
+    if not settings.LEAD_DEDUPE_PENDING:
+        return None
+    return await Lead.objects.filter(email=email, state=Lead.LeadState.PENDING).afirst()
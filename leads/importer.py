@@ -0,0 +1,154 @@
+import csv
+import io
+import itertools
+import json
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .cache import invalidate
+from .emails import dispatch_delivery_worker, enqueue_intake_emails
+from .models import Lead
+from .serializers import LeadCreateSerializer
+from .stats import record_created
+
+IMPORT_FIELDS = ['first_name', 'last_name', 'email']
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+def guess_format(filename, default='csv'):
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+
+class UnreadableFile(Exception):
+    """The file is not UTF-8 text, or not valid CSV."""
+
+
+def parse_rows(stream, import_format):
+    """
+    Yield (row_number, data, error) for every record in a binary stream.
+    Exactly one of ``data`` and ``error`` is set. Raises UnreadableFile
+    when the stream cannot be decoded or parsed at all.
+    """
+    try:
+        yield from _parse_rows(stream, import_format)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise UnreadableFile(f'Could not read the file: {exc}') from exc
+
+
+def _parse_rows(stream, import_format):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if import_format == 'ndjson':
+        for row_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield row_number, None, {'non_field_errors': [f'Invalid JSON: {exc}']}
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, {'non_field_errors': ['Expected a JSON object.']}
+                continue
+            yield row_number, {field: record.get(field) for field in IMPORT_FIELDS}, None
+    else:
+        reader = csv.DictReader(text)
+        missing = [field for field in IMPORT_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            yield 0, None, {'non_field_errors': [f"Missing columns: {', '.join(missing)}"]}
+            return
+        for row_number, record in enumerate(reader, 1):
+            yield row_number, {field: record.get(field) for field in IMPORT_FIELDS}, None
+
+
+class LeadImporter:
+    """
+    Validates and inserts leads chunk by chunk.
+
+    Each chunk is validated with ``LeadCreateSerializer(many=True)``, checked
+    for emails that already exist (in the database or earlier in the file),
+    and inserted with one ``bulk_create``. With ``send_emails`` the intake
+    emails of every chunk are written to the outbox in the same transaction,
+    and one batched delivery run is started once the import is done.
+    """
+
+    def __init__(self, chunk_size=1000, send_emails=False):
+        self.chunk_size = chunk_size
+        self.send_emails = send_emails
+        self.created = 0
+        self.chunks = 0
+        self.errors = []
+        self.seen_emails = set()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.chunks += 1
+            self.import_chunk(chunk)
+        if self.send_emails and self.created:
+            transaction.on_commit(dispatch_delivery_worker)
+        return self.result()
+
+    def result(self):
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def import_chunk(self, chunk):
+        candidates = []
+        for row_number, data, error in chunk:
+            if error:
+                self.errors.append({'row': row_number, 'errors': error})
+            else:
+                candidates.append((row_number, data))
+        if not candidates:
+            return
+
+        serializer = LeadCreateSerializer(data=[data for _, data in candidates], many=True)
+        if not serializer.is_valid():
+            # A many=True serializer drops all validated data on any error;
+            # report the bad rows and validate the good ones again.
+            valid = []
+            for (row_number, data), errors in zip(candidates, serializer.errors):
+                if errors:
+                    self.errors.append({'row': row_number, 'errors': errors})
+                else:
+                    valid.append((row_number, data))
+            if not valid:
+                return
+            candidates = valid
+            serializer = LeadCreateSerializer(data=[data for _, data in candidates], many=True)
+            serializer.is_valid(raise_exception=True)
+
+        existing = set(
+            Lead.objects
+            .annotate(email_lower=Lower('email'))
+            .filter(email_lower__in={item['email'].lower() for item in serializer.validated_data})
+            .values_list('email_lower', flat=True)
+        )
+        leads = []
+        for (row_number, _), item in zip(candidates, serializer.validated_data):
+            email = item['email'].lower()
+            if email in existing or email in self.seen_emails:
+                self.errors.append({'row': row_number, 'errors': {'email': ['A lead with this email already exists.']}})
+                continue
+            self.seen_emails.add(email)
+            leads.append(Lead(**item))
+        if not leads:
+            return
+
+        with transaction.atomic():
+            leads = Lead.objects.bulk_create(leads)
+            record_created(leads)
+            if self.send_emails:
+                enqueue_intake_emails(leads)
+            # bulk_create sends no post_save.
+            transaction.on_commit(invalidate)
+        self.created += len(leads)
@@ -0,0 +1,263 @@
+import abc
+import logging
+import smtplib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .email_backend import smtp_ssl_context
+from .metrics import smtp_timer
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the SMTP connection is considered dead and reopened.
+CONNECTION_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    ConnectionError,
+    TimeoutError,
+)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+def parse_rate(rate):
+    """
+    Parse a rate such as '600/m' into (tokens, seconds).
+    """
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class TokenBucket(abc.ABC):
+    """
+    Token bucket that sleeps in ``acquire`` until enough tokens are available.
+
+    ``rate`` is a string like '600/m'; the bucket holds at most one period's
+    worth of tokens, so a quiet server can absorb a burst of that size.
+    """
+
+    def __init__(self, rate):
+        num, seconds = parse_rate(rate)
+        self.rate = num / seconds
+        self.capacity = num
+
+    def acquire(self, tokens=1):
+        # A request larger than the bucket is taken a bucketful at a time.
+        while tokens > 0:
+            portion = min(tokens, self.capacity)
+            while True:
+                wait = self._take(portion)
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+            tokens -= portion
+
+    @abc.abstractmethod
+    def _take(self, tokens):
+        """Take ``tokens`` if available and return 0, else the seconds to wait for them."""
+
+
+class LocalTokenBucket(TokenBucket):
+    """Token bucket private to the current process."""
+
+    def __init__(self, rate):
+        super().__init__(rate)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+
+    def _take(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+            self._ts = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+
+class RedisTokenBucket(TokenBucket):
+    """Token bucket stored in Redis and shared by every delivery worker."""
+
+    def __init__(self, rate, url, key='leads:email:token-bucket'):
+        import redis
+
+        super().__init__(rate)
+        self.key = key
+        self._script = redis.Redis.from_url(url).register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _take(self, tokens):
+        return float(self._script(keys=[self.key], args=[self.rate, self.capacity, tokens]))
+
+
+class BatchMailer:
+    """
+    Sends messages over one long-lived SMTP connection.
+
+    The connection is opened lazily and kept open between batches. A batch
+    goes to the backend in one send_messages() call; when it fails part-way
+    (the server dropped an idle connection, refused a recipient) the rest is
+    sent one message at a time, reconnecting once if the connection was lost.
+    """
+
+    def __init__(self, connection=None, rate_limiter=None):
+        self.connection = connection or get_connection(fail_silently=False)
+        self.rate_limiter = rate_limiter
+
+    def send(self, message):
+        error, = self.send_batch([message])
+        if error is not None:
+            raise error
+
+    def send_batch(self, messages):
+        """
+        Send ``messages`` and return, for each of them, None if it was sent
+        or the exception it failed with.
+        """
+        if self.rate_limiter:
+            self.rate_limiter.acquire(len(messages))
+        handed = []
+
+        def feed():
+            # The backend sends in order and stops at the first error, so
+            # every message handed over before the failing one was sent.
+            for message in messages:
+                handed.append(message)
+                yield message
+
+        try:
+            self._send(feed())
+            return [None] * len(messages)
+        except CONNECTION_ERRORS as exc:
+            logger.warning(f'SMTP connection lost, reconnecting: {str(exc)}')
+            self.close()
+            sent = max(len(handed) - 1, 0)
+            return [None] * sent + self._send_each(messages[sent:])
+        except Exception as exc:
+            if not handed:
+                return [exc] * len(messages)
+            sent = len(handed) - 1
+            return [None] * sent + [exc] + self._send_each(messages[sent + 1:])
+
+    def _send_each(self, messages):
+        errors = []
+        for message in messages:
+            try:
+                self._send([message])
+            except CONNECTION_ERRORS as exc:
+                # Already reconnected once; the server is not answering.
+                self.close()
+                return errors + [exc] * (len(messages) - len(errors))
+            except Exception as exc:
+                errors.append(exc)
+            else:
+                errors.append(None)
+        return errors
+
+    def _send(self, messages):
+        # An already-open connection is left open by send_messages().
+        self.connection.open()
+        return self.connection.send_messages(messages)
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as exc:
+            logger.debug(f'Ignoring error while closing SMTP connection: {str(exc)}')
+
+
+async def asend_messages(messages):
+    """
+    Send ``messages`` from async code over one SMTP connection, without
+    holding a thread while the server answers. Non-SMTP backends (console,
+    locmem in tests) are called in a worker thread.
+    """
+    if not issubclass(import_string(settings.EMAIL_BACKEND), SMTPBackend):
+        return await sync_to_async(get_connection(fail_silently=False).send_messages)(messages)
+
+    # aiosmtplib is only needed by the async views.
+    import aiosmtplib
+
+    client = aiosmtplib.SMTP(
+        hostname=settings.EMAIL_HOST,
+        port=settings.EMAIL_PORT,
+        username=settings.EMAIL_HOST_USER or None,
+        password=settings.EMAIL_HOST_PASSWORD or None,
+        use_tls=settings.EMAIL_USE_SSL,
+        start_tls=settings.EMAIL_USE_TLS,
+        tls_context=smtp_ssl_context(),
+        timeout=settings.EMAIL_TIMEOUT,
+    )
+    with smtp_timer('aiosmtplib'):
+        async with client:
+            for message in messages:
+                await client.send_message(message.message(), sender=message.from_email,
+                                          recipients=message.recipients())
+    return len(messages)
+
+
+_mailer = None
+
+
+def get_rate_limiter():
+    if not settings.LEAD_EMAIL_RATE_LIMIT:
+        return None
+    if settings.LEAD_EMAIL_RATE_LIMIT_URL:
+        return RedisTokenBucket(settings.LEAD_EMAIL_RATE_LIMIT, settings.LEAD_EMAIL_RATE_LIMIT_URL)
+    return LocalTokenBucket(settings.LEAD_EMAIL_RATE_LIMIT)
+
+
+def get_mailer():
+    """
+    Return the process-wide mailer, creating it on first use.
+
+    Celery prefork children each get their own after the fork, so every
+    worker process holds exactly one SMTP connection.
+    """
+    global _mailer
+    if _mailer is None:
+        _mailer = BatchMailer(rate_limiter=get_rate_limiter())
+    return _mailer
+
+
+def close_mailer():
+    global _mailer
+    if _mailer is not None:
+        _mailer.close()
+        _mailer = None
+
+
+@receiver(setting_changed)
+def reset_mailer(setting, **kwargs):
+    if setting.startswith('EMAIL_') or setting.startswith('LEAD_EMAIL_'):
+        close_mailer()
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leads.blobs import collect_blobs, recount_blob_refs
+
+
+class Command(BaseCommand):
+    help = 'Delete resume files that no lead or resume backup references any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=settings.LEAD_RESUME_BLOB_GRACE,
+            help='Seconds a blob must have been unreferenced before it is deleted.',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recount every reference count from the leads and resume documents first.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['recount']:
+            corrected = recount_blob_refs(dry_run=dry_run)
+            verb = 'Would correct' if dry_run else 'Corrected'
+            self.stdout.write(f'{verb} the reference counts of {corrected} blobs')
+        collected = collect_blobs(grace=options['grace'], dry_run=dry_run)
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {collected['blobs']} blob rows and {collected['files']} files ({collected['bytes']} bytes)"
+        ))
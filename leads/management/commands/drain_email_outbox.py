@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leads.emails import deliver_outbox
+from leads.models import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = 'Send every pending outbox email directly, without going through Celery.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.LEAD_OUTBOX_BATCH_SIZE,
+            help='Number of emails sent per SMTP connection.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            sent = deliver_outbox(limit=options['batch_size'])
+            if not sent:
+                break
+            total += sent
+        pending = EmailOutbox.objects.filter(status=EmailOutbox.Status.PENDING).count()
+        self.stdout.write(self.style.SUCCESS(f'Sent {total} outbox emails ({pending} still pending)'))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.importer import IMPORT_FORMATS, LeadImporter, UnreadableFile, guess_format, parse_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import leads from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (first_name,last_name,email) or NDJSON file.')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=settings.LEAD_IMPORT_CHUNK_SIZE)
+        parser.add_argument('--send-emails', action='store_true',
+                            help='Queue the intake emails for every imported lead.')
+
+    def handle(self, *args, **options):
+        import_format = options['format'] or guess_format(options['path'])
+        importer = LeadImporter(chunk_size=options['chunk_size'], send_emails=options['send_emails'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = importer.run(parse_rows(stream, import_format))
+        except (OSError, UnreadableFile) as exc:
+            raise CommandError(f'{exc} ({importer.created} leads imported before the error)'
+                               if importer.created else str(exc))
+
+        for error in result['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {result['created']} leads ({result['failed']} rows rejected)"))
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from leads.models import Lead, ResumeDocument
+from leads.resumes import process_resume
+from leads.search import backfill_index
+
+
+def _process_in_thread(lead):
+    try:
+        return process_resume(lead).status
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Build the full-text index of resume text in parallel chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Documents indexed per UPDATE.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Chunks (and resumes, with --extract) processed in parallel.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-index documents that already have a search vector.',
+        )
+        parser.add_argument(
+            '--extract',
+            action='store_true',
+            help='First run the resume pipeline for leads whose resume was never processed.',
+        )
+
+    def handle(self, *args, **options):
+        if options['extract']:
+            leads = (
+                Lead.objects.exclude(resume='')
+                .exclude(resume__isnull=True)
+                .exclude(resume_documents__status=ResumeDocument.Status.DONE)
+            )
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                statuses = list(pool.map(_process_in_thread, leads.iterator(chunk_size=options['chunk_size'])))
+            self.stdout.write(f'Processed {len(statuses)} resumes '
+                              f'({statuses.count(ResumeDocument.Status.FAILED)} failed)')
+
+        indexed = backfill_index(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            only_missing=not options['all'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} resumes'))
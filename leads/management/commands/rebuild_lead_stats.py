@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from leads.stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = 'Recount the daily and hourly lead stats rollups from the lead table and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many rollup rows have drifted.',
+        )
+
+    def handle(self, *args, **options):
+        corrected = reconcile_stats(dry_run=options['dry_run'])
+        verb = 'Would correct' if options['dry_run'] else 'Corrected'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {corrected['day']} daily and {corrected['hour']} hourly stats rows"
+        ))
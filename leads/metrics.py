@@ -0,0 +1,138 @@
+"""
+Prometheus metrics for the API, the caches, SMTP and the Celery tasks.
+
+Request latency and database usage are recorded per view by
+leads.middleware.MetricsMiddleware; database queries are counted by an
+execute wrapper installed on every connection, into the current request's
+context (so queries run by async views in worker threads count too).
+
+With several worker processes (gunicorn, Celery prefork) set
+PROMETHEUS_MULTIPROC_DIR to a directory shared by all of them, the web
+containers and the Celery workers included: /metrics then reports the
+sum over every process.
+"""
+import contextlib
+import contextvars
+import os
+import time
+
+from celery.signals import task_postrun, task_prerun
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response, per view.',
+    ['view', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per request, per view.',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request, per view.',
+    ['view'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total', 'Lookups in the lead response cache and the API token cache.',
+    ['cache', 'result'],
+)
+SMTP_SEND_DURATION = Histogram(
+    'smtp_send_duration_seconds', 'Time to hand a batch of messages to the SMTP server.',
+    ['transport', 'outcome'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CELERY_TASK_DURATION = Histogram(
+    'celery_task_duration_seconds', 'Run time of the leads Celery tasks.',
+    ['task', 'state'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+
+CACHE_RESULTS = {'hits': 'hit', 'misses': 'miss', 'errors': 'error'}
+
+# [query count, seconds] of the request being handled, if any
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+_task_started = {}
+
+
+def render():
+    """Return the metrics page and its content type."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def record_cache_lookup(cache, result):
+    """Count a cache lookup; ``result`` is hit(s), miss(es) or error(s)."""
+    CACHE_LOOKUPS.labels(cache, CACHE_RESULTS.get(result, result)).inc()
+
+
+@contextlib.contextmanager
+def smtp_timer(transport):
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'sent'
+    finally:
+        SMTP_SEND_DURATION.labels(transport, outcome).observe(time.perf_counter() - started)
+
+
+def start_request():
+    """Start counting the database queries of a request; pass the result to finish_request."""
+    queries = [0, 0.0]
+    _request_queries.set(queries)
+    return queries
+
+
+def finish_request(view, method, status, seconds, queries):
+    # Not a token reset: a streamed body can finish in another context.
+    _request_queries.set(None)
+    REQUEST_DURATION.labels(view, method, status).observe(seconds)
+    REQUEST_DB_QUERIES.labels(view).observe(queries[0])
+    REQUEST_DB_DURATION.labels(view).observe(queries[1])
+
+
+def count_query(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    if task.name.startswith('leads.'):
+        _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
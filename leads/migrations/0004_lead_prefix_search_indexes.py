@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+PREFIX_INDEXES = [
+    ('leads_email_prefix_idx', 'email'),
+    ('leads_first_name_prefix_idx', 'first_name'),
+    ('leads_last_name_prefix_idx', 'last_name'),
+]
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive prefix indexes used by LeadFilterBackend
+    (LOWER(col) LIKE 'abc%'). Written as SQL because OpClass() around a
+    function produces invalid DDL in Django 4.2.0.
+    """
+
+    dependencies = [
+        ('leads', '0003_email_outbox'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX IF NOT EXISTS "{name}" ON "leads_lead" ((LOWER("{column}")) text_pattern_ops);',
+            reverse_sql=f'DROP INDEX IF EXISTS "{name}";',
+        )
+        for name, column in PREFIX_INDEXES
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-17 15:57
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    LeadDailyStats = apps.get_model('leads', 'LeadDailyStats')
+    db = schema_editor.connection.alias
+    rows = (
+        Lead.objects.using(db)
+        .order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'state')
+        .annotate(count=Count('id'))
+    )
+    LeadDailyStats.objects.using(db).bulk_create([LeadDailyStats(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0004_lead_prefix_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('state', models.CharField(choices=[('PENDING', 'Pending'), ('REACHED_OUT', 'Reached Out')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day', 'state'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaddailystats',
+            constraint=models.UniqueConstraint(fields=('day', 'state'), name='leads_daily_stats_day_state_uniq'),
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-17 16:04
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def backfill_hourly_stats(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    LeadHourlyStats = apps.get_model('leads', 'LeadHourlyStats')
+    db = schema_editor.connection.alias
+    rows = (
+        Lead.objects.using(db)
+        .order_by()
+        .annotate(hour=TruncHour('created_at'))
+        .values('hour', 'state')
+        .annotate(count=Count('id'))
+    )
+    LeadHourlyStats.objects.using(db).bulk_create([LeadHourlyStats(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0005_lead_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('state', models.CharField(choices=[('PENDING', 'Pending'), ('REACHED_OUT', 'Reached Out')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['hour', 'state'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leadhourlystats',
+            constraint=models.UniqueConstraint(fields=('hour', 'state'), name='leads_hourly_stats_hour_state_uniq'),
+        ),
+        migrations.RunPython(backfill_hourly_stats, migrations.RunPython.noop),
+    ]
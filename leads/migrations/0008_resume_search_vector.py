@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-17 16:09
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0007_resume_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumedocument',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='resumedocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='leads_resume_search_idx'),
+        ),
+    ]
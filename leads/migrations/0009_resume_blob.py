@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-17 16:25
+
+import django.core.validators
+from django.db import migrations, models
+import leads.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0008_resume_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('checksum', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='lead',
+            name='resume',
+            field=models.FileField(blank=True, null=True, storage=leads.storage.resume_storage, upload_to='resumes/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx']), django.core.validators.MaxValueValidator(5242880)]),
+        ),
+        migrations.AddIndex(
+            model_name='resumeblob',
+            index=models.Index(condition=models.Q(('ref_count__lte', 0)), fields=['updated_at'], name='leads_resume_blob_unused_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-17 17:14
+
+import django.core.validators
+from django.db import migrations, models
+import leads.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0009_resume_blob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lead',
+            name='resume',
+            field=models.FileField(blank=True, null=True, storage=leads.storage.resume_storage, upload_to='resumes/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx'])]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0010_remove_resume_size_validator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='resume_upload',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
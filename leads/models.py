@@ -1,11 +1,58 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.core.validators import FileExtensionValidator, MaxValueValidator
+from django.core.validators import FileExtensionValidator
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
+from .cache import invalidate
+from .storage import resume_storage
+
 # Create your models here.
 
+class LeadQuerySet(models.QuerySet):
+    def transition(self, state, from_state=None):
+        """
+        Move every lead in the queryset to ``state`` with a single UPDATE,
+        optionally only those currently in ``from_state``, and return the
+        ids that actually changed. The daily stats rollup is updated in the
+        same transaction.
+        """
+        from .stats import record_transitions
+
+        queryset = self.exclude(state=state)
+        if from_state:
+            queryset = queryset.filter(state=from_state)
+        now = timezone.now()
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db):
+            if connection.vendor != 'postgresql':
+                rows = list(queryset.select_for_update().values_list('pk', 'created_at', 'state'))
+                self.model.objects.filter(pk__in=[row[0] for row in rows]).update(state=state, updated_at=now)
+            else:
+                # FOR UPDATE makes PostgreSQL re-check the filters against rows
+                # changed by a concurrent transition and return their current
+                # state, which is the one the rollup has to decrement.
+                subquery, params = (
+                    queryset.order_by().select_for_update().values('pk', 'state').query.sql_with_params()
+                )
+                table = self.model._meta.db_table
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'UPDATE "{table}" SET "state" = %s, "updated_at" = %s '
+                        f'FROM ({subquery}) AS "old" WHERE "{table}"."id" = "old"."id" '
+                        f'RETURNING "{table}"."id", "{table}"."created_at", "old"."state"',
+                        [state, now, *params],
+                    )
+                    rows = cursor.fetchall()
+            record_transitions(rows, state, using=self.db)
+        if rows:
+            transaction.on_commit(invalidate, using=self.db)
+        return [row[0] for row in rows]
+
+
 class Lead(models.Model):
     class LeadState(models.TextChoices):
         PENDING = 'PENDING', _('Pending')
@@ -16,13 +63,16 @@ class Lead(models.Model):
     email = models.EmailField(max_length=100, db_index=True)
     resume = models.FileField(
         upload_to='resumes/',
+        storage=resume_storage,
         null=True,
         blank=True,
         validators=[
             FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx']),
-            MaxValueValidator(settings.MAX_UPLOAD_SIZE)
         ]
     )
+    # Key of a direct upload (leads.direct_uploads) waiting for the resume
+    # worker to verify it and move it into ``resume``
+    resume_upload = models.CharField(max_length=255, blank=True, default='')
     state = models.CharField(
         max_length=20,
         choices=LeadState.choices,
@@ -32,19 +82,196 @@ class Lead(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LeadQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['state', 'created_at']),
             models.Index(fields=['email', 'state']),
         ]
+        # LOWER(email|first_name|last_name) text_pattern_ops indexes for
+        # case-insensitive prefix search are created in migration 0004.
         ordering = ['-created_at']
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored state, so a save that changes it can move the lead
+        # between rows of the daily stats rollup.
+        instance._stored_state = instance.__dict__.get('state')
+        # The stored resume, so a save that replaces it can move the
+        # reference between resume blobs.
+        if 'resume' in instance.__dict__:
+            instance._stored_resume = getattr(instance.__dict__['resume'], 'name', instance.__dict__['resume'])
+        return instance
+
     def clean(self):
         super().clean()
         if self.resume and self.resume.size > settings.MAX_UPLOAD_SIZE:
             raise ValidationError({
                 'resume': f'File size must be no more than {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB'
             })
+
+
+class LeadDailyStats(models.Model):
+    """
+    Number of leads created on ``day`` (in TIME_ZONE) that are currently in
+    ``state``. Kept up to date by leads.stats on intake, state changes and
+    deletes; reconcile it with ``rebuild_lead_stats``.
+    """
+    day = models.DateField()
+    state = models.CharField(max_length=20, choices=Lead.LeadState.choices)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'state'], name='leads_daily_stats_day_state_uniq'),
+        ]
+        ordering = ['day', 'state']
+
+    def __str__(self):
+        return f"{self.day} {self.state}: {self.count}"
+
+
+class LeadHourlyStats(models.Model):
+    """
+    Hourly counterpart of LeadDailyStats, for intake histograms with hour
+    buckets. ``hour`` is the start of the hour in TIME_ZONE.
+    """
+    hour = models.DateTimeField()
+    state = models.CharField(max_length=20, choices=Lead.LeadState.choices)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'state'], name='leads_hourly_stats_hour_state_uniq'),
+        ]
+        ordering = ['hour', 'state']
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.state}: {self.count}"
+
+
+class EmailOutbox(models.Model):
+    """Email written in the same transaction as the change that triggers it."""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        SENDING = 'SENDING', _('Sending')
+        SENT = 'SENT', _('Sent')
+        FAILED = 'FAILED', _('Failed')
+
+    lead = models.ForeignKey(
+        Lead,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='outbox_emails'
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    recipients = models.JSONField()
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a delivery worker claimed the row; see leads.emails.claim_outbox
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status='PENDING'),
+                name='leads_outbox_pending_idx'
+            ),
+        ]
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)}"
+
+
+class ResumeDocument(models.Model):
+    """
+    Output of the resume pipeline for one uploaded file: checksum, backup,
+    extracted text and metadata. ``idempotency_key`` names the upload, so a
+    retried or duplicated task skips the steps that already finished.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        PROCESSING = 'PROCESSING', _('Processing')
+        DONE = 'DONE', _('Done')
+        FAILED = 'FAILED', _('Failed')
+
+    lead = models.ForeignKey(
+        Lead,
+        on_delete=models.CASCADE,
+        related_name='resume_documents'
+    )
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    backup_name = models.CharField(max_length=255, blank=True)
+    text = models.TextField(blank=True)
+    metadata = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # to_tsvector(LEAD_SEARCH_CONFIG, text), set by leads.search.index_documents
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='leads_resume_search_idx'),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+
+class ResumeBlob(models.Model):
+    """
+    One content-addressed resume file (see leads.storage) and the number of
+    lead resumes and resume backups that point at it. Blobs nobody has
+    referenced for LEAD_RESUME_BLOB_GRACE seconds are deleted by
+    ``collect_resume_blobs``.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    checksum = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last change of ref_count
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(ref_count__lte=0),
+                name='leads_resume_blob_unused_idx'
+            ),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
@@ -0,0 +1,69 @@
+"""
+Health, readiness and metrics endpoints for the container orchestrator and
+Prometheus. They skip user authentication and do as little work as possible;
+/metrics only answers a trusted scraper (see metrics_allowed).
+"""
+import hmac
+import ipaddress
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@require_GET
+def health(request):
+    """Liveness: the process answers requests. Touches neither the database nor Redis."""
+    return JsonResponse({'status': 'ok'})
+
+
+@require_GET
+def ready(request):
+    """Readiness: one SELECT 1 and one cache read; 503 if either fails."""
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        checks['database'] = 'ok'
+    except Exception as exc:
+        logger.warning(f'Readiness check: database unavailable: {str(exc)}')
+        checks['database'] = 'unavailable'
+    try:
+        cache.get('leads:ready')
+        checks['cache'] = 'ok'
+    except Exception as exc:
+        logger.warning(f'Readiness check: cache unavailable: {str(exc)}')
+        checks['cache'] = 'unavailable'
+    ok = all(value == 'ok' for value in checks.values())
+    return JsonResponse({'status': 'ok' if ok else 'unavailable', 'checks': checks}, status=200 if ok else 503)
+
+
+def metrics_allowed(request):
+    """
+    True for a request bearing LEAD_METRICS_TOKEN or coming from an address
+    in LEAD_METRICS_ALLOWED_IPS. With neither configured nobody is allowed.
+    """
+    token = settings.LEAD_METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in settings.LEAD_METRICS_ALLOWED_IPS)
+
+
+@require_GET
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,68 @@
+"""
+Query budgets: the most database queries one request to a view may run,
+authentication and session lookups included.
+
+LeadViewSet declares them per action in ``query_budgets``; function views
+use the query_budget decorator. A budget may also be a function of the
+request, for an action whose work grows with the request body rather than
+with the table (the bulk import, per chunk). leads.middleware.MetricsMiddleware checks
+every request (streamed bodies included) against the budget of its view.
+An overrun is counted in http_request_query_budget_exceeded_total and
+logged, and raises QueryBudgetExceeded when LEAD_QUERY_BUDGET_MODE is
+'raise', which is how the tests turn a new per-row query into a failure.
+"""
+import logging
+
+from django.conf import settings
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+BUDGET_EXCEEDED = Counter(
+    'http_request_query_budget_exceeded_total', 'Requests that ran more database queries than their view allows.',
+    ['view'],
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """Declare the query budget of a function view."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def view_action(request):
+    """The viewset class and action that handled ``request``, or (None, None)."""
+    match = getattr(request, 'resolver_match', None)
+    cls = getattr(match.func, 'cls', None) if match is not None else None
+    if cls is None:
+        return None, None
+    method = request.method.lower()
+    return cls, (getattr(match.func, 'actions', None) or {}).get(method, method)
+
+
+def get_budget(request):
+    """The query budget of the view that handled ``request``; None if it has none."""
+    cls, action = view_action(request)
+    if cls is not None:
+        budget = getattr(cls, 'query_budgets', {}).get(action)
+    else:
+        match = getattr(request, 'resolver_match', None)
+        budget = getattr(match.func, 'query_budget', None) if match is not None else None
+    return budget(request) if callable(budget) else budget
+
+
+def check(view, budget, queries):
+    mode = settings.LEAD_QUERY_BUDGET_MODE
+    if budget is None or queries <= budget or mode == 'off':
+        return
+    BUDGET_EXCEEDED.labels(view).inc()
+    message = f'{view} ran {queries} database queries, over its budget of {budget}'
+    if mode == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
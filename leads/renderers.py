@@ -0,0 +1,38 @@
+import orjson
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class CSVRenderer(JSONRenderer):
+    """
+    Selects CSV for the export action. The action streams its own body;
+    error payloads (400, 401, ...) are still rendered as JSON.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(JSONRenderer):
+    """Selects newline-delimited JSON for the export action."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer's output, byte for byte, rendered by orjson: compact UTF-8,
+    datetimes in ISO 8601 with 'Z' for UTC, and U+2028 and U+2029 escaped.
+    Types orjson does not know go through DRF's encoder. Indented output
+    (``; indent=``) and any TIME_ZONE other than UTC, where OPT_UTC_Z no
+    longer matches DRF, are left to JSONRenderer.
+    """
+    options = orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if settings.TIME_ZONE != 'UTC' or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,214 @@
+import contextlib
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .blobs import replace_blob_ref
+from .extraction import ExtractionError, extract
+from .models import ResumeDocument
+from .search import index_documents
+from .storage import blob_checksum, resume_storage
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def resume_key(lead):
+    return f'{lead.pk}:{lead.resume.name}'
+
+
+def enqueue_resume(lead):
+    """
+    Record the uploaded resume and start the pipeline once the lead is
+    committed. Call it in the transaction that saves the lead. A direct
+    upload gets its document once the worker has imported it.
+    """
+    document = None
+    if lead.resume:
+        document, _ = ResumeDocument.objects.get_or_create(
+            idempotency_key=resume_key(lead),
+            defaults={'lead': lead, 'file_name': lead.resume.name},
+        )
+    transaction.on_commit(lambda: dispatch_resume(lead.pk))
+    return document
+
+
+def dispatch_resume(lead_id):
+    """Queue the pipeline; a broker outage only leaves the document PENDING."""
+    from .tasks import process_lead_resume
+
+    try:
+        process_lead_resume.delay(lead_id)
+    except Exception as exc:
+        logger.warning(f'Could not queue resume processing for lead {lead_id}: {str(exc)}')
+
+
+def get_extraction_pool():
+    """
+    Return this worker's extraction pool. Processes are spawned rather than
+    forked so they inherit no database connections or Celery state.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.LEAD_RESUME_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def reset_extraction_pool(kill=False):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    if kill:
+        # A timed-out extraction keeps running until its process dies.
+        for process in list(getattr(pool, '_processes', {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_extraction(path, file_format):
+    """Extract in the process pool, or inline when LEAD_RESUME_EXTRACT_WORKERS is 0."""
+    if not settings.LEAD_RESUME_EXTRACT_WORKERS:
+        return extract(path, file_format)
+    future = get_extraction_pool().submit(extract, path, file_format)
+    try:
+        return future.result(timeout=settings.LEAD_RESUME_EXTRACT_TIMEOUT)
+    except FutureTimeoutError:
+        reset_extraction_pool(kill=True)
+        raise ExtractionError(f'Extraction took longer than {settings.LEAD_RESUME_EXTRACT_TIMEOUT} seconds.')
+    except BrokenProcessPool:
+        reset_extraction_pool()
+        raise ExtractionError('The extraction process crashed.')
+
+
+def file_checksum(field_file):
+    checksum = blob_checksum(field_file.name)
+    if checksum:
+        # Content-addressed: the name is the checksum.
+        return checksum, field_file.size
+    digest = hashlib.sha256()
+    size = 0
+    with field_file.open('rb') as handle:
+        for chunk in handle.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def backup_resume(field_file):
+    """
+    Return the blob to reference as the resume's backup: the upload itself,
+    which is never modified in place, or for uploads from before
+    content-addressed storage, a blob stored from it.
+    """
+    if blob_checksum(field_file.name):
+        return field_file.name
+    with field_file.open('rb') as handle:
+        return resume_storage().save(field_file.name, handle)
+
+
+@contextlib.contextmanager
+def local_path(field_file):
+    """Yield a filesystem path for the file, copying it out of remote storage if needed."""
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path:
+        yield path
+        return
+    suffix = Path(field_file.name).suffix
+    with tempfile.NamedTemporaryFile(suffix=suffix) as copy:
+        with field_file.open('rb') as handle:
+            shutil.copyfileobj(handle, copy)
+        copy.flush()
+        yield copy.name
+
+
+def claim(document):
+    """
+    Mark the document PROCESSING unless another task holds it. A claim older
+    than the extraction timeout is considered abandoned (worker killed).
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=2 * settings.LEAD_RESUME_EXTRACT_TIMEOUT)
+    return ResumeDocument.objects.filter(
+        Q(status=ResumeDocument.Status.PENDING)
+        | Q(status=ResumeDocument.Status.PROCESSING, started_at__lt=stale),
+        pk=document.pk,
+    ).update(status=ResumeDocument.Status.PROCESSING, started_at=now)
+
+
+def process_resume(lead):
+    """
+    Run the pipeline for the lead's current resume: checksum, backup, text
+    and metadata extraction, then full-text indexing. Each finished step is
+    saved, so a retry picks up at the first unfinished one, and a finished
+    document is returned as is.
+    """
+    document, _ = ResumeDocument.objects.get_or_create(
+        idempotency_key=resume_key(lead),
+        defaults={'lead': lead, 'file_name': lead.resume.name},
+    )
+    if document.status == ResumeDocument.Status.DONE or not claim(document):
+        return document
+    document.refresh_from_db()
+    document.attempts += 1
+    document.save(update_fields=['attempts'])
+
+    try:
+        if not document.checksum:
+            document.checksum, document.size = file_checksum(lead.resume)
+            document.save(update_fields=['checksum', 'size'])
+        if not document.backup_name or not resume_storage().exists(document.backup_name):
+            backup_name = backup_resume(lead.resume)
+            with transaction.atomic():
+                replace_blob_ref(document.backup_name, backup_name)
+                document.backup_name = backup_name
+                document.save(update_fields=['backup_name'])
+
+        file_format = os.path.splitext(lead.resume.name)[1].lower().lstrip('.')
+        with local_path(lead.resume) as path:
+            result = run_extraction(path, file_format)
+    except ExtractionError as exc:
+        logger.warning(f'Cannot extract resume text for lead {lead.pk}: {str(exc)}')
+        document.status = ResumeDocument.Status.FAILED
+        document.error = str(exc)
+        document.save(update_fields=['status', 'error'])
+        return document
+    except Exception as exc:
+        # Transient (storage, pool): hand the document back for the retry.
+        document.status = ResumeDocument.Status.PENDING
+        document.error = str(exc)
+        document.save(update_fields=['status', 'error'])
+        raise
+
+    document.text = result['text'][:settings.LEAD_RESUME_MAX_TEXT]
+    document.metadata = {**result['metadata'], 'format': file_format, 'size': document.size}
+    document.status = ResumeDocument.Status.DONE
+    document.error = ''
+    document.processed_at = timezone.now()
+    document.save(update_fields=['text', 'metadata', 'status', 'error', 'processed_at'])
+    index_documents(ResumeDocument.objects.filter(pk=document.pk))
+    return document
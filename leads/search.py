@@ -0,0 +1,123 @@
+import html
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, FloatField, Max, Min, Q
+from django.db.models.functions import Cast
+
+from .models import ResumeDocument
+
+# ts_headline marks matches with these; the snippet is HTML-escaped before
+# they become <mark> tags, so markup in a resume never reaches the client.
+MATCH_START, MATCH_STOP = '\x02', '\x03'
+
+
+def resume_vector():
+    return SearchVector('text', config=settings.LEAD_SEARCH_CONFIG)
+
+
+def parse_query(text):
+    """Parse web-search syntax: words, "quoted phrases", OR, -excluded."""
+    return SearchQuery(text, search_type='websearch', config=settings.LEAD_SEARCH_CONFIG)
+
+
+def index_documents(queryset):
+    """Recompute the search vector of every document in ``queryset`` with one UPDATE."""
+    return queryset.update(search_vector=resume_vector())
+
+
+def _range_documents(first_id, last_id, only_missing):
+    documents = ResumeDocument.objects.filter(
+        id__gte=first_id, id__lte=last_id, status=ResumeDocument.Status.DONE
+    )
+    if only_missing:
+        documents = documents.filter(search_vector__isnull=True)
+    return documents
+
+
+def _index_range_in_thread(first_id, last_id, only_missing):
+    try:
+        return index_documents(_range_documents(first_id, last_id, only_missing))
+    finally:
+        # Each worker thread opened its own connection.
+        connections.close_all()
+
+
+def backfill_index(chunk_size=1000, workers=4, only_missing=True):
+    """
+    Index processed resumes in id-range chunks, ``workers`` chunks at a time
+    on separate connections, so a large backfill uses several PostgreSQL
+    backends and no transaction holds row locks for long. Returns the
+    number of documents indexed.
+    """
+    bounds = ResumeDocument.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return 0
+    ranges = [
+        (start, min(start + chunk_size - 1, bounds['last']), only_missing)
+        for start in range(bounds['first'], bounds['last'] + 1, chunk_size)
+    ]
+    if workers <= 1:
+        return sum(index_documents(_range_documents(*chunk)) for chunk in ranges)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(lambda chunk: _index_range_in_thread(*chunk), ranges))
+
+
+def search_resumes(text, after=None, limit=20):
+    """
+    Return up to ``limit`` processed resumes matching ``text``, best first,
+    as documents annotated with ``rank`` (ties broken by id). ``after`` is
+    the (rank, id) of the last hit of the previous page. Only the document
+    of each lead's current resume is searched, not those of replaced ones.
+
+    Ranking reads the GIN index matches only; snippets are generated
+    separately for the returned page (see ``add_snippets``) because
+    ts_headline re-parses the whole text.
+    """
+    query = parse_query(text)
+    # ts_rank is float4; cast so the rank in a cursor compares exactly.
+    rank = Cast(SearchRank(F('search_vector'), query), output_field=FloatField())
+    documents = (
+        ResumeDocument.objects
+        .filter(search_vector=query, status=ResumeDocument.Status.DONE, lead__resume=F('file_name'))
+        .annotate(rank=rank)
+        .select_related('lead')
+        .defer('text', 'search_vector')
+    )
+    if after is not None:
+        after_rank, after_id = after
+        documents = documents.filter(Q(rank__lt=after_rank) | Q(rank=after_rank, id__lt=after_id))
+    return list(documents.order_by('-rank', '-id')[:limit])
+
+
+def add_snippets(documents, text, max_fragments=2):
+    """
+    Set ``snippet`` on each document: HTML-escaped matching fragments with
+    <mark> around the terms.
+    """
+    if not documents:
+        return documents
+    snippets = dict(
+        ResumeDocument.objects
+        .filter(id__in=[document.id for document in documents])
+        .annotate(snippet=SearchHeadline(
+            'text',
+            parse_query(text),
+            config=settings.LEAD_SEARCH_CONFIG,
+            start_sel=MATCH_START,
+            stop_sel=MATCH_STOP,
+            max_fragments=max_fragments,
+            fragment_delimiter=' … ',
+        ))
+        .values_list('id', 'snippet')
+    )
+    for document in documents:
+        document.snippet = highlight(snippets.get(document.id) or '')
+    return documents
+
+
+def highlight(headline):
+    escaped = html.escape(headline, quote=False)
+    return escaped.replace(MATCH_START, '<mark>').replace(MATCH_STOP, '</mark>')
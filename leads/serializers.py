@@ -1,6 +1,22 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.core.validators import EmailValidator
+from django.db.models import CharField, Value
+from django.db.models.functions import Concat
+from . import direct_uploads
 from .models import Lead
+from .uploads import RESUME_SIGNATURES, rejected_uploads
+
+
+class ResumeField(serializers.FileField):
+    """A resume file, or the key of a direct upload (see leads.direct_uploads)."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data:
+            if not direct_uploads.enabled() or not direct_uploads.is_upload_key(data):
+                raise serializers.ValidationError('Not a valid resume upload key.')
+            return data
+        return super().to_internal_value(data)
 
 
 
@@ -18,15 +34,24 @@ class LeadCreateSerializer(serializers.ModelSerializer):
         max_length=20,
         help_text="Last name of the lead"
     )
-    resume = serializers.FileField(
+    resume = ResumeField(
         required=False,
-        help_text="Resume file (PDF, DOC, or DOCX format, max 5MB)"
+        help_text="Resume file (PDF, DOC, or DOCX format, max 5MB), or the key of a direct upload"
     )
 
     class Meta:
         model = Lead
         fields = ['first_name', 'last_name', 'email', 'resume']
 
+    def to_internal_value(self, data):
+        # An upload aborted by ResumeUploadHandler cut the body short, so
+        # the fields after it are missing; report only the upload.
+        request = self.context.get('request')
+        rejected = rejected_uploads(request) if request is not None else {}
+        if rejected:
+            raise serializers.ValidationError({field: [reason] for field, reason in rejected.items()})
+        return super().to_internal_value(data)
+
     def validate(self, data):
         """
         Validate the entire data set.
@@ -34,6 +59,21 @@ class LeadCreateSerializer(serializers.ModelSerializer):
         # Add any cross-field validation here
         return data
 
+    def create(self, validated_data):
+        return super().create(self.lead_fields(validated_data))
+
+    async def acreate(self):
+        """save() for the async views, with the async ORM."""
+        self.instance = await Lead.objects.acreate(**self.lead_fields(self.validated_data))
+        return self.instance
+
+    def lead_fields(self, validated_data):
+        fields = dict(validated_data)
+        if isinstance(fields.get('resume'), str):
+            # Imported from object storage by the resume worker
+            fields['resume_upload'] = fields.pop('resume')
+        return fields
+
 
 class LeadListSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
@@ -45,6 +85,34 @@ class LeadListSerializer(serializers.ModelSerializer):
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
 
+
+def list_values(queryset):
+    """
+    The columns LeadListSerializer reads, as dicts instead of model
+    instances, with full_name concatenated by the database. Turn the page
+    into the serializer's output with list_data.
+    """
+    full_name = Concat('first_name', Value(' '), 'last_name', output_field=CharField())
+    return queryset.annotate(full_name=full_name).values(*LeadListSerializer.Meta.fields)
+
+
+def list_data(rows):
+    """LeadListSerializer(...).data for rows of list_values, field order included."""
+    fields = LeadListSerializer.Meta.fields
+    data = [{field: row[field] for field in fields} for row in rows]
+    if settings.TIME_ZONE != 'UTC':
+        # Datetimes are left to ORJSONRenderer only in UTC; elsewhere the
+        # serializer's fields render them in the local time zone.
+        datetimes = {
+            name: field for name, field in LeadListSerializer().fields.items()
+            if isinstance(field, serializers.DateTimeField)
+        }
+        for item in data:
+            for name, field in datetimes.items():
+                item[name] = field.to_representation(item[name])
+    return data
+
+
 class LeadDetailSerializer(serializers.ModelSerializer):
     resume_url = serializers.SerializerMethodField()
     full_name = serializers.SerializerMethodField()
@@ -83,3 +151,46 @@ class LeadStateUpdateSerializer(serializers.ModelSerializer):
         return value
 
 
+class LeadBulkStateUpdateSerializer(LeadStateUpdateSerializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=settings.LEAD_BULK_MAX_IDS,
+        help_text="Leads to update; when omitted the list filters in the query string select them"
+    )
+    from_state = serializers.ChoiceField(
+        choices=Lead.LeadState.choices,
+        required=False,
+        help_text="Only update leads currently in this state"
+    )
+
+    class Meta(LeadStateUpdateSerializer.Meta):
+        fields = ['state', 'ids', 'from_state']
+
+
+class ResumeSearchHitSerializer(serializers.Serializer):
+    lead = LeadListSerializer()
+    rank = serializers.FloatField()
+    snippet = serializers.CharField()
+
+
+class ResumeUploadSerializer(serializers.Serializer):
+    file_name = serializers.CharField(
+        max_length=255,
+        help_text="Name of the resume file (PDF, DOC, or DOCX)"
+    )
+    size = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.MAX_UPLOAD_SIZE,
+        help_text="Exact size of the file in bytes"
+    )
+
+    def validate_file_name(self, value):
+        extension = value.rsplit('.', 1)[-1].lower() if '.' in value else ''
+        if extension not in RESUME_SIGNATURES:
+            raise serializers.ValidationError(
+                f"File extension “{extension}” is not allowed. "
+                f"Allowed extensions are: {', '.join(RESUME_SIGNATURES)}."
+            )
+        return value
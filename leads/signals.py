@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .blobs import adjust_blob_refs, replace_blob_ref
+from .cache import invalidate
+from .models import Lead, ResumeDocument
+from .stats import record_created, record_deleted, record_state_change
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_delete, sender=Lead)
+def invalidate_lead_cache(sender, using, **kwargs):
+    # After commit, so a concurrent read cannot cache the old row under the
+    # new version.
+    transaction.on_commit(invalidate, using=using)
+
+
+@receiver(post_save, sender=Lead)
+def update_daily_stats(sender, instance, created, using, **kwargs):
+    stored_state = getattr(instance, '_stored_state', None)
+    if created:
+        record_created([instance], using=using)
+    elif stored_state and stored_state != instance.state:
+        record_state_change(instance, stored_state, using=using)
+    instance._stored_state = instance.state
+
+
+@receiver(post_delete, sender=Lead)
+def remove_from_daily_stats(sender, instance, using, **kwargs):
+    record_deleted(instance, using=using)
+
+
+@receiver(post_save, sender=Lead)
+def update_resume_refs(sender, instance, created, using, update_fields, **kwargs):
+    if update_fields is not None and 'resume' not in update_fields:
+        return
+    current = instance.resume.name or ''
+    # Leads loaded without the resume column keep the one they had.
+    stored = '' if created else getattr(instance, '_stored_resume', current) or ''
+    if stored != current:
+        replace_blob_ref(stored, current, using=using)
+    instance._stored_resume = current
+
+
+@receiver(post_delete, sender=Lead)
+def release_resume(sender, instance, using, **kwargs):
+    adjust_blob_refs({instance.resume.name: -1}, using=using)
+
+
+@receiver(post_delete, sender=ResumeDocument)
+def release_resume_backup(sender, instance, using, **kwargs):
+    adjust_blob_refs({instance.backup_name: -1}, using=using)
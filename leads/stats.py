@@ -0,0 +1,269 @@
+import datetime
+from collections import Counter, OrderedDict
+
+from django.db import connections, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import Lead, LeadDailyStats, LeadHourlyStats
+
+
+def lead_day(moment):
+    return timezone.localtime(moment).date()
+
+
+def lead_hour(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+# (model, bucket field, bucket of a created_at, database truncation)
+ROLLUPS = {
+    'day': (LeadDailyStats, 'day', lead_day, TruncDate),
+    'hour': (LeadHourlyStats, 'hour', lead_hour, TruncHour),
+}
+BUCKETS = tuple(ROLLUPS)
+
+
+def day_bounds(first_day, last_day=None):
+    """Return the half-open [start, end) datetime range covering the given days."""
+    last_day = last_day or first_day
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def lead_counts(start, end):
+    """
+    Count the leads created in [start, end), in total and per state, with one
+    conditional-aggregate query over the created_at index.
+    """
+    return Lead.objects.filter(created_at__gte=start, created_at__lt=end).aggregate(
+        total=Count('id'),
+        **{state.lower(): Count('id', filter=Q(state=state)) for state in Lead.LeadState.values},
+    )
+
+
+def rollup_counts(first_day, last_day):
+    """
+    The same counts as ``lead_counts`` for whole days, read from the rollup:
+    at most one row per day and state, however many leads there are.
+    """
+    return LeadDailyStats.objects.filter(day__gte=first_day, day__lte=last_day).aggregate(
+        total=Coalesce(Sum('count'), 0),
+        **{
+            state.lower(): Coalesce(Sum('count', filter=Q(state=state)), 0)
+            for state in Lead.LeadState.values
+        },
+    )
+
+
+def apply_deltas(bucket, deltas, using='default'):
+    """
+    Add ``deltas`` ({(bucket value, state): n}) to one rollup. On PostgreSQL
+    this is one INSERT ... ON CONFLICT that increments in place, so
+    concurrent writers never lose an update.
+    """
+    model, field, _, _ = ROLLUPS[bucket]
+    rows = sorted((key, n) for key, n in deltas.items() if n)
+    if not rows:
+        return
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        with transaction.atomic(using=using):
+            for (value, state), n in rows:
+                stats = model.objects.using(using).filter(**{field: value, 'state': state})
+                if not stats.update(count=F('count') + n):
+                    model.objects.using(using).create(**{field: value, 'state': state, 'count': n})
+        return
+
+    table = model._meta.db_table
+    values = ', '.join(['(%s, %s, %s)'] * len(rows))
+    params = [value for (key, state), n in rows for value in (key, state, n)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO "{table}" ("{field}", "state", "count") VALUES {values} '
+            f'ON CONFLICT ("{field}", "state") DO UPDATE SET "count" = "{table}"."count" + EXCLUDED."count"',
+            params,
+        )
+
+
+def apply_changes(changes, using='default'):
+    """Apply {(created_at, state): n} to every rollup."""
+    for bucket, (_, _, bucket_of, _) in ROLLUPS.items():
+        deltas = Counter()
+        for (created_at, state), n in changes.items():
+            deltas[(bucket_of(created_at), state)] += n
+        apply_deltas(bucket, deltas, using=using)
+
+
+def record_created(leads, using='default'):
+    apply_changes(Counter((lead.created_at, lead.state) for lead in leads), using=using)
+
+
+def record_deleted(lead, using='default'):
+    apply_changes({(lead.created_at, lead.state): -1}, using=using)
+
+
+def record_state_change(lead, old_state, using='default'):
+    apply_changes({(lead.created_at, old_state): -1, (lead.created_at, lead.state): 1}, using=using)
+
+
+def record_transitions(rows, state, using='default'):
+    """Apply (id, created_at, old_state) rows returned by a bulk transition."""
+    changes = Counter()
+    for _, created_at, old_state in rows:
+        changes[(created_at, old_state)] -= 1
+        changes[(created_at, state)] += 1
+    apply_changes(changes, using=using)
+
+
+def compute_stats(bucket, start=None, end=None, using='default'):
+    """Recount one rollup from Lead, optionally for [start, end): {(bucket value, state): count}."""
+    _, _, _, trunc = ROLLUPS[bucket]
+    leads = Lead.objects.using(using).order_by()
+    if start is not None:
+        leads = leads.filter(created_at__gte=start)
+    if end is not None:
+        leads = leads.filter(created_at__lt=end)
+    rows = leads.annotate(bucket=trunc('created_at')).values('bucket', 'state').annotate(count=Count('id'))
+    return {(row['bucket'], row['state']): row['count'] for row in rows}
+
+
+def stored_stats(bucket, start=None, end=None, using='default'):
+    model, field, bucket_of, _ = ROLLUPS[bucket]
+    rows = model.objects.using(using).order_by()
+    if start is not None:
+        rows = rows.filter(**{f'{field}__gte': bucket_of(start)})
+    if end is not None:
+        rows = rows.filter(**{f'{field}__lt': bucket_of(end)})
+    return {(value, state): count for value, state, count in rows.values_list(field, 'state', 'count') if count}
+
+
+def reconcile_stats(start=None, end=None, dry_run=False, using='default'):
+    """
+    Recount the rollups from Lead, for all time or for [start, end) aligned
+    to whole days, and correct the rows that drifted. On PostgreSQL the
+    rollups are locked first, so intake running meanwhile waits and is
+    applied on top of the corrected counts. Returns the number of rows that
+    were (or, with ``dry_run``, would be) corrected per rollup.
+    """
+    if start is not None:
+        start = day_bounds(lead_day(start))[0]
+    if end is not None and end != day_bounds(lead_day(end))[0]:
+        end = day_bounds(lead_day(end))[1]
+    corrected = {}
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql' and not dry_run:
+            tables = ', '.join(f'"{model._meta.db_table}"' for model, _, _, _ in ROLLUPS.values())
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {tables} IN EXCLUSIVE MODE')
+        for bucket in ROLLUPS:
+            actual = compute_stats(bucket, start, end, using=using)
+            stored = stored_stats(bucket, start, end, using=using)
+            deltas = {
+                key: actual.get(key, 0) - stored.get(key, 0)
+                for key in actual.keys() | stored.keys()
+                if actual.get(key, 0) != stored.get(key, 0)
+            }
+            corrected[bucket] = len(deltas)
+            if not dry_run:
+                apply_deltas(bucket, deltas, using=using)
+                model, _, _, _ = ROLLUPS[bucket]
+                model.objects.using(using).filter(count=0).delete()
+    return corrected
+
+
+def bucket_start(moment, bucket):
+    if bucket == 'hour':
+        return lead_hour(moment)
+    return day_bounds(lead_day(moment))[0]
+
+
+def shift_bucket(moment, bucket, count=1):
+    """Move a bucket start ``count`` buckets forward (or back), DST-safe."""
+    if bucket == 'hour':
+        return timezone.localtime(moment.astimezone(datetime.timezone.utc) + datetime.timedelta(hours=count))
+    return day_bounds(lead_day(moment) + datetime.timedelta(days=count))[0]
+
+
+def bucket_range(start, end, bucket):
+    """Yield the start of every bucket in [start, end)."""
+    current = start
+    while current < end:
+        yield current
+        current = shift_bucket(current, bucket)
+
+
+def bucket_count(start, end, bucket):
+    if bucket == 'hour':
+        return int((end - start).total_seconds() // 3600)
+    return (lead_day(end) - lead_day(start)).days
+
+
+def stats_window(bucket, start=None, end=None, default_buckets=None):
+    """
+    Align [start, end) outwards to ``bucket`` boundaries. ``end`` defaults
+    to the end of the current bucket and ``start`` to ``default_buckets``
+    (30 days or 24 hours) before it.
+    """
+    end = end or timezone.now()
+    aligned = bucket_start(end, bucket)
+    end = aligned if aligned == end else shift_bucket(aligned, bucket)
+    if start is None:
+        default_buckets = default_buckets or (24 if bucket == 'hour' else 30)
+        start = shift_bucket(end, bucket, -default_buckets)
+    else:
+        start = bucket_start(start, bucket)
+    return start, end
+
+
+def intake_stats(start, end, bucket='day', recompute=False):
+    """
+    State counts and an intake histogram for leads created in [start, end),
+    with ``start`` and ``end`` on ``bucket`` boundaries.
+
+    Reads at most one rollup row per bucket and state, so the cost depends on
+    the window, not on the number of leads. With ``recompute`` the window is
+    recounted from Lead and the rollups are reconciled first.
+    """
+    if recompute:
+        reconcile_stats(start, end)
+    model, field, bucket_of, _ = ROLLUPS[bucket]
+    rows = model.objects.filter(**{f'{field}__gte': bucket_of(start), f'{field}__lt': bucket_of(end)})
+
+    states = OrderedDict((state, 0) for state in Lead.LeadState.values)
+    intake = Counter()
+    for value, state, count in rows.values_list(field, 'state', 'count'):
+        states[state] = states.get(state, 0) + count
+        intake[value] += count
+
+    histogram = []
+    for moment in bucket_range(start, end, bucket):
+        key = moment.date() if bucket == 'day' else moment
+        histogram.append(OrderedDict([('start', moment), ('count', intake.get(key, 0))]))
+    return OrderedDict([
+        ('start', start),
+        ('end', end),
+        ('bucket', bucket),
+        ('total', sum(states.values())),
+        ('states', states),
+        ('intake', histogram),
+    ])
+
+
+def build_daily_report(day):
+    """Return (subject, message) for the daily lead report of ``day``."""
+    counts = lead_counts(*day_bounds(day))
+    week = rollup_counts(day - datetime.timedelta(days=6), day)
+    month = rollup_counts(day.replace(day=1), day)
+
+    subject = f'Daily Lead Report - {day}'
+    message = 'Daily Lead Report\n\n'
+    message += f'Total Leads: {counts["total"]}\n'
+    message += f'Pending Leads: {counts["pending"]}\n'
+    message += f'Reached Out Leads: {counts["reached_out"]}\n\n'
+    for label, period in (('Last 7 Days', week), ('Month to Date', month)):
+        message += f'{label}: {period["total"]} leads ({period["pending"]} pending, {period["reached_out"]} reached out)\n'
+    return subject, message
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.deconstruct import deconstructible
+
+# <directory>/<first two hex digits>/<sha256><suffix>
+BLOB_NAME = re.compile(r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})(\.[A-Za-z0-9]+)?$')
+
+
+def blob_checksum(name):
+    """Return the SHA-256 a content-addressed ``name`` was stored under, or None."""
+    match = BLOB_NAME.search(name or '')
+    return match.group(2) if match else None
+
+
+def resume_storage():
+    return storages['resumes']
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after the SHA-256 of its
+    bytes, keeping the directory and suffix of the requested name:
+    ``resumes/cv.pdf`` is stored as ``resumes/ab/ab12….pdf``. Saving bytes
+    that are already stored returns the existing name without writing a
+    copy; leads.blobs counts the references to each file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The stored name depends on the content, not on what else exists.
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name).replace('\\', '/')
+        suffix = os.path.splitext(name)[1].lower()
+        self._ensure_directory(self.path(directory))
+        digest = hashlib.sha256()
+        # Hash while writing a temporary file next to the blobs, so the
+        # upload is read once and a blob never appears half written.
+        fd, temporary = tempfile.mkstemp(prefix='.upload-', dir=self.path(directory))
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    handle.write(chunk)
+            checksum = digest.hexdigest()
+            name = '/'.join(part for part in (directory, checksum[:2], checksum + suffix) if part)
+            full_path = self.path(name)
+            self._ensure_directory(os.path.dirname(full_path))
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            try:
+                os.link(temporary, full_path)
+            except FileExistsError:
+                # Same bytes already stored. Touch the file so garbage
+                # collection treats it as recently used until the new
+                # reference is committed.
+                os.utime(full_path)
+        finally:
+            os.unlink(temporary)
+        return name
+
+    def _ensure_directory(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def blobs(self, directory):
+        """Yield the name of every content-addressed file under ``directory``."""
+        if not self.exists(directory):
+            return
+        for prefix in self.listdir(directory)[0]:
+            for file_name in self.listdir(f'{directory}/{prefix}')[1]:
+                name = f'{directory}/{prefix}/{file_name}'
+                if blob_checksum(name):
+                    yield name
@@ -4,68 +4,101 @@ from django.conf import settings
 from celery.exceptions import MaxRetriesExceededError
 from django.core.files.storage import default_storage
 import logging
-import os
-from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(
-    bind=True,
-    max_retries=3,
-    default_retry_delay=300,  # 5 minutes
-    rate_limit='10/m'  # 10 tasks per minute
-)
-def send_lead_notification_email(self, lead_email, lead_name):
-    try:
-        subject = f'New Lead: {lead_name}'
-        message = f'A new lead has been submitted by {lead_name} ({lead_email}).'
+@shared_task(ignore_result=True)
+def send_lead_notification_email(lead_email, lead_name):
+    """
+    Queue the attorney notification for the batched delivery worker.
+    """
+    from .models import EmailOutbox
 
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.ATTORNEY_EMAIL],
-            fail_silently=False,
-        )
-        logger.info(f'Notification email sent for lead: {lead_name}')
-        return f'Notification email sent for lead: {lead_name}'
-    except Exception as exc:
-        logger.error(f'Failed to send notification email for lead {lead_name}: {str(exc)}')
-        try:
-            self.retry(exc=exc)
-        except MaxRetriesExceededError:
-            logger.error(f'Max retries exceeded for notification email to {lead_name}')
-            raise
+    EmailOutbox.objects.create(
+        subject=f'New Lead: {lead_name}',
+        body=f'A new lead has been submitted by {lead_name} ({lead_email}).',
+        recipients=[settings.ATTORNEY_EMAIL],
+    )
+    logger.info(f'Notification email queued for lead: {lead_name}')
+    return f'Notification email queued for lead: {lead_name}'
+
+@shared_task(ignore_result=True)
+def send_lead_confirmation_email(lead_email, lead_name):
+    """
+    Queue the prospect confirmation for the batched delivery worker.
+    """
+    from .models import EmailOutbox
+
+    EmailOutbox.objects.create(
+        subject='Thank you for your interest',
+        body=f'Dear {lead_name},\n\nThank you for submitting your information. We will review it and get back to you soon.\n\nBest regards,\nYour Company Name',
+        recipients=[lead_email],
+    )
+    logger.info(f'Confirmation email queued for: {lead_email}')
+    return f'Confirmation email queued for: {lead_email}'
 
 @shared_task(
     bind=True,
     max_retries=3,
-    default_retry_delay=300,  # 5 minutes
-    rate_limit='10/m'  # 10 tasks per minute
+    default_retry_delay=60,  # 1 minute
 )
-def send_lead_confirmation_email(self, lead_email, lead_name):
+def deliver_outbox_emails(self, outbox_ids):
+    """
+    Deliver the outbox rows written by a single lead intake.
+    """
     try:
-        subject = 'Thank you for your interest'
-        message = f'Dear {lead_name},\n\nThank you for submitting your information. We will review it and get back to you soon.\n\nBest regards,\nYour Company Name'
+        from .emails import deliver_outbox
 
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[lead_email],
-            fail_silently=False,
-        )
-        logger.info(f'Confirmation email sent to: {lead_email}')
-        return f'Confirmation email sent to: {lead_email}'
+        sent = deliver_outbox(outbox_ids=outbox_ids)
+        logger.info(f'Delivered {sent} outbox emails for {outbox_ids}')
+        return f'Delivered {sent} outbox emails'
     except Exception as exc:
-        logger.error(f'Failed to send confirmation email to {lead_email}: {str(exc)}')
+        logger.error(f'Failed to deliver outbox emails {outbox_ids}: {str(exc)}')
         try:
             self.retry(exc=exc)
         except MaxRetriesExceededError:
-            logger.error(f'Max retries exceeded for confirmation email to {lead_email}')
+            logger.error(f'Max retries exceeded for outbox emails {outbox_ids}')
             raise
 
+@shared_task(ignore_result=True)
+def deliver_email_batches(max_runtime=None):
+    """
+    Batched delivery worker: drains the outbox over one SMTP connection,
+    waiting up to LEAD_EMAIL_BATCH_LINGER seconds for a batch to fill.
+    Scheduled every minute by beat; runs until the outbox is empty, for
+    just under a minute at most.
+    """
+    from .emails import run_delivery
+
+    sent = run_delivery(max_runtime=max_runtime)
+    if sent:
+        logger.info(f'Delivered {sent} outbox emails in batches')
+
+@shared_task(ignore_result=True)
+def reconcile_lead_stats():
+    """
+    Nightly safety net for the stats rollups: recount them from Lead and fix
+    any drift, e.g. from leads changed with a plain queryset.update().
+    """
+    from .stats import reconcile_stats
+
+    corrected = reconcile_stats()
+    if any(corrected.values()):
+        logger.warning(f'Corrected drifted lead stats rows: {corrected}')
+
+@shared_task(ignore_result=True)
+def collect_resume_blobs():
+    """
+    Nightly: delete the resume blobs that no lead or backup has referenced
+    for LEAD_RESUME_BLOB_GRACE seconds.
+    """
+    from .blobs import collect_blobs
+
+    collected = collect_blobs()
+    if collected['files']:
+        logger.info(f"Deleted {collected['files']} unused resume files ({collected['bytes']} bytes)")
+
 @shared_task(
     bind=True,
     max_retries=3,
@@ -76,17 +109,11 @@ def send_daily_lead_report(self):
     try:
         from django.utils import timezone
         from datetime import timedelta
-        from .models import Lead
-
-        yesterday = timezone.now() - timedelta(days=1)
-        leads = Lead.objects.filter(created_at__date=yesterday.date())
-        
-        subject = f'Daily Lead Report - {yesterday.date()}'
-        message = f'Daily Lead Report\n\n'
-        message += f'Total Leads: {leads.count()}\n'
-        message += f'Pending Leads: {leads.filter(state="PENDING").count()}\n'
-        message += f'Reached Out Leads: {leads.filter(state="REACHED_OUT").count()}\n\n'
-        
+        from .stats import build_daily_report
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        subject, message = build_daily_report(yesterday)
+
         send_mail(
             subject=subject,
             message=message,
@@ -94,8 +121,8 @@ def send_daily_lead_report(self):
             recipient_list=[settings.ATTORNEY_EMAIL],
             fail_silently=False,
         )
-        logger.info(f'Daily lead report sent for {yesterday.date()}')
-        return f'Daily lead report sent for {yesterday.date()}'
+        logger.info(f'Daily lead report sent for {yesterday}')
+        return f'Daily lead report sent for {yesterday}'
     except Exception as exc:
         logger.error(f'Failed to send daily lead report: {str(exc)}')
         try:
@@ -108,47 +135,39 @@ def send_daily_lead_report(self):
     bind=True,
     max_retries=3,
     default_retry_delay=300,  # 5 minutes
-    rate_limit='10/m'  # 10 tasks per minute
+    rate_limit='10/m',  # 10 tasks per minute
+    acks_late=True,
 )
 def process_lead_resume(self, lead_id):
     """
-    Process the uploaded resume for a lead.
-    - Validates file format
-    - Creates backup copy
-    - Extracts text for search indexing
-    - Updates lead status
+    Process the uploaded resume for a lead, queued after the lead commits.
+    - Verifies a direct upload and moves it into resume storage
+    - Computes a SHA-256 checksum
+    - References the content-addressed file as the backup
+    - Extracts text and metadata (PDF, DOC, DOCX) in a process pool
+    - Stores the result in a ResumeDocument
+
+    The document's idempotency key makes redelivered or retried tasks skip
+    the steps that already finished.
     """
+    from .models import Lead
+
     try:
-        from .models import Lead
-        import shutil
-        from datetime import datetime
+        from .resumes import process_resume
 
         lead = Lead.objects.get(id=lead_id)
+        if lead.resume_upload:
+            from .direct_uploads import import_upload
+
+            if not import_upload(lead):
+                return f'Resume upload rejected for lead ID: {lead_id}'
         if not lead.resume:
             logger.warning(f'No resume found for lead {lead_id}')
             return f'No resume found for lead ID: {lead_id}'
 
-        # Create backup directory if it doesn't exist
-        backup_dir = os.path.join(settings.MEDIA_ROOT, 'resume_backups')
-        os.makedirs(backup_dir, exist_ok=True)
-
-        # Create backup with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"{lead.last_name}_{lead.first_name}_{timestamp}{Path(lead.resume.name).suffix}"
-        backup_path = os.path.join(backup_dir, backup_filename)
-
-        # Copy file to backup location
-        shutil.copy2(lead.resume.path, backup_path)
-        logger.info(f'Created backup of resume for lead {lead_id} at {backup_path}')
-
-        # Here you could add additional processing like:
-        # - Text extraction for search indexing
-        # - File format conversion
-        # - Metadata extraction
-        # - Virus scanning
-        # - etc.
-
-        return f'Resume processed for lead ID: {lead_id}'
+        document = process_resume(lead)
+        logger.info(f'Resume for lead {lead_id} is {document.status}')
+        return f'Resume {document.status.lower()} for lead ID: {lead_id}'
     except Lead.DoesNotExist:
         logger.error(f'Lead {lead_id} not found')
         raise
@@ -158,4 +177,4 @@ def process_lead_resume(self, lead_id):
             self.retry(exc=exc)
         except MaxRetriesExceededError:
             logger.error(f'Max retries exceeded for resume processing of lead {lead_id}')
-            raise
\ No newline at end of file
+            raise
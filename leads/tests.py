@@ -4,18 +4,73 @@ from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
 from django.core import mail
+from django.core.mail import get_connection
 from django.conf import settings
-from .models import Lead
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import mock, skipUnless
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from aiosmtpd.controller import Controller
+from asgiref.sync import async_to_sync
+from moto import mock_aws
+from prometheus_client import REGISTRY
+from django.core.cache import cache
+from . import cache as lead_cache
+from .emails import deliver_outbox, enqueue_lead_emails, run_delivery
+from .filters import LeadFilterBackend
+from .idempotency import IdempotentRequest
+from .mailer import LocalTokenBucket, asend_messages, get_mailer
+from .blobs import collect_blobs, recount_blob_refs
+from .direct_uploads import get_client, import_upload, s3_client
+from .models import EmailOutbox, Lead, LeadDailyStats, ResumeBlob, ResumeDocument
+from .query_budget import QueryBudgetExceeded
+from .resumes import reset_extraction_pool
+from .search import index_documents, parse_query, search_resumes
+from .serializers import LeadListSerializer
+from .storage import resume_storage
+from .throttling import SlidingWindow, acquire_slot, release_slot
+from .stats import build_daily_report, compute_stats, day_bounds, intake_stats, lead_counts, reconcile_stats, rollup_counts
+from .tasks import process_lead_resume, send_daily_lead_report, send_lead_confirmation_email, send_lead_notification_email
+from .uploads import rejected_uploads
+import csv
+import datetime
+import hashlib
+import io
+import json
+import requests
+import socket
+import ssl
 import tempfile
+import time
 import os
+import threading
 
+# In-process cache so tests never share entries through a developer's Redis.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def sample(name, **labels):
+    """Current value of a Prometheus sample, 0 if it was never recorded."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
 class LeadAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.token = Token.objects.create(user=self.user)
         self.client = APIClient()
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
         self.temp_file = tempfile.NamedTemporaryFile(suffix='.pdf')
         self.temp_file.write(b'Mock resume content')
         self.temp_file.seek(0)
@@ -29,9 +84,8 @@ class LeadAPITestCase(TestCase):
 
     def tearDown(self):
         self.temp_file.close()
-        if self.lead.resume:
-            if os.path.isfile(self.lead.resume.path):
-                os.remove(self.lead.resume.path)
+        self.media_override.disable()
+        self.media.cleanup()
 
     def test_create_lead_public(self):
         url = reverse('lead-list')
@@ -39,7 +93,7 @@ class LeadAPITestCase(TestCase):
             'first_name': 'Jane',
             'last_name': 'Smith',
             'email': 'jane.smith@example.com',
-            'resume': SimpleUploadedFile('resume.pdf', b'Resume content')
+            'resume': SimpleUploadedFile('resume.pdf', b'%PDF-1.4 Resume content')
         }
 
         response = self.client.post(url, data, format='multipart')
@@ -88,3 +142,1857 @@ class LeadAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('Content-Disposition', response)
         self.assertTrue(response['Content-Disposition'].startswith('attachment; filename="Doe_John_resume'))
+
+
+@override_settings(LEAD_EMAIL_DELIVERY='outbox', CACHES=LOCMEM_CACHES)
+class LeadOutboxTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.data = {
+            'first_name': 'Jane',
+            'last_name': 'Smith',
+            'email': 'jane.smith@example.com',
+        }
+
+    @mock.patch('leads.tasks.deliver_outbox_emails.delay')
+    def test_create_lead_writes_outbox_without_smtp(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('lead-list'), self.data, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        outbox = EmailOutbox.objects.filter(lead__email='jane.smith@example.com')
+        self.assertEqual(outbox.count(), 2)
+        delay.assert_called_once_with(sorted(outbox.values_list('id', flat=True)))
+
+    @mock.patch('leads.tasks.deliver_outbox_emails.delay', side_effect=ConnectionError('broker down'))
+    def test_create_lead_survives_broker_outage(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('lead-list'), self.data, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.Status.PENDING).count(), 2)
+
+    def test_drain_email_outbox_command(self):
+        lead = Lead.objects.create(first_name='Jane', last_name='Smith', email='jane.smith@example.com')
+        enqueue_lead_emails(lead)
+
+        call_command('drain_email_outbox', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('jane.smith@example.com', mail.outbox[0].to)
+        self.assertIn(settings.ATTORNEY_EMAIL, mail.outbox[1].to)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.Status.SENT).exists())
+
+    def test_legacy_email_tasks_keep_their_wording(self):
+        send_lead_confirmation_email('jane.smith@example.com', 'Jane Smith')
+        send_lead_notification_email('jane.smith@example.com', 'Jane Smith')
+
+        self.assertEqual(list(EmailOutbox.objects.order_by('id').values_list('subject', 'body', 'recipients')), [
+            ('Thank you for your interest',
+             'Dear Jane Smith,\n\nThank you for submitting your information. We will review it and get back to you '
+             'soon.\n\nBest regards,\nYour Company Name',
+             ['jane.smith@example.com']),
+            ('New Lead: Jane Smith', 'A new lead has been submitted by Jane Smith (jane.smith@example.com).',
+             [settings.ATTORNEY_EMAIL]),
+        ])
+
+    def test_deliver_sends_outside_the_claim_transaction(self):
+        lead = Lead.objects.create(first_name='Jane', last_name='Smith', email='jane.smith@example.com')
+        enqueue_lead_emails(lead)
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def send_batch(messages):
+            seen.append((len(connection.atomic_blocks), EmailOutbox.objects.filter(status=EmailOutbox.Status.SENDING).count()))
+            return [None] * len(messages)
+
+        self.assertEqual(deliver_outbox(mailer=mock.Mock(send_batch=send_batch)), 2)
+        self.assertEqual(seen, [(depth, 2)])
+
+    @override_settings(LEAD_OUTBOX_MAX_ATTEMPTS=2)
+    def test_deliver_records_each_result(self):
+        lead = Lead.objects.create(first_name='Jane', last_name='Smith', email='jane.smith@example.com')
+        prospect, attorney = enqueue_lead_emails(lead)
+        mailer = mock.Mock(send_batch=mock.Mock(return_value=[ConnectionError('rejected'), None]))
+
+        self.assertEqual(deliver_outbox(mailer=mailer), 1)
+        prospect.refresh_from_db()
+        attorney.refresh_from_db()
+        self.assertEqual((prospect.status, prospect.attempts, prospect.last_error),
+                         (EmailOutbox.Status.PENDING, 1, 'rejected'))
+        self.assertEqual((attorney.status, attorney.attempts), (EmailOutbox.Status.SENT, 1))
+
+        mailer.send_batch.return_value = [ConnectionError('rejected')]
+        self.assertEqual(deliver_outbox(mailer=mailer), 0)
+        prospect.refresh_from_db()
+        self.assertEqual((prospect.status, prospect.attempts), (EmailOutbox.Status.FAILED, 2))
+
+    def test_deliver_takes_over_abandoned_claims(self):
+        lead = Lead.objects.create(first_name='Jane', last_name='Smith', email='jane.smith@example.com')
+        abandoned, claimed = enqueue_lead_emails(lead)
+        now = timezone.now()
+        EmailOutbox.objects.filter(pk=abandoned.pk).update(
+            status=EmailOutbox.Status.SENDING, claimed_at=now - datetime.timedelta(seconds=settings.LEAD_OUTBOX_LEASE + 1))
+        EmailOutbox.objects.filter(pk=claimed.pk).update(status=EmailOutbox.Status.SENDING, claimed_at=now)
+
+        self.assertEqual(deliver_outbox(), 1)
+        self.assertEqual(mail.outbox[0].to, ['jane.smith@example.com'])
+        self.assertEqual(EmailOutbox.objects.get(pk=claimed.pk).status, EmailOutbox.Status.SENDING)
+
+
+class SMTPStandIn:
+    """aiosmtpd handler that records messages and counts SMTP connections."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+class BatchedDeliveryTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            cls.port = sock.getsockname()[1]
+        cls.handler = SMTPStandIn()
+        cls.controller = Controller(cls.handler, hostname='127.0.0.1', port=cls.port)
+        cls.controller.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.controller.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.handler.messages.clear()
+        self.handler.connections = 0
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='leads.email_backend.CustomEmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            LEAD_EMAIL_RATE_LIMIT='',
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+
+    def test_batches_share_one_connection(self):
+        for i in range(5):
+            lead = Lead.objects.create(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com')
+            enqueue_lead_emails(lead)
+
+        sent = run_delivery(batch_size=4, linger=0, max_runtime=0.2)
+
+        self.assertEqual(sent, 10)
+        self.assertEqual(len(self.handler.messages), 10)
+        self.assertEqual(self.handler.connections, 1)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.Status.SENT).exists())
+
+    def test_batch_is_one_send_messages_call(self):
+        mailer = get_mailer()
+        messages = [mail.EmailMessage(f'Lead {i}', 'body', 'noreply@example.com', ['a@example.com']) for i in range(3)]
+        with mock.patch.object(mailer.connection, 'send_messages', wraps=mailer.connection.send_messages) as send:
+            self.assertEqual(mailer.send_batch(messages), [None, None, None])
+
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(len(self.handler.messages), 3)
+
+    def test_batch_resumes_after_the_connection_drops_mid_batch(self):
+        mailer = get_mailer()
+        messages = [mail.EmailMessage(f'Lead {i}', 'body', 'noreply@example.com', ['a@example.com']) for i in range(4)]
+        send = mailer.connection._send
+        dropped = []
+
+        def drop_before_third(message):
+            if message is messages[2] and not dropped:
+                dropped.append(message)
+                mailer.connection.connection.close()
+            return send(message)
+
+        with mock.patch.object(mailer.connection, '_send', side_effect=drop_before_third):
+            self.assertEqual(mailer.send_batch(messages), [None] * 4)
+
+        # Each message exactly once, in order: none lost or sent twice.
+        self.assertEqual(len(self.handler.messages), 4)
+        for i, envelope in enumerate(self.handler.messages):
+            self.assertIn(f'Subject: Lead {i}'.encode(), envelope.content)
+        self.assertEqual(self.handler.connections, 2)
+
+    def test_idle_run_returns_once_the_outbox_is_empty(self):
+        started = time.monotonic()
+        self.assertEqual(run_delivery(batch_size=4, linger=0.05, max_runtime=30), 0)
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_reconnects_after_connection_drop(self):
+        mailer = get_mailer()
+        mailer.send(mail.EmailMessage('First', 'body', 'noreply@example.com', ['a@example.com']))
+        # Simulate the server timing out the idle connection.
+        mailer.connection.connection.close()
+        mailer.send(mail.EmailMessage('Second', 'body', 'noreply@example.com', ['a@example.com']))
+
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertEqual(self.handler.connections, 2)
+
+    def test_send_time_is_recorded(self):
+        before = sample('smtp_send_duration_seconds_count', transport='smtp', outcome='sent')
+        get_mailer().send(mail.EmailMessage('First', 'body', 'noreply@example.com', ['a@example.com']))
+        self.assertEqual(sample('smtp_send_duration_seconds_count', transport='smtp', outcome='sent'), before + 1)
+
+    def test_sync_and_async_share_the_tls_policy(self):
+        for verify, mode in ((True, ssl.CERT_REQUIRED), (False, ssl.CERT_NONE)):
+            with self.subTest(verify=verify), override_settings(EMAIL_SSL_CERTVERIFY=verify), \
+                    mock.patch('aiosmtplib.SMTP') as smtp:
+                smtp.return_value.__aenter__ = mock.AsyncMock()
+                smtp.return_value.__aexit__ = mock.AsyncMock(return_value=False)
+                smtp.return_value.send_message = mock.AsyncMock()
+                async_to_sync(asend_messages)([mail.EmailMessage('Lead', 'body', 'noreply@example.com', ['a@example.com'])])
+
+                contexts = [get_connection().ssl_context, smtp.call_args.kwargs['tls_context']]
+                self.assertEqual([context.verify_mode for context in contexts], [mode, mode])
+                self.assertEqual([context.check_hostname for context in contexts], [verify, verify])
+
+    def test_async_send_shares_one_connection(self):
+        messages = [mail.EmailMessage(f'Lead {i}', 'body', 'noreply@example.com', ['a@example.com']) for i in range(2)]
+
+        self.assertEqual(async_to_sync(asend_messages)(messages), 2)
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertEqual(self.handler.connections, 1)
+
+
+class TokenBucketTestCase(TestCase):
+    def test_acquire_waits_once_burst_is_spent(self):
+        bucket = LocalTokenBucket('2/s')
+        started = time.monotonic()
+        bucket.acquire()
+        bucket.acquire()
+        self.assertLess(time.monotonic() - started, 0.1)
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+
+    def test_acquire_more_than_the_burst(self):
+        bucket = LocalTokenBucket('4/s')
+        started = time.monotonic()
+        bucket.acquire(6)
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        leads = Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com')
+            for i in range(7)
+        ])
+        # Ties on created_at must be broken by id.
+        now = timezone.now()
+        for i, lead in enumerate(leads):
+            Lead.objects.filter(pk=lead.pk).update(created_at=now - timezone.timedelta(minutes=i // 2))
+        self.expected = list(Lead.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def _ids(self, response):
+        return [row['id'] for row in response.data['results']]
+
+    def test_walk_forward_and_back(self):
+        response = self.client.get(reverse('lead-list'), {'page_size': 3})
+        pages = [self._ids(response)]
+        self.assertIsNone(response.data['previous'])
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(self._ids(response))
+
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(self._ids(response), pages[1])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(self._ids(response), pages[0])
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('lead-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    @override_settings(LEAD_MAX_PAGE_SIZE=4)
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse('lead-list'), {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('lead-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_same_bytes_as_the_serializer(self):
+        lead = Lead.objects.create(first_name='Zoë "Z"\u2028', last_name='Ñandú\t</b>', email='zoe@example.com')
+        Lead.objects.filter(pk=lead.pk).update(created_at=timezone.now().replace(microsecond=0))
+        leads = Lead.objects.order_by('-created_at', '-id')[:5]
+
+        for url in (reverse('lead-list') + '?page_size=5', reverse('lead-list') + '?page_size=5&format=json'):
+            cache.clear()
+            response = self.client.get(url)
+            expected = JSONRenderer().render({
+                'next': response.data['next'],
+                'previous': None,
+                'results': LeadListSerializer(leads, many=True).data,
+            })
+            self.assertEqual(response.content, expected)
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_same_bytes_as_the_serializer_outside_utc(self):
+        leads = Lead.objects.order_by('-created_at', '-id')[:5]
+        response = self.client.get(reverse('lead-list') + '?page_size=5')
+        expected = JSONRenderer().render({
+            'next': response.data['next'],
+            'previous': None,
+            'results': LeadListSerializer(leads, many=True).data,
+        })
+        self.assertEqual(response.content, expected)
+        self.assertRegex(response.data['results'][0]['created_at'], r'-0[45]:00$')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadIdempotencyTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.data = {'first_name': 'Jane', 'last_name': 'Smith', 'email': 'jane.smith@example.com'}
+
+    def post(self, data, **headers):
+        return self.client.post(reverse('lead-list'), data, format='multipart', headers=headers)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(self.data, **{'Idempotency-Key': 'submit-1'})
+        with self.assertNumQueries(0):
+            retry = self.post(self.data, **{'Idempotency-Key': 'submit-1'})
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(Lead.objects.filter(email='jane.smith@example.com').count(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_key_reused_with_another_body(self):
+        self.post(self.data, **{'Idempotency-Key': 'submit-1'})
+        response = self.post({**self.data, 'first_name': 'Janet'}, **{'Idempotency-Key': 'submit-1'})
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Lead.objects.count(), 1)
+
+    def test_retry_while_first_request_runs(self):
+        self.assertIsNone(IdempotentRequest(RequestFactory(headers={'Idempotency-Key': 'submit-1'}).post('/')).begin())
+        response = self.post(self.data, **{'Idempotency-Key': 'submit-1'})
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Lead.objects.exists())
+
+    def test_failed_request_releases_the_key(self):
+        response = self.post({**self.data, 'email': 'invalid'}, **{'Idempotency-Key': 'submit-1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post(self.data, **{'Idempotency-Key': 'submit-1'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_key_length_is_limited(self):
+        response = self.post(self.data, **{'Idempotency-Key': 'k' * 256})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Lead.objects.exists())
+
+    def test_cache_outage_processes_the_request(self):
+        with mock.patch('leads.idempotency.get_idempotency_cache', side_effect=ConnectionError('redis down')):
+            response = self.post(self.data, **{'Idempotency-Key': 'submit-1'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Lead.objects.count(), 1)
+
+    def test_duplicates_are_created_without_dedupe(self):
+        self.post(self.data)
+        self.post(self.data)
+        self.assertEqual(Lead.objects.filter(email='jane.smith@example.com').count(), 2)
+
+    @override_settings(LEAD_DEDUPE_PENDING=True)
+    def test_dedupe_returns_the_pending_lead(self):
+        self.assertEqual(self.post(self.data).status_code, status.HTTP_201_CREATED)
+        response = self.post({**self.data, 'first_name': 'Janet'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['first_name'], 'Jane')
+        self.assertEqual(Lead.objects.filter(email='jane.smith@example.com').count(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+        Lead.objects.update(state=Lead.LeadState.REACHED_OUT)
+        self.assertEqual(self.post(self.data).status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_CREATE_IP_RATE='', LEAD_CREATE_EMAIL_RATE='',
+                   LEAD_CREATE_MAX_CONCURRENCY=0, LEAD_CREATE_CONCURRENCY_URL='')
+class LeadThrottleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def post(self, email='jane@example.com', ip='10.0.0.1', **extra):
+        data = {'first_name': 'Jane', 'last_name': 'Smith', 'email': email}
+        return self.client.post(reverse('lead-list'), data, format='multipart', REMOTE_ADDR=ip, **extra)
+
+    @override_settings(LEAD_CREATE_IP_RATE='2/m')
+    def test_ip_rate_rejects_before_parsing(self):
+        self.assertEqual(self.post('a@example.com').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.post('b@example.com').status_code, status.HTTP_201_CREATED)
+        with mock.patch.object(Request, '_parse') as parse:
+            response = self.post('c@example.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        parse.assert_not_called()
+
+        self.assertEqual(self.post('c@example.com', ip='10.0.0.2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Lead.objects.count(), 3)
+
+    @override_settings(LEAD_CREATE_IP_RATE='2/m')
+    def test_spoofed_forwarded_for_does_not_reset_the_window(self):
+        codes = [self.post(f'jane{i}@example.com', HTTP_X_FORWARDED_FOR=f'192.0.2.{i}').status_code for i in range(4)]
+        self.assertEqual(codes, [201, 201, 429, 429])
+
+    @override_settings(LEAD_CREATE_IP_RATE='2/m', REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_ip_behind_a_trusted_proxy(self):
+        # The proxy appends the address it saw; whatever the client sent before it is ignored.
+        def post(email, forwarded_for):
+            return self.post(email, ip='172.18.0.5', HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        self.assertEqual(post('a@example.com', '192.0.2.1, 10.0.0.1'), status.HTTP_201_CREATED)
+        self.assertEqual(post('b@example.com', '192.0.2.2, 10.0.0.1'), status.HTTP_201_CREATED)
+        self.assertEqual(post('c@example.com', '192.0.2.3, 10.0.0.1'), status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(post('d@example.com', '10.0.0.2'), status.HTTP_201_CREATED)
+
+    @override_settings(LEAD_CREATE_EMAIL_RATE='1/h')
+    def test_email_rate(self):
+        self.assertEqual(self.post('jane@example.com').status_code, status.HTTP_201_CREATED)
+        response = self.post('Jane@Example.com', ip='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.post('john@example.com').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Lead.objects.count(), 2)
+        self.assertEqual(len(mail.outbox), 4)
+
+    @override_settings(LEAD_CREATE_MAX_CONCURRENCY=1)
+    def test_concurrency_cap_sheds_load(self):
+        slot = acquire_slot()
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Lead.objects.exists())
+
+        release_slot(slot)
+        self.assertEqual(self.post().status_code, status.HTTP_201_CREATED)
+        # The request gave its slot back.
+        release_slot(acquire_slot())
+
+    def test_sliding_window_weights_the_previous_window(self):
+        window = SlidingWindow('test', '10/m')
+        with mock.patch('leads.throttling.time.time', return_value=6000.0):
+            self.assertEqual([window.hit('client') for _ in range(10)], [0] * 10)
+            self.assertEqual(window.hit('client'), 60)
+        # Halfway through the next window 11 * 0.5 of the last one still counts.
+        with mock.patch('leads.throttling.time.time', return_value=6090.0):
+            self.assertEqual([window.hit('client') for _ in range(4)], [0] * 4)
+            self.assertAlmostEqual(window.hit('client'), 60 * (1 - 5 / 11) - 30)
+
+    @override_settings(LEAD_CREATE_IP_RATE='1/m')
+    def test_cache_outage_allows_requests(self):
+        with mock.patch('leads.throttling.cache.add', side_effect=ConnectionError('redis down')):
+            self.assertEqual(self.post('a@example.com').status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.post('b@example.com').status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadFilterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.ann = Lead.objects.create(first_name='Ann', last_name='Lee', email='Ann.Lee@example.com')
+        self.bob = Lead.objects.create(first_name='Bob', last_name='Annis', email='bob@corp.example',
+                                       state=Lead.LeadState.REACHED_OUT)
+        self.cid = Lead.objects.create(first_name='Cid', last_name='Moe', email='cid@example.com')
+        Lead.objects.filter(pk=self.cid.pk).update(created_at=timezone.now() - timezone.timedelta(days=10))
+
+    def _ids(self, params):
+        response = self.client.get(reverse('lead-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return {row['id'] for row in response.data['results']}
+
+    def test_filter_by_state(self):
+        self.assertEqual(self._ids({'state': 'REACHED_OUT'}), {self.bob.pk})
+
+    def test_filter_by_created_range(self):
+        week_ago = (timezone.now() - timezone.timedelta(days=7)).date().isoformat()
+        self.assertEqual(self._ids({'created_after': week_ago}), {self.ann.pk, self.bob.pk})
+        self.assertEqual(self._ids({'created_before': week_ago}), {self.cid.pk})
+
+    def test_prefix_filters_are_case_insensitive(self):
+        self.assertEqual(self._ids({'email': 'ANN.'}), {self.ann.pk})
+        self.assertEqual(self._ids({'name': 'ann'}), {self.ann.pk, self.bob.pk})
+        self.assertEqual(self._ids({'search': 'c'}), {self.cid.pk})
+
+    def test_prefix_filter_escapes_wildcards(self):
+        self.assertEqual(self._ids({'email': '%'}), set())
+
+    def test_ordering_oldest_first(self):
+        response = self.client.get(reverse('lead-list'), {'ordering': 'created_at'})
+        self.assertEqual(response.data['results'][0]['id'], self.cid.pk)
+
+    def test_invalid_parameters(self):
+        for params in ({'state': 'LOST'}, {'created_after': 'yesterday'}, {'ordering': 'email'}):
+            response = self.client.get(reverse('lead-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are PostgreSQL specific')
+class LeadFilterQueryPlanTestCase(TestCase):
+    """Every supported filter must be answerable from an index."""
+
+    def setUp(self):
+        Lead.objects.bulk_create([
+            Lead(first_name=f'First{i}', last_name=f'Last{i}', email=f'lead{i}@example.com')
+            for i in range(200)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE leads_lead')
+            # The table is tiny, so force the planner to show which index it would use.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def _plan(self, params):
+        request = Request(APIRequestFactory().get('/api/leads/', params))
+        queryset = LeadFilterBackend().filter_queryset(request, Lead.objects.all(), view=None)
+        return queryset.order_by().explain()
+
+    def test_filters_use_index_scans(self):
+        cases = {
+            'leads_email_prefix_idx': {'email': 'lead1'},
+            'leads_first_name_prefix_idx': {'name': 'first1'},
+            'leads_last_name_prefix_idx': {'search': 'last1'},
+        }
+        for index, params in cases.items():
+            with self.subTest(params=params):
+                plan = self._plan(params)
+                self.assertNotIn('Seq Scan', plan)
+                self.assertIn(index, plan)
+
+    def test_state_and_created_range_use_indexes(self):
+        for params in ({'state': 'PENDING'},
+                       {'created_after': '2024-01-01', 'created_before': '2025-01-01'},
+                       {'state': 'PENDING', 'created_after': '2024-01-01'}):
+            with self.subTest(params=params):
+                plan = self._plan(params)
+                self.assertNotIn('Seq Scan', plan)
+                self.assertIn('Index', plan)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadExportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com',
+                 state=Lead.LeadState.REACHED_OUT if i % 2 else Lead.LeadState.PENDING)
+            for i in range(5)
+        ])
+
+    def _body(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(LEAD_EXPORT_CHUNK_SIZE=2)
+    def test_export_csv(self):
+        response = self.client.get(reverse('lead-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = self._body(response).splitlines()
+        self.assertEqual(lines[0], 'id,first_name,last_name,email,state,created_at,updated_at')
+        self.assertEqual(len(lines), 6)
+
+    def test_export_csv_defuses_formulas(self):
+        Lead.objects.create(first_name='=HYPERLINK("x")', last_name='@SUM(A1)', email='-1+1@example.com')
+        Lead.objects.create(first_name='+Ann', last_name='Lee', email='ann@example.com')
+        rows = list(csv.reader(self._body(self.client.get(reverse('lead-export'))).splitlines()))
+        cells = {tuple(row[1:4]) for row in rows[1:]}
+        self.assertIn(("'=HYPERLINK(\"x\")", "'@SUM(A1)", "'-1+1@example.com"), cells)
+        self.assertIn(("'+Ann", 'Lee', 'ann@example.com'), cells)
+        self.assertIn(('Lead', '0', 'lead0@example.com'), cells)
+
+        response = self.client.get(reverse('lead-export'), {'format': 'ndjson', 'email': 'ann@example.com'})
+        self.assertEqual(json.loads(self._body(response))['first_name'], '+Ann')
+
+    def test_export_ndjson_with_filters(self):
+        response = self.client.get(reverse('lead-export'), {'format': 'ndjson', 'state': 'REACHED_OUT'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self._body(response).splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row['state'] == 'REACHED_OUT' for row in rows))
+        self.assertTrue(rows[0]['created_at'].endswith('Z'))
+
+    def test_export_honours_accept_header(self):
+        response = self.client.get(reverse('lead-export'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+    def test_export_requires_authentication(self):
+        self.client.credentials()
+        response = self.client.get(reverse('lead-export'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadImportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        Lead.objects.create(first_name='Old', last_name='Lead', email='taken@example.com')
+
+    def _post(self, content, name='leads.csv', **data):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(reverse('lead-import'), {'file': upload, **data}, format='multipart')
+
+    def test_import_csv_reports_rows(self):
+        content = (
+            'first_name,last_name,email\n'
+            'Ann,Lee,ann@example.com\n'
+            'Bob,Ray,not-an-email\n'
+            'Cid,Moe,TAKEN@example.com\n'
+            'Dee,Fox,ann@example.com\n'
+            'Eve,Day,eve@example.com\n'
+        )
+        with override_settings(LEAD_IMPORT_CHUNK_SIZE=2):
+            response = self._post(content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+        self.assertIn('email', response.data['errors'][1]['errors'])
+        self.assertEqual(Lead.objects.count(), 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_import_ndjson_queues_emails(self):
+        content = '\n'.join([
+            json.dumps({'first_name': 'Ann', 'last_name': 'Lee', 'email': 'ann@example.com'}),
+            '{broken',
+        ])
+        with mock.patch('leads.tasks.deliver_email_batches.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self._post(content, name='leads.ndjson', send_emails='true')
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertEqual(EmailOutbox.objects.filter(lead__email='ann@example.com').count(), 2)
+        delay.assert_called_once()
+
+    def test_import_requires_authentication(self):
+        self.client.credentials()
+        response = self._post('first_name,last_name,email\n')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_import_leads_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('first_name,last_name,email\nAnn,Lee,ann@example.com\n')
+        self.addCleanup(os.remove, handle.name)
+
+        call_command('import_leads', handle.name, stdout=open(os.devnull, 'w'))
+
+        self.assertTrue(Lead.objects.filter(email='ann@example.com').exists())
+
+    def test_unreadable_file(self):
+        for content in ('first_name,last_name,email\nZoë,Roe,zoe@example.com\n'.encode('latin-1'),
+                        # Over the csv module's field size limit
+                        b'first_name,last_name,email\n' + b'A' * 200000 + b',Lee,ann@example.com\n'):
+            upload = SimpleUploadedFile('leads.csv', content)
+            response = self.client.post(reverse('lead-import'), {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('Could not read the file', response.data['file'][0])
+
+    def test_import_leads_command_unreadable_file(self):
+        with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as handle:
+            handle.write('first_name,last_name,email\nZoë,Roe,zoe@example.com\n'.encode('latin-1'))
+        self.addCleanup(os.remove, handle.name)
+
+        with self.assertRaisesMessage(CommandError, 'Could not read the file'):
+            call_command('import_leads', handle.name, stdout=open(os.devnull, 'w'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadTransitionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.leads = Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com')
+            for i in range(4)
+        ])
+        Lead.objects.filter(pk=self.leads[0].pk).update(state=Lead.LeadState.REACHED_OUT)
+
+    def test_transition_by_ids_with_one_update(self):
+        ids = [lead.pk for lead in self.leads[:3]]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('lead-transition'), {
+                'ids': ids, 'state': 'REACHED_OUT', 'from_state': 'PENDING',
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data['updated']), ids[1:])
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Lead.objects.filter(state=Lead.LeadState.REACHED_OUT).count(), 3)
+
+    def test_transition_by_filter(self):
+        response = self.client.post(reverse('lead-transition') + '?state=REACHED_OUT',
+                                    {'state': 'PENDING'}, format='json')
+        self.assertEqual(response.data['updated'], [self.leads[0].pk])
+
+    def test_transition_requires_selection(self):
+        response = self.client.post(reverse('lead-transition'), {'state': 'PENDING'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_transition_ignores_non_filter_parameters(self):
+        for query in ('?ordering=created_at', '?email=', '?name=%20'):
+            response = self.client.post(reverse('lead-transition') + query, {'state': 'REACHED_OUT'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Lead.objects.filter(state=Lead.LeadState.REACHED_OUT).count(), 1)
+
+    def test_transition_validates_payload(self):
+        for payload in ({'ids': [1], 'state': 'LOST'}, {'ids': [], 'state': 'PENDING'},
+                        {'ids': ['x'], 'state': 'PENDING'}):
+            response = self.client.post(reverse('lead-transition'), payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_mark_reached_out_updates_only_state(self):
+        lead = self.leads[1]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('lead-mark-reached-out', kwargs={'pk': lead.pk}))
+        update = next(query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE'))
+        self.assertNotIn('"email"', update)
+
+    def test_mark_reached_out_counts_a_lead_once(self):
+        reconcile_stats()
+        today = timezone.localdate()
+        url = reverse('lead-mark-reached-out', kwargs={'pk': self.leads[1].pk})
+
+        for _ in range(2):
+            self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+            counts = rollup_counts(today, today)
+            self.assertEqual((counts['pending'], counts['reached_out']), (2, 2))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_CACHE_TIMEOUT=60)
+class LeadCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        lead_cache.reset_stats()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.lead = Lead.objects.create(first_name='Jane', last_name='Roe', email='jane@example.com')
+
+    def lead_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query for query in queries.captured_queries if 'leads_lead' in query['sql']]
+
+    def test_list_and_detail_are_served_from_cache(self):
+        for url in (reverse('lead-list'), reverse('lead-detail', kwargs={'pk': self.lead.pk})):
+            first, queries = self.lead_queries(url)
+            self.assertEqual(first['X-Cache'], 'MISS')
+            self.assertTrue(queries)
+            second, queries = self.lead_queries(url)
+            self.assertEqual(second['X-Cache'], 'HIT')
+            self.assertEqual(queries, [])
+            self.assertEqual(second.json(), first.json())
+        self.assertEqual(lead_cache.stats()['hits'], 2)
+        self.assertEqual(lead_cache.stats()['misses'], 2)
+
+    def test_key_includes_filters_and_cursor(self):
+        self.client.get(reverse('lead-list'))
+        response = self.client.get(reverse('lead-list') + '?state=REACHED_OUT')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+        response = self.client.get(reverse('lead-list') + '?page_size=1&state=PENDING')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = self.client.get(reverse('lead-list') + '?state=PENDING&page_size=1')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_writes_invalidate(self):
+        list_url = reverse('lead-list')
+        detail_url = reverse('lead-detail', kwargs={'pk': self.lead.pk})
+        self.client.get(list_url)
+        self.client.get(detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('lead-mark-reached-out', kwargs={'pk': self.lead.pk}))
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['state'], 'REACHED_OUT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('lead-transition'), {'ids': [self.lead.pk], 'state': 'PENDING'}, format='json')
+        self.assertEqual(self.client.get(detail_url).data['state'], 'PENDING')
+
+        self.client.get(list_url)
+        upload = SimpleUploadedFile('leads.csv', b'first_name,last_name,email\nAnn,Lee,ann@example.com\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('lead-import'), {'file': upload}, format='multipart')
+        response = self.client.get(list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(detail_url)
+        self.assertEqual(len(self.client.get(list_url).data['results']), 1)
+
+    def test_single_recompute_under_concurrent_misses(self):
+        request = Request(APIRequestFactory().get('/api/leads/'))
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 1}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(lead_cache.get_or_compute('list', request, compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(hit for _, hit in results), [False, True, True, True])
+
+    def test_cache_errors_fail_open(self):
+        with mock.patch.object(lead_cache.cache, 'get', side_effect=ConnectionError('redis down')):
+            response = self.client.get(reverse('lead-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(lead_cache.stats()['errors'], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadDailyStatsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def create_lead(self, email, days_ago=0):
+        lead = Lead.objects.create(first_name='Lead', last_name='Test', email=email)
+        if days_ago:
+            created_at = lead.created_at - datetime.timedelta(days=days_ago)
+            Lead.objects.filter(pk=lead.pk).update(created_at=created_at)
+            lead.created_at = created_at
+        return lead
+
+    def rollup(self):
+        return {(row.day, row.state): row.count for row in LeadDailyStats.objects.exclude(count=0)}
+
+    def test_rollup_follows_every_write_path(self):
+        self.client.post(reverse('lead-list'), {
+            'first_name': 'Ann', 'last_name': 'Lee', 'email': 'ann@example.com',
+        }, format='multipart')
+        lead = Lead.objects.get(email='ann@example.com')
+        self.client.post(reverse('lead-mark-reached-out', kwargs={'pk': lead.pk}))
+
+        upload = SimpleUploadedFile('leads.csv', b'first_name,last_name,email\nBo,Ng,bo@example.com\nCy,Ox,cy@example.com\n')
+        self.client.post(reverse('lead-import'), {'file': upload}, format='multipart')
+        self.client.post(reverse('lead-transition'), {
+            'ids': list(Lead.objects.values_list('pk', flat=True)), 'state': 'PENDING',
+        }, format='json')
+        self.client.post(reverse('lead-transition'), {
+            'ids': [Lead.objects.get(email='bo@example.com').pk], 'state': 'REACHED_OUT', 'from_state': 'PENDING',
+        }, format='json')
+        Lead.objects.get(email='cy@example.com').delete()
+
+        self.assertEqual(self.rollup(), compute_stats('day'))
+        self.assertEqual(reconcile_stats(dry_run=True), {'day': 0, 'hour': 0})
+        today = timezone.localdate()
+        self.assertEqual(self.rollup(), {(today, 'PENDING'): 1, (today, 'REACHED_OUT'): 1})
+
+    def test_report_counts_are_one_query_over_a_half_open_range(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        start, end = day_bounds(yesterday)
+        inside = self.create_lead('inside@example.com', days_ago=1)
+        Lead.objects.filter(pk=inside.pk).update(created_at=start, state='REACHED_OUT')
+        self.create_lead('today@example.com')
+        edge = self.create_lead('edge@example.com')
+        Lead.objects.filter(pk=edge.pk).update(created_at=end)
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = lead_counts(start, end)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('::date', queries.captured_queries[0]['sql'])
+        self.assertEqual(counts, {'total': 1, 'pending': 0, 'reached_out': 1})
+
+    def test_period_reports_read_the_rollup(self):
+        today = timezone.localdate()
+        for i, days_ago in enumerate([0, 0, 3, 10]):
+            self.create_lead(f'lead{i}@example.com', days_ago=days_ago)
+        reconcile_stats()
+
+        with CaptureQueriesContext(connection) as queries:
+            week = rollup_counts(today - datetime.timedelta(days=6), today)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('leads_leaddailystats', queries.captured_queries[0]['sql'])
+        self.assertEqual(week, {'total': 3, 'pending': 3, 'reached_out': 0})
+
+        subject, message = build_daily_report(today)
+        self.assertEqual(subject, f'Daily Lead Report - {today}')
+        self.assertIn('Total Leads: 2\n', message)
+        self.assertIn('Last 7 Days: 3 leads (3 pending, 0 reached out)', message)
+
+    def test_rebuild_command(self):
+        self.create_lead('lead@example.com')
+        LeadDailyStats.objects.update(count=42)
+        call_command('rebuild_lead_stats', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.rollup(), {(timezone.localdate(), 'PENDING'): 1})
+
+    def test_daily_report_task(self):
+        self.create_lead('lead@example.com', days_ago=1)
+        send_daily_lead_report.apply()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Total Leads: 1\n', mail.outbox[0].body)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadStatsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.today = timezone.localdate()
+        leads = Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com')
+            for i in range(4)
+        ])
+        now = timezone.now()
+        for lead, days_ago, state in zip(leads, [0, 0, 1, 5], ['PENDING', 'REACHED_OUT', 'PENDING', 'PENDING']):
+            Lead.objects.filter(pk=lead.pk).update(created_at=now - datetime.timedelta(days=days_ago), state=state)
+        reconcile_stats()
+
+    def get_stats(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('lead-stats'), params)
+        lead_queries = [query for query in queries.captured_queries if 'leads_lead"' in query['sql']]
+        self.assertEqual(lead_queries, [])
+        return response
+
+    def test_daily_histogram_from_rollup(self):
+        start = self.today - datetime.timedelta(days=2)
+        response = self.get_stats(start=start.isoformat())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['bucket'], 'day')
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['states'], {'PENDING': 2, 'REACHED_OUT': 1})
+        self.assertEqual([bucket['count'] for bucket in data['intake']], [0, 1, 2])
+        self.assertTrue(data['intake'][0]['start'].startswith(start.isoformat()))
+
+    def test_default_windows(self):
+        data = self.get_stats().json()
+        self.assertEqual(len(data['intake']), 30)
+        self.assertEqual(data['total'], 4)
+
+        data = self.get_stats(bucket='hour').json()
+        self.assertEqual(len(data['intake']), 24)
+        self.assertEqual(data['intake'][-1]['count'], 2)
+
+    def test_recompute_reconciles_rollup(self):
+        LeadDailyStats.objects.update(count=42)
+        self.assertEqual(self.get_stats(recompute='true').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('lead-stats'), {'recompute': 'true'})
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(self.get_stats().data['total'], 4)
+
+    def test_window_validation(self):
+        for params in ({'bucket': 'week'}, {'start': 'yesterday'},
+                       {'start': '2025-01-10', 'end': '2025-01-01'},
+                       {'bucket': 'hour', 'start': '2020-01-01'}):
+            self.assertEqual(self.get_stats(**params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_intake_stats_reads_one_rollup_query(self):
+        start, end = day_bounds(self.today - datetime.timedelta(days=6), self.today)
+        with CaptureQueriesContext(connection) as queries:
+            stats = intake_stats(start, end, 'day')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(stats['total'], 4)
+
+
+def make_pdf(text):
+    """A one-page PDF showing ``text`` in Helvetica."""
+    content = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode()
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b'%010d 00000 n \n' % offset
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return pdf
+
+
+def make_docx(*paragraphs):
+    import docx
+
+    document = docx.Document()
+    document.core_properties.author = 'Jane Roe'
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_RESUME_EXTRACT_WORKERS=0)
+class ResumePipelineTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
+
+    def tearDown(self):
+        reset_extraction_pool()
+        self.media_override.disable()
+        self.media.cleanup()
+
+    def create_lead(self, name, data):
+        return Lead.objects.create(first_name='Jane', last_name='Roe', email='jane@example.com',
+                                   resume=SimpleUploadedFile(name, data))
+
+    def test_create_enqueues_pipeline_after_commit(self):
+        with mock.patch('leads.tasks.process_lead_resume.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = APIClient().post(reverse('lead-list'), {
+                    'first_name': 'Jane', 'last_name': 'Roe', 'email': 'jane@example.com',
+                    'resume': SimpleUploadedFile('cv.pdf', make_pdf('Python developer')),
+                }, format='multipart')
+                self.assertFalse(delay.called)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        lead = Lead.objects.get(email='jane@example.com')
+        delay.assert_called_once_with(lead.pk)
+        self.assertEqual(lead.resume_documents.get().status, ResumeDocument.Status.PENDING)
+
+    def test_pdf_is_checksummed_backed_up_and_extracted(self):
+        data = make_pdf('Senior Python developer')
+        lead = self.create_lead('cv.pdf', data)
+        process_lead_resume.apply(args=[lead.pk])
+
+        document = lead.resume_documents.get()
+        self.assertEqual(document.status, ResumeDocument.Status.DONE)
+        self.assertIn('Senior Python developer', document.text)
+        self.assertEqual(document.checksum, hashlib.sha256(data).hexdigest())
+        self.assertEqual(document.metadata['pages'], 1)
+        self.assertEqual(document.metadata['words'], 3)
+        self.assertEqual(document.metadata['size'], len(data))
+        with open(os.path.join(self.media.name, document.backup_name), 'rb') as backup:
+            self.assertEqual(backup.read(), data)
+
+    def test_docx_text_and_metadata(self):
+        lead = self.create_lead('cv.docx', make_docx('Attorney', 'Ten years of litigation'))
+        process_lead_resume.apply(args=[lead.pk])
+        document = lead.resume_documents.get()
+        self.assertEqual(document.status, ResumeDocument.Status.DONE)
+        self.assertEqual(document.text, 'Attorney\nTen years of litigation')
+        self.assertEqual(document.metadata['author'], 'Jane Roe')
+
+    def test_retry_skips_finished_steps(self):
+        lead = self.create_lead('cv.pdf', make_pdf('Python'))
+        ResumeDocument.objects.create(lead=lead, idempotency_key=f'{lead.pk}:{lead.resume.name}',
+                                      file_name=lead.resume.name, checksum='0' * 64, size=1)
+        with mock.patch('leads.resumes.file_checksum') as checksum:
+            process_lead_resume.apply(args=[lead.pk])
+        self.assertFalse(checksum.called)
+        self.assertEqual(lead.resume_documents.get().status, ResumeDocument.Status.DONE)
+
+        with mock.patch('leads.resumes.run_extraction') as extraction:
+            process_lead_resume.apply(args=[lead.pk])
+        self.assertFalse(extraction.called)
+        self.assertEqual(lead.resume_documents.get().attempts, 1)
+
+    def test_unreadable_file_fails_without_retry(self):
+        lead = self.create_lead('cv.pdf', b'not a pdf')
+        with mock.patch.object(process_lead_resume, 'retry') as retry:
+            process_lead_resume.apply(args=[lead.pk])
+        self.assertFalse(retry.called)
+        document = lead.resume_documents.get()
+        self.assertEqual(document.status, ResumeDocument.Status.FAILED)
+        self.assertIn('Could not read PDF', document.error)
+
+    @override_settings(LEAD_RESUME_EXTRACT_WORKERS=1)
+    def test_extraction_runs_in_process_pool(self):
+        lead = self.create_lead('cv.docx', make_docx('Pooled extraction'))
+        process_lead_resume.apply(args=[lead.pk])
+        document = lead.resume_documents.get()
+        self.assertEqual(document.status, ResumeDocument.Status.DONE)
+        self.assertEqual(document.text, 'Pooled extraction')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_RESUME_EXTRACT_WORKERS=0)
+class ResumeBlobTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
+        self.data = make_pdf('Python developer')
+        self.checksum = hashlib.sha256(self.data).hexdigest()
+
+    def tearDown(self):
+        self.media_override.disable()
+        self.media.cleanup()
+
+    def create_lead(self, name='cv.pdf', data=None):
+        return Lead.objects.create(first_name='Jane', last_name='Roe', email='jane@example.com',
+                                   resume=SimpleUploadedFile(name, data or self.data))
+
+    def blob_files(self):
+        return sorted(resume_storage().blobs('resumes'))
+
+    def test_identical_uploads_share_one_blob(self):
+        first, second = self.create_lead('cv.pdf'), self.create_lead('CV copy.PDF')
+        self.assertEqual(first.resume.name, f'resumes/{self.checksum[:2]}/{self.checksum}.pdf')
+        self.assertEqual(second.resume.name, first.resume.name)
+        self.assertEqual(self.blob_files(), [first.resume.name])
+        blob = ResumeBlob.objects.get()
+        self.assertEqual((blob.checksum, blob.size, blob.ref_count), (self.checksum, len(self.data), 2))
+
+    def test_backup_references_the_upload(self):
+        lead = self.create_lead()
+        process_lead_resume.apply(args=[lead.pk])
+        document = lead.resume_documents.get()
+        self.assertEqual(document.backup_name, lead.resume.name)
+        self.assertEqual(document.checksum, self.checksum)
+        self.assertEqual(ResumeBlob.objects.get().ref_count, 2)
+        self.assertEqual(self.blob_files(), [lead.resume.name])
+
+    def test_replacing_resume_moves_the_reference(self):
+        lead = Lead.objects.get(pk=self.create_lead().pk)
+        old_name = lead.resume.name
+        lead.resume = SimpleUploadedFile('cv.pdf', make_pdf('Java developer'))
+        lead.save()
+        refs = dict(ResumeBlob.objects.values_list('name', 'ref_count'))
+        self.assertEqual(refs, {old_name: 0, lead.resume.name: 1})
+
+    def test_unreferenced_blob_is_collected_after_grace(self):
+        lead = self.create_lead()
+        process_lead_resume.apply(args=[lead.pk])
+        name = lead.resume.name
+        lead.delete()
+        self.assertEqual(ResumeBlob.objects.get().ref_count, 0)
+
+        self.assertEqual(collect_blobs()['blobs'], 0)
+        self.assertTrue(resume_storage().exists(name))
+        self.assertEqual(collect_blobs(grace=0, dry_run=True), {'blobs': 1, 'files': 1, 'bytes': len(self.data)})
+        self.assertTrue(resume_storage().exists(name))
+        self.assertEqual(collect_blobs(grace=0), {'blobs': 1, 'files': 1, 'bytes': len(self.data)})
+        self.assertFalse(resume_storage().exists(name))
+        self.assertFalse(ResumeBlob.objects.exists())
+
+    def test_referenced_blob_is_kept_and_counts_are_recounted(self):
+        lead = self.create_lead()
+        ResumeBlob.objects.update(ref_count=0)
+        self.assertEqual(collect_blobs(grace=0)['files'], 0)
+        self.assertEqual(ResumeBlob.objects.get().ref_count, 1)
+
+        ResumeBlob.objects.update(ref_count=5)
+        self.assertEqual(recount_blob_refs(), 1)
+        self.assertEqual(ResumeBlob.objects.get().ref_count, 1)
+        self.assertTrue(resume_storage().exists(lead.resume.name))
+
+    def test_orphan_file_without_row_is_collected(self):
+        name = resume_storage().save('resumes/cv.pdf', io.BytesIO(self.data))
+        self.assertFalse(ResumeBlob.objects.exists())
+        self.assertEqual(collect_blobs()['files'], 0)
+        self.assertEqual(collect_blobs(grace=0)['files'], 1)
+        self.assertFalse(resume_storage().exists(name))
+
+
+class AccelRedirectStandIn:
+    """Resolves X-Accel-Redirect like the internal location in nginx/leads.conf."""
+
+    def __init__(self, prefix, root):
+        self.prefix = prefix
+        self.root = root
+
+    def fetch(self, response):
+        location = response['X-Accel-Redirect']
+        assert location.startswith(self.prefix), location
+        path = os.path.realpath(os.path.join(self.root, location[len(self.prefix):]))
+        assert path.startswith(os.path.realpath(self.root) + os.sep), path
+        with open(path, 'rb') as handle:
+            return handle.read()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_RESUME_OFFLOAD='')
+class ResumeDownloadTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
+        self.data = b'%PDF-1.4 ' + bytes(range(256))
+        self.lead = Lead.objects.create(first_name='Jane', last_name='Roe', email='jane@example.com',
+                                        resume=SimpleUploadedFile('cv.pdf', self.data))
+        self.etag = f'"{hashlib.sha256(self.data).hexdigest()}"'
+        self.url = reverse('lead-resume', kwargs={'pk': self.lead.pk})
+        user = User.objects.create_user(username='testuser', password='testpass')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+    def tearDown(self):
+        self.media_override.disable()
+        self.media.cleanup()
+
+    def test_full_download_carries_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Roe_Jane_resume.pdf"')
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-9')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.data[2:10])
+        self.assertEqual(response['Content-Range'], f'bytes 2-9/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '8')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_invalid_range_sends_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertNotIn('Content-Range', response)
+
+    def test_range_with_stale_if_range_sends_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+    @override_settings(LEAD_RESUME_OFFLOAD='nginx', LEAD_RESUME_OFFLOAD_PREFIX='/protected-media/')
+    def test_nginx_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.lead.resume.name}')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(AccelRedirectStandIn('/protected-media/', self.media.name).fetch(response), self.data)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    @override_settings(LEAD_RESUME_OFFLOAD='sendfile')
+    def test_sendfile_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.lead.resume.path)
+        self.assertEqual(response.content, b'')
+
+    def test_requires_authentication(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_UPLOAD_CHUNK_SIZE=1024)
+class ResumeUploadTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
+
+    def tearDown(self):
+        self.media_override.disable()
+        self.media.cleanup()
+
+    def post(self, name, content):
+        data = {'first_name': 'Jane', 'last_name': 'Roe', 'email': 'jane@example.com'}
+        data['resume'] = SimpleUploadedFile(name, content)
+        return APIClient().post(reverse('lead-list'), data, format='multipart')
+
+    def test_valid_resumes_are_accepted(self):
+        for name, content in [('cv.pdf', make_pdf('Python')), ('cv.docx', make_docx('Python')),
+                              ('cv.doc', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + bytes(64))]:
+            response = self.post(name, content)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, name)
+        self.assertEqual(Lead.objects.count(), 3)
+
+    def test_uploads_are_spooled_to_disk(self):
+        request = RequestFactory().post('/', {'resume': SimpleUploadedFile('cv.pdf', b'%PDF-1.4 small')})
+        self.assertIsInstance(request.FILES['resume'], TemporaryUploadedFile)
+        self.assertEqual(rejected_uploads(request), {})
+
+    def test_content_must_match_extension(self):
+        response = self.post('cv.pdf', make_docx('Python'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'resume': ['The file content is not a valid PDF document.']})
+        self.assertFalse(Lead.objects.exists())
+
+    def test_file_shorter_than_signature_is_rejected(self):
+        response = self.post('cv.doc', b'\xd0\xcf')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'resume': ['The file content is not a valid DOC document.']})
+
+    def test_extension_is_checked_before_reading(self):
+        response = self.post('cv.exe', b'MZ' + bytes(64))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('“exe” is not allowed', response.data['resume'][0])
+        self.assertFalse(Lead.objects.exists())
+
+    @override_settings(MAX_UPLOAD_SIZE=4096)
+    def test_oversized_upload_is_aborted_while_streaming(self):
+        with mock.patch('django.core.files.uploadhandler.TemporaryFileUploadHandler.receive_data_chunk',
+                        autospec=True, return_value=None) as spooled:
+            response = self.post('cv.pdf', b'%PDF-1.4 ' + bytes(64 * 1024))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('File size must be no more than', response.data['resume'][0])
+        # Aborted once the limit was passed, not after the whole body.
+        self.assertLessEqual(spooled.call_count, 4)
+        self.assertFalse(Lead.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_RESUME_UPLOAD_BUCKET='lead-resumes', LEAD_RESUME_UPLOAD_REGION='us-east-1')
+class DirectUploadTestCase(TestCase):
+    """Direct uploads against moto's in-process S3."""
+
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
+        self.aws = mock_aws()
+        self.aws.start()
+        get_client.cache_clear()
+        s3_client().create_bucket(Bucket='lead-resumes')
+        self.client = APIClient()
+
+    def tearDown(self):
+        get_client.cache_clear()
+        self.aws.stop()
+        self.media_override.disable()
+        self.media.cleanup()
+
+    def upload(self, name, content):
+        response = self.client.post(reverse('lead-resume-upload'), {'file_name': name, 'size': len(content)},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = response.data
+        self.assertEqual(upload['method'], 'PUT')
+        self.assertEqual(requests.put(upload['url'], data=content, headers=upload['headers']).status_code, 200)
+        return upload['key']
+
+    def create_lead(self, resume):
+        return self.client.post(reverse('lead-list'), {
+            'first_name': 'Jane', 'last_name': 'Roe', 'email': 'jane@example.com', 'resume': resume,
+        }, format='json')
+
+    def stored_keys(self):
+        return [item['Key'] for item in s3_client().list_objects_v2(Bucket='lead-resumes').get('Contents', [])]
+
+    def test_upload_is_imported_by_the_worker(self):
+        data = make_pdf('Python developer')
+        key = self.upload('cv.pdf', data)
+        self.assertRegex(key, r'^uploads/[0-9a-f]{32}\.pdf$')
+        response = self.create_lead(key)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        lead = Lead.objects.get()
+        self.assertEqual((lead.resume.name, lead.resume_upload), ('', key))
+
+        self.assertTrue(import_upload(lead))
+        lead = Lead.objects.get()
+        checksum = hashlib.sha256(data).hexdigest()
+        self.assertEqual(lead.resume.name, f'resumes/{checksum[:2]}/{checksum}.pdf')
+        self.assertEqual(lead.resume_upload, '')
+        self.assertEqual(ResumeBlob.objects.get().ref_count, 1)
+        self.assertEqual(self.stored_keys(), [])
+
+    def test_mistyped_upload_is_rejected(self):
+        key = self.upload('cv.pdf', make_docx('Python'))
+        self.create_lead(key)
+        lead = Lead.objects.get()
+        result = process_lead_resume.apply(args=[lead.pk]).get()
+        self.assertEqual(result, f'Resume upload rejected for lead ID: {lead.pk}')
+        lead.refresh_from_db()
+        self.assertEqual((lead.resume.name, lead.resume_upload), ('', ''))
+        document = ResumeDocument.objects.get()
+        self.assertEqual(document.status, ResumeDocument.Status.FAILED)
+        self.assertEqual(document.error, 'The file content is not a valid PDF document.')
+        self.assertEqual(self.stored_keys(), [])
+
+    def test_missing_upload_is_rejected(self):
+        self.create_lead('uploads/' + 'a' * 32 + '.pdf')
+        self.assertFalse(import_upload(Lead.objects.get()))
+        self.assertEqual(ResumeDocument.objects.get().error, 'The uploaded resume was not found.')
+
+    def test_only_issued_keys_are_accepted(self):
+        response = self.create_lead('resumes/ab/' + 'a' * 64 + '.pdf')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'resume': ['Not a valid resume upload key.']})
+
+    def test_presign_validates_name_and_size(self):
+        url = reverse('lead-resume-upload')
+        response = self.client.post(url, {'file_name': 'cv.exe', 'size': 10}, format='json')
+        self.assertIn('file_name', response.data)
+        response = self.client.post(url, {'file_name': 'cv.pdf', 'size': settings.MAX_UPLOAD_SIZE + 1}, format='json')
+        self.assertIn('size', response.data)
+
+    @override_settings(LEAD_RESUME_UPLOAD_BUCKET='')
+    def test_disabled_without_bucket(self):
+        response = self.client.post(reverse('lead-resume-upload'), {'file_name': 'cv.pdf', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.create_lead('uploads/' + 'a' * 32 + '.pdf')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResumeSearchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        texts = [
+            'Python developer with Django and PostgreSQL experience. Python everywhere.',
+            'Java engineer, some Python scripting.',
+            'Litigation attorney, contracts and negotiation.',
+        ]
+        self.documents = []
+        for i, text in enumerate(texts):
+            lead = Lead.objects.create(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com',
+                                       resume=f'cv{i}.pdf')
+            self.documents.append(ResumeDocument.objects.create(
+                lead=lead, idempotency_key=f'{lead.pk}:cv{i}.pdf', file_name=f'cv{i}.pdf',
+                status=ResumeDocument.Status.DONE, text=text,
+            ))
+        index_documents(ResumeDocument.objects.all())
+
+    def search(self, **params):
+        response = self.client.get(reverse('lead-resume-search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_ranked_hits_with_snippets(self):
+        data = self.search(q='python')
+        self.assertEqual([hit['lead']['email'] for hit in data['results']], ['lead0@example.com', 'lead1@example.com'])
+        self.assertGreater(data['results'][0]['rank'], data['results'][1]['rank'])
+        self.assertIn('<mark>Python</mark>', data['results'][0]['snippet'])
+        self.assertIsNone(data['next'])
+
+    def test_snippets_escape_resume_markup(self):
+        ResumeDocument.objects.filter(pk=self.documents[0].pk).update(
+            text='Python <script>alert(1)</script> <img src=x onerror=alert(1)> & more')
+        index_documents(ResumeDocument.objects.all())
+
+        hits = {hit['lead']['email']: hit['snippet'] for hit in self.search(q='python')['results']}
+        snippet = hits['lead0@example.com']
+        self.assertIn('<mark>Python</mark>', snippet)
+        self.assertIn('&lt;img', snippet)
+        self.assertNotIn('<', snippet.replace('<mark>', '').replace('</mark>', ''))
+
+    def test_replaced_resumes_are_not_searched(self):
+        Lead.objects.filter(pk=self.documents[1].lead_id).update(resume='cv1-new.pdf')
+        data = self.search(q='python')
+        self.assertEqual([hit['lead']['email'] for hit in data['results']], ['lead0@example.com'])
+
+    def test_websearch_syntax(self):
+        data = self.search(q='python -java')
+        self.assertEqual([hit['lead']['email'] for hit in data['results']], ['lead0@example.com'])
+        data = self.search(q='"contracts and negotiation"')
+        self.assertEqual([hit['lead']['email'] for hit in data['results']], ['lead2@example.com'])
+
+    def test_keyset_pages(self):
+        for document in self.documents:
+            document.text = 'Python ' * (document.pk % 3 + 1)
+            document.save()
+        index_documents(ResumeDocument.objects.all())
+
+        first = self.search(q='python', page_size=2)
+        self.assertEqual(len(first['results']), 2)
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+        emails = [hit['lead']['email'] for hit in first['results'] + second['results']]
+        self.assertEqual(len(set(emails)), 3)
+
+    def test_requires_query_and_ignores_unprocessed(self):
+        response = self.client.get(reverse('lead-resume-search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        ResumeDocument.objects.filter(pk=self.documents[2].pk).update(status=ResumeDocument.Status.FAILED)
+        self.assertEqual(self.search(q='attorney')['results'], [])
+
+    def test_backfill_command(self):
+        ResumeDocument.objects.update(search_vector=None)
+        self.assertEqual(search_resumes('python'), [])
+        call_command('index_resumes', workers=1, chunk_size=2, stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(search_resumes('python')), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Query plans are PostgreSQL specific')
+    def test_search_uses_gin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        query = ResumeDocument.objects.filter(search_vector=parse_query('python'))
+        self.assertIn('leads_resume_search_idx', query.explain())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_CACHE_TIMEOUT=60, ROOT_URLCONF='leads.async_urls')
+class AsyncLeadAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
+        user = User.objects.create_user(username='testuser', password='testpass')
+        self.auth = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+        self.lead = Lead.objects.create(first_name='Jane', last_name='Roe', email='jane@example.com',
+                                        resume=SimpleUploadedFile('cv.pdf', b'%PDF-1.4 Resume content'))
+        self.data = {'first_name': 'John', 'last_name': 'Doe', 'email': 'john@example.com'}
+
+    def tearDown(self):
+        self.media_override.disable()
+        self.media.cleanup()
+
+    async def test_create_sends_intake_emails(self):
+        response = await self.async_client.post(reverse('lead-list'), self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['email'], 'john@example.com')
+        self.assertTrue(await Lead.objects.filter(email='john@example.com').aexists())
+        self.assertEqual([message.to for message in mail.outbox], [['john@example.com'], [settings.ATTORNEY_EMAIL]])
+
+    async def test_create_validates_like_the_viewset(self):
+        response = await self.async_client.post(reverse('lead-list'), {**self.data, 'email': 'not-an-email'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.json())
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(LEAD_EMAIL_DELIVERY='outbox')
+    @mock.patch('leads.tasks.deliver_outbox_emails.delay')
+    def test_create_in_outbox_mode(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = async_to_sync(self.async_client.post)(reverse('lead-list'), self.data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.filter(lead__email='john@example.com').count(), 2)
+        delay.assert_called_once()
+
+    async def test_create_replays_idempotent_retries(self):
+        headers = {'Idempotency-Key': 'submit-1'}
+        first = await self.async_client.post(reverse('lead-list'), self.data, headers=headers)
+        retry = await self.async_client.post(reverse('lead-list'), self.data, headers=headers)
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(await Lead.objects.filter(email='john@example.com').acount(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(LEAD_CREATE_IP_RATE='1/m')
+    async def test_create_is_throttled(self):
+        await self.async_client.post(reverse('lead-list'), self.data)
+        response = await self.async_client.post(reverse('lead-list'), {**self.data, 'email': 'jim@example.com'})
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(await Lead.objects.filter(email='jim@example.com').aexists())
+
+    async def test_reads_require_authentication(self):
+        for url in (reverse('lead-list'), reverse('lead-detail', kwargs={'pk': self.lead.pk})):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+        response = await self.async_client.get(reverse('lead-list'), headers={'Authorization': 'Token bogus'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+
+    async def test_list_pages_and_is_cached(self):
+        for i in range(2):
+            await Lead.objects.acreate(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com')
+
+        response = await self.async_client.get(reverse('lead-list'), {'page_size': 2}, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        first = response.json()
+        self.assertEqual([lead['email'] for lead in first['results']], ['lead1@example.com', 'lead0@example.com'])
+        self.assertIsNone(first['previous'])
+
+        response = await self.async_client.get(first['next'], headers=self.auth)
+        self.assertEqual([lead['full_name'] for lead in response.json()['results']], ['Jane Roe'])
+        self.assertIsNone(response.json()['next'])
+
+        response = await self.async_client.get(reverse('lead-list'), {'page_size': 2}, headers=self.auth)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json(), first)
+
+    async def test_detail(self):
+        response = await self.async_client.get(reverse('lead-detail', kwargs={'pk': self.lead.pk}), headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['email'], 'jane@example.com')
+
+        response = await self.async_client.get(reverse('lead-detail', kwargs={'pk': 0}), headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_resume_download(self):
+        url = reverse('lead-resume', kwargs={'pk': self.lead.pk})
+        response = await self.async_client.get(url, headers=self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'%PDF-1.4 Resume content')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Roe_Jane_resume.pdf"')
+
+        response = await self.async_client.get(url, headers={**self.auth, 'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_other_methods_use_the_viewset(self):
+        response = await self.async_client.delete(reverse('lead-detail', kwargs={'pk': self.lead.pk}), headers=self.auth)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(await Lead.objects.filter(pk=self.lead.pk).aexists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        Lead.objects.create(first_name='Jane', last_name='Roe', email='jane@example.com')
+
+    def test_health_does_not_touch_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/health/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_ready_reports_failed_dependencies(self):
+        response = self.client.get('/ready/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['checks'], {'database': 'ok', 'cache': 'ok'})
+
+        with mock.patch('leads.probes.cache.get', side_effect=ConnectionError('redis down')):
+            response = self.client.get('/ready/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()['checks']['cache'], 'unavailable')
+
+    def test_request_latency_and_queries_per_view(self):
+        labels = {'view': 'LeadViewSet.list', 'method': 'GET', 'status': '200'}
+        requests_before = sample('http_request_duration_seconds_count', **labels)
+        queries_before = sample('http_request_db_queries_sum', view='LeadViewSet.list')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get(reverse('lead-list')).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(sample('http_request_duration_seconds_count', **labels), requests_before + 1)
+        self.assertGreater(sample('http_request_db_queries_sum', view='LeadViewSet.list'), queries_before)
+        with override_settings(LEAD_METRICS_ALLOWED_IPS=['127.0.0.1']):
+            page = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{le="0.005",method="GET",status="200",view="LeadViewSet.list"}', page)
+
+    def test_metrics_require_the_scraper_token_or_an_allowed_address(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(LEAD_METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code,
+                             status.HTTP_403_FORBIDDEN)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code,
+                             status.HTTP_200_OK)
+
+        with override_settings(LEAD_METRICS_ALLOWED_IPS=['10.0.0.0/8']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='192.0.2.1').status_code,
+                             status.HTTP_403_FORBIDDEN)
+
+    def test_token_cache_lookups(self):
+        hits = sample('cache_lookups_total', cache='auth_token', result='hit')
+        misses = sample('cache_lookups_total', cache='auth_token', result='miss')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.get(reverse('lead-list'))
+        self.client.get(reverse('lead-list'))
+
+        self.assertEqual(sample('cache_lookups_total', cache='auth_token', result='miss'), misses + 1)
+        self.assertEqual(sample('cache_lookups_total', cache='auth_token', result='hit'), hits + 1)
+
+    def test_celery_task_duration(self):
+        labels = {'task': 'leads.tasks.send_lead_notification_email', 'state': 'SUCCESS'}
+        before = sample('celery_task_duration_seconds_count', **labels)
+
+        send_lead_notification_email.apply(args=('jane@example.com', 'Jane Roe'))
+
+        self.assertEqual(sample('celery_task_duration_seconds_count', **labels), before + 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEAD_CACHE_TIMEOUT=0, LEAD_QUERY_BUDGET_MODE='raise')
+class QueryBudgetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.media = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.media_override.enable()
+        self.addCleanup(self.media.cleanup)
+        self.addCleanup(self.media_override.disable)
+        self.lead = Lead.objects.create(first_name='Jane', last_name='Roe', email='jane@example.com',
+                                        resume=SimpleUploadedFile('resume.pdf', b'%PDF-1.4 resume'))
+
+    def add_leads(self, total):
+        Lead.objects.bulk_create([
+            Lead(first_name='Lead', last_name=str(i), email=f'lead{i}@example.com')
+            for i in range(Lead.objects.count(), total)
+        ])
+
+    def count_queries(self, method, url, **kwargs):
+        # A fresh token lookup every time, so each count includes authentication.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        return len(queries.captured_queries)
+
+    def assert_constant_queries(self, method, url, **kwargs):
+        counts = []
+        for total in (10, 10000):
+            self.add_leads(total)
+            reconcile_stats()
+            counts.append(self.count_queries(method, url, **kwargs))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_list_detail_and_export(self):
+        for url in (reverse('lead-list') + '?page_size=100',
+                    reverse('lead-detail', kwargs={'pk': self.lead.pk}),
+                    reverse('lead-resume', kwargs={'pk': self.lead.pk}),
+                    reverse('lead-export'),
+                    reverse('lead-export') + '?format=ndjson'):
+            with self.subTest(url=url):
+                self.assert_constant_queries('get', url)
+
+    def test_bulk_transition(self):
+        # The stats rollup is updated per hour and state touched, not per
+        # lead; with a row for both states each round touches the same ones.
+        Lead.objects.filter(pk=self.lead.pk).update(state=Lead.LeadState.REACHED_OUT)
+        # The budget is a PostgreSQL figure; SQLite updates the rollups a row at a time.
+        with override_settings(LEAD_QUERY_BUDGET_MODE='raise' if connection.vendor == 'postgresql' else 'off'):
+            self.assert_constant_queries('post', reverse('lead-transition') + '?state=PENDING',
+                                         data={'state': 'REACHED_OUT'}, format='json')
+
+    @skipUnless(connection.vendor == 'postgresql', 'SQLite splits bulk inserts into small batches')
+    @override_settings(LEAD_IMPORT_CHUNK_SIZE=10000)
+    def test_bulk_import(self):
+        counts = []
+        for total in (10, 10000):
+            Lead.objects.exclude(pk=self.lead.pk).delete()
+            rows = ''.join(f'Lead,{i},lead{i}@example.com\n' for i in range(total))
+            upload = SimpleUploadedFile('leads.csv', f'first_name,last_name,email\n{rows}'.encode())
+            counts.append(self.count_queries('post', reverse('lead-import'), data={'file': upload}, format='multipart'))
+        self.assertEqual(counts[0], counts[1])
+
+    @skipUnless(connection.vendor == 'postgresql', 'The budgets are PostgreSQL figures')
+    @override_settings(LEAD_IMPORT_CHUNK_SIZE=5)
+    def test_bulk_import_budget_is_per_chunk(self):
+        def upload():
+            rows = ''.join(f'Lead,{i},import{i}@example.com\n' for i in range(12))
+            return SimpleUploadedFile('leads.csv', f'first_name,last_name,email\n{rows}'.encode())
+
+        response = self.client.post(reverse('lead-import'), {'file': upload(), 'send_emails': 'true'}, format='multipart')
+        self.assertEqual(response.data['created'], 12)
+
+        Lead.objects.filter(email__startswith='import').delete()
+        with mock.patch('leads.importer.record_created', lambda leads: [Lead.objects.get(pk=lead.pk) for lead in leads]):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'LeadViewSet.import_leads ran'):
+                self.client.post(reverse('lead-import'), {'file': upload()}, format='multipart')
+
+    def test_per_row_query_exceeds_budget(self):
+        self.add_leads(10)
+        with mock.patch('leads.views.list_data',
+                        lambda rows: [Lead.objects.values('id', 'email').get(pk=row['id']) for row in rows]):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'LeadViewSet.list ran 12 database queries'):
+                self.client.get(reverse('lead-list'))
+
+            with override_settings(LEAD_QUERY_BUDGET_MODE='log'):
+                exceeded = sample('http_request_query_budget_exceeded_total', view='LeadViewSet.list')
+                with self.assertLogs('leads.query_budget', 'WARNING'):
+                    response = self.client.get(reverse('lead-list'))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(sample('http_request_query_budget_exceeded_total', view='LeadViewSet.list'),
+                                 exceeded + 1)
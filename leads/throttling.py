@@ -0,0 +1,233 @@
+"""
+Abuse shedding for the public intake endpoint.
+
+Every intake costs a database insert, a resume upload of up to 5MB and two
+emails, so ``POST /api/leads/`` is limited three ways:
+
+- ``LeadCreateThrottle`` counts requests per client IP (LEAD_CREATE_IP_RATE)
+  and runs in DRF's ``initial()``, before the body is read or parsed.
+- ``check_email_rate`` counts submissions per email (LEAD_CREATE_EMAIL_RATE)
+  after validation, before anything is written or sent.
+- ``create_slot`` caps the intakes being processed at once across all
+  workers (LEAD_CREATE_MAX_CONCURRENCY); past it requests get 503.
+
+The per-client limits are sliding windows kept in the default cache (Redis),
+so every worker shares them. Rejected requests count too: a client that
+keeps hammering stays blocked. An unavailable cache lets requests through.
+"""
+import contextlib
+import logging
+import math
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.throttling import BaseThrottle
+
+from .mailer import parse_rate
+
+logger = logging.getLogger(__name__)
+
+# Seconds a concurrency slot is held at most, should a worker die mid-request.
+SLOT_LEASE = 60
+# Retry-After of a 503 from the concurrency cap
+OVERLOAD_RETRY_AFTER = 1
+
+CONCURRENCY_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local lease = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(lease))
+return 1
+"""
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many submissions are being processed. Please retry shortly.'
+    default_code = 'overloaded'
+    # Sent as Retry-After
+    wait = OVERLOAD_RETRY_AFTER
+
+
+class SlidingWindow:
+    """
+    Sliding-window counter: the count of the current fixed window plus the
+    previous window's count weighted by how much of it still overlaps the
+    last ``seconds``. Two cache keys per client, one INCR per request.
+    """
+
+    def __init__(self, scope, rate):
+        self.scope = scope
+        self.num, self.seconds = parse_rate(rate)
+
+    def hit(self, ident):
+        """Count a request from ``ident``; return 0 if it is allowed, else the seconds to wait."""
+        now = time.time()
+        window, offset = divmod(now, self.seconds)
+        current = self.key(ident, int(window))
+        try:
+            if not cache.add(current, 1, timeout=2 * self.seconds):
+                count = cache.incr(current)
+            else:
+                count = 1
+            previous = cache.get(self.key(ident, int(window) - 1), 0)
+        except Exception as exc:
+            logger.warning(f'Throttle cache unavailable, allowing the request: {str(exc)}')
+            return 0
+        overlap = 1 - offset / self.seconds
+        if previous * overlap + count <= self.num:
+            return 0
+        if count > self.num:
+            return self.seconds - offset
+        # The previous window's weight drops below the spare capacity after:
+        return max(self.seconds * (1 - (self.num - count) / previous) - offset, 0.001)
+
+    def key(self, ident, window):
+        return f'leads:throttle:{self.scope}:{ident}:{window}'
+
+
+class LeadCreateThrottle(BaseThrottle):
+    """LEAD_CREATE_IP_RATE for the create action, checked before the body is parsed."""
+
+    def allow_request(self, request, view):
+        if view.action != 'create':
+            return True
+        self.delay = ip_wait(self.get_ident(request))
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+def ip_wait(ident):
+    if not settings.LEAD_CREATE_IP_RATE:
+        return 0
+    return SlidingWindow('ip', settings.LEAD_CREATE_IP_RATE).hit(ident)
+
+
+def check_email_rate(email):
+    """Raise Throttled when ``email`` exceeded LEAD_CREATE_EMAIL_RATE."""
+    if not settings.LEAD_CREATE_EMAIL_RATE:
+        return
+    delay = SlidingWindow('email', settings.LEAD_CREATE_EMAIL_RATE).hit(email.strip().lower())
+    if delay:
+        raise Throttled(math.ceil(delay))
+
+
+class LocalConcurrencyLimiter:
+    """Concurrency limit private to the current process."""
+
+    def __init__(self, limit):
+        self.semaphore = threading.BoundedSemaphore(limit)
+
+    def acquire(self):
+        return self.semaphore.acquire(blocking=False) or None
+
+    def release(self, token):
+        self.semaphore.release()
+
+
+class RedisConcurrencyLimiter:
+    """
+    Concurrency limit shared by every worker: a sorted set of in-flight
+    requests scored by start time. Entries older than SLOT_LEASE are
+    dropped, so a worker killed mid-request does not leak its slot.
+    """
+
+    def __init__(self, limit, url, key='leads:create:in-flight'):
+        import redis
+
+        self.limit = limit
+        self.key = key
+        self.redis = redis.Redis.from_url(url)
+        self._script = self.redis.register_script(CONCURRENCY_SCRIPT)
+
+    def acquire(self):
+        token = uuid.uuid4().hex
+        if int(self._script(keys=[self.key], args=[SLOT_LEASE, self.limit, token])):
+            return token
+        return None
+
+    def release(self, token):
+        self.redis.zrem(self.key, token)
+
+
+_limiter = None
+
+
+def get_concurrency_limiter():
+    global _limiter
+    if not settings.LEAD_CREATE_MAX_CONCURRENCY:
+        return None
+    if _limiter is None:
+        if settings.LEAD_CREATE_CONCURRENCY_URL:
+            _limiter = RedisConcurrencyLimiter(settings.LEAD_CREATE_MAX_CONCURRENCY,
+                                               settings.LEAD_CREATE_CONCURRENCY_URL)
+        else:
+            _limiter = LocalConcurrencyLimiter(settings.LEAD_CREATE_MAX_CONCURRENCY)
+    return _limiter
+
+
+@receiver(setting_changed)
+def reset_limiter(setting, **kwargs):
+    global _limiter
+    if setting.startswith('LEAD_CREATE_'):
+        _limiter = None
+
+
+def acquire_slot():
+    """
+    Take a concurrency slot for an intake; return what release_slot needs
+    (None when unlimited) or raise Overloaded.
+    """
+    limiter = get_concurrency_limiter()
+    if limiter is None:
+        return None
+    try:
+        token = limiter.acquire()
+    except Exception as exc:
+        logger.warning(f'Concurrency limiter unavailable, allowing the request: {str(exc)}')
+        return None
+    if token is None:
+        raise Overloaded()
+    return limiter, token
+
+
+def release_slot(slot):
+    if slot is not None:
+        limiter, token = slot
+        try:
+            limiter.release(token)
+        except Exception as exc:
+            logger.warning(f'Could not release a concurrency slot: {str(exc)}')
+
+
+@contextlib.contextmanager
+def create_slot():
+    slot = acquire_slot()
+    try:
+        yield
+    finally:
+        release_slot(slot)
+
+
+@contextlib.asynccontextmanager
+async def acreate_slot():
+    slot = await sync_to_async(acquire_slot)()
+    try:
+        yield
+    finally:
+        await sync_to_async(release_slot)(slot)
@@ -0,0 +1,88 @@
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+# Leading bytes of each accepted resume format
+RESUME_SIGNATURES = {
+    'pdf': b'%PDF-',
+    # OLE2 compound document (Word 97-2003)
+    'doc': b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',
+    # ZIP container (Office Open XML)
+    'docx': b'PK\x03\x04',
+}
+
+
+def rejected_uploads(request):
+    """{field name: reason} of the uploads ResumeUploadHandler aborted."""
+    return getattr(request, 'rejected_uploads', {})
+
+
+class ResumeUploadHandler(FileUploadHandler):
+    """
+    Checks resume uploads while they stream in, before any later handler
+    has stored them: the extension, the leading bytes of the first chunk
+    and the running size against MAX_UPLOAD_SIZE. A bad upload stops the
+    request body from being read any further; the reason is left in
+    ``request.rejected_uploads`` for the serializer to report. Chunks are
+    passed on unchanged, so with TemporaryFileUploadHandler after it an
+    upload never holds more than one chunk in memory.
+    """
+    field_names = {'resume'}
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = settings.LEAD_UPLOAD_CHUNK_SIZE
+        self.signature = None
+        self.head = b''
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.signature = None
+        if field_name not in self.field_names:
+            return
+        extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if extension not in RESUME_SIGNATURES:
+            self.reject(
+                f"File extension “{extension}” is not allowed. "
+                f"Allowed extensions are: {', '.join(RESUME_SIGNATURES)}."
+            )
+        if content_length is not None and content_length > settings.MAX_UPLOAD_SIZE:
+            self.reject_size()
+        self.signature = RESUME_SIGNATURES[extension]
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.signature is None:
+            return raw_data
+        if start + len(raw_data) > settings.MAX_UPLOAD_SIZE:
+            self.reject_size()
+        if len(self.head) < len(self.signature):
+            self.head += raw_data[:len(self.signature) - len(self.head)]
+            if len(self.head) == len(self.signature):
+                self.check_signature()
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.signature is not None and len(self.head) < len(self.signature):
+            # Shorter than the signature; the file is already read.
+            self.record(self.type_error())
+        return None
+
+    def check_signature(self):
+        if self.head != self.signature:
+            self.reject(self.type_error())
+
+    def type_error(self):
+        extension = os.path.splitext(self.file_name)[1].lower().lstrip('.')
+        return f'The file content is not a valid {extension.upper()} document.'
+
+    def reject_size(self):
+        self.reject(f'File size must be no more than {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB')
+
+    def record(self, reason):
+        self.request.rejected_uploads = {**rejected_uploads(self.request), self.field_name: reason}
+
+    def reject(self, reason):
+        self.record(reason)
+        raise StopUpload(connection_reset=True)
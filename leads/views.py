@@ -1,22 +1,66 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from django.conf import settings
-from django.http import FileResponse
+from django.http import StreamingHttpResponse
+from django.db import transaction
 from .models import Lead
 from django.core.mail import send_mail
+from .cache import get_or_compute
+from . import direct_uploads
+from .downloads import resume_filename, serve_file
+from .emails import attorney_email, dispatch_outbox, enqueue_lead_emails, prospect_email
+from .exports import export_rows, stream_csv, stream_ndjson
+from .filters import LeadFilterBackend
+from .idempotency import REPLAYED, IdempotentRequest, pending_duplicate
+from .importer import IMPORT_FORMATS, LeadImporter, UnreadableFile, guess_format, parse_rows
+from .pagination import LeadCursorPagination, ResumeSearchPagination
+from .renderers import CSVRenderer, NDJSONRenderer, ORJSONRenderer
+from .resumes import enqueue_resume
+from .search import add_snippets, search_resumes
+from .throttling import LeadCreateThrottle, check_email_rate, create_slot
+from .stats import BUCKETS, bucket_count, intake_stats, stats_window
 from .serializers import (
     LeadCreateSerializer,
     LeadListSerializer,
     LeadDetailSerializer,
     LeadStateUpdateSerializer,
+    LeadBulkStateUpdateSerializer,
+    ResumeSearchHitSerializer,
+    ResumeUploadSerializer,
+    list_data,
+    list_values,
 )
-from .tasks import send_lead_confirmation_email, send_lead_notification_email
+
+
+def save_lead(serializer):
+    """
+    Save a validated LeadCreateSerializer and queue its resume. In outbox
+    mode the intake emails commit with the lead and SMTP happens in a worker.
+    """
+    with transaction.atomic():
+        lead = serializer.save()
+        if settings.LEAD_EMAIL_DELIVERY == 'outbox':
+            outbox_ids = [email.id for email in enqueue_lead_emails(lead)]
+            transaction.on_commit(lambda: dispatch_outbox(outbox_ids))
+        if lead.resume or lead.resume_upload:
+            enqueue_resume(lead)
+    return lead
+
+
+def import_query_budget(request):
+    """
+    Authentication, then per chunk of LEAD_IMPORT_CHUNK_SIZE rows: the
+    existing-email check, the savepoint pair, the INSERT, two stats rollups
+    and the outbox INSERT. Independent of the number of leads and rows.
+    """
+    return 1 + 7 * max(getattr(request, 'import_chunks', 0), 1)
 
 
 class IsPublicCreateOrIsAuthenticated(permissions.BasePermission):
     def has_permission(self, request, view):
-        if view.action == 'create':
+        if view.action in ('create', 'resume_upload'):
             return True
         return request.user and request.user.is_authenticated
 
@@ -24,6 +68,20 @@ class IsPublicCreateOrIsAuthenticated(permissions.BasePermission):
 class LeadViewSet(viewsets.ModelViewSet):
     queryset = Lead.objects.all().order_by('-created_at')
     permission_classes = [IsPublicCreateOrIsAuthenticated]
+    pagination_class = LeadCursorPagination
+    filter_backends = [LeadFilterBackend]
+    throttle_classes = [LeadCreateThrottle]
+    # Most queries per request, authentication included (leads.query_budget).
+    # None of these may grow with the number of leads.
+    query_budgets = {
+        'list': 3,
+        'retrieve': 3,
+        'resume': 3,
+        'export': 3,
+        'resume_search': 4,
+        'transition': 6,
+        'import_leads': import_query_budget,
+    }
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -32,69 +90,247 @@ class LeadViewSet(viewsets.ModelViewSet):
             return LeadListSerializer
         elif self.action == 'mark_reached_out':
             return LeadStateUpdateSerializer
+        elif self.action == 'transition':
+            return LeadBulkStateUpdateSerializer
+        elif self.action == 'resume_upload':
+            return ResumeUploadSerializer
         return LeadDetailSerializer
 
+    def get_renderers(self):
+        if self.action == 'list':
+            return [ORJSONRenderer(), *super().get_renderers()]
+        return super().get_renderers()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response('list', request, self.list_page)
+
+    def list_page(self, request):
+        """
+        LeadListSerializer's output without the serializer: the page is read
+        with list_values (no model instances) and rendered by orjson.
+        """
+        page = self.paginate_queryset(list_values(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(list_data(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response('detail', request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, scope, request, handler, *args, **kwargs):
+        """
+        Serve the payload of ``handler`` from the lead cache. Any write to
+        leads invalidates it; ``X-Cache`` tells whether it was a hit.
+        """
+        data, hit = get_or_compute(scope, request, lambda: handler(request, *args, **kwargs).data)
+        return Response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
     def create(self, request, *args, **kwargs):
+        """
+        Public intake. Honours Idempotency-Key and, with LEAD_DEDUPE_PENDING,
+        returns an existing PENDING lead for the same email (see leads.idempotency).
+        Throttled per IP and per email and capped in concurrency (leads.throttling).
+        """
+        with create_slot():
+            idempotent = IdempotentRequest(request)
+            stored = idempotent.begin()
+            if stored is not None:
+                return Response(stored['data'], status=stored['status'], headers=REPLAYED)
+            try:
+                response = self._create_lead(request)
+                idempotent.finish(response.status_code, response.data)
+                return response
+            finally:
+                idempotent.release()
+
+    def _create_lead(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        lead = serializer.save()
-        # ordinary version
-        self._send_prospect_email(lead)
-        self._send_attorney_email(lead) 
-        # send_prospect_email_task.delay(lead.first_name, lead.email) 
-        # send_attorney_email_task.delay(lead.first_name, lead.last_name, lead.email) 
-
-        #  Celery version
-        # lead_name = f"{lead.first_name} {lead.last_name}"
-        # send_lead_confirmation_email.delay(lead.email, lead_name)
-        # send_lead_notification_email.delay(lead.email, lead_name)
+        check_email_rate(serializer.validated_data['email'])
+        duplicate = pending_duplicate(serializer.validated_data['email'])
+        if duplicate is not None:
+            return Response(self.get_serializer(duplicate).data, status=status.HTTP_200_OK)
 
+        lead = save_lead(serializer)
+        if settings.LEAD_EMAIL_DELIVERY != 'outbox':
+            self._send_prospect_email(lead)
+            self._send_attorney_email(lead)
 
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
     def _send_prospect_email(self, lead):
         """Send a confirmation email to the prospect."""
-        subject = 'Thank you for your submission'
-        message = f'Dear {lead.first_name},\n\nThank you for submitting your information. Our team will review your submission and contact you soon.\n\nBest regards,\nThe Team'
+        subject, message, recipients = prospect_email(lead)
         send_mail(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
-            [lead.email],
+            recipients,
             fail_silently=False,
         )
-    
+
     def _send_attorney_email(self, lead):
         """Send a notification email to the attorney."""
-        subject = 'New Lead Submission'
-        message = f'A new lead has been submitted:\n\nName: {lead.first_name} {lead.last_name}\nEmail: {lead.email}\n\nPlease check the lead management system for more details.'
+        subject, message, recipients = attorney_email(lead)
         send_mail(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
-            [settings.ATTORNEY_EMAIL],
+            recipients,
             fail_silently=False,
         )
-    
 
     @action(detail=True, methods=['get'])
     def resume(self, request, pk=None):
+        """
+        Download the lead's resume. With LEAD_RESUME_OFFLOAD the front proxy
+        sends the file; ETag / If-None-Match and Range are supported.
+        """
         lead = self.get_object()
         if lead.resume:
-            return FileResponse(
-                lead.resume.open('rb'),
-                as_attachment=True,
-                filename=f"{lead.last_name}_{lead.first_name}_resume{lead.resume.name[lead.resume.name.rfind('.'):]}"
-            )
+            return serve_file(request, lead.resume, filename=resume_filename(lead))
         return Response({'detail': 'Resume not found'}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=False, methods=['post'], url_path='resume-upload', url_name='resume-upload')
+    def resume_upload(self, request):
+        """
+        Public: a pre-signed URL to PUT a resume of ``file_name`` and
+        ``size`` bytes straight to object storage. Create the lead with the
+        returned ``key`` as its ``resume``; the file never passes through
+        the API servers.
+        """
+        if not direct_uploads.enabled():
+            return Response({'detail': 'Direct resume uploads are not enabled.'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(direct_uploads.presign_upload(**serializer.validated_data), status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream every lead matching the list filters as CSV (default) or
+        NDJSON (?format=ndjson). Rows are read with a server-side cursor and
+        written as they arrive, so memory stays flat whatever the row count.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator.get_ordering(request) == 'created_at':
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+        chunk_size = settings.LEAD_EXPORT_CHUNK_SIZE
+        rows = export_rows(queryset, chunk_size)
+
+        if request.accepted_renderer.format == 'ndjson':
+            response = StreamingHttpResponse(stream_ndjson(rows, chunk_size), content_type='application/x-ndjson')
+            filename = 'leads.ndjson'
+        else:
+            response = StreamingHttpResponse(stream_csv(rows, chunk_size), content_type='text/csv')
+            filename = 'leads.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import',
+            parser_classes=[MultiPartParser])
+    def import_leads(self, request):
+        """
+        Bulk import a CSV or NDJSON ``file``. Rows are validated and inserted
+        in chunks; rejected rows (invalid or duplicate email) are reported by
+        row number. Set ``send_emails=true`` to queue the intake emails.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = request.data.get('format') or guess_format(upload.name)
+        if import_format not in IMPORT_FORMATS:
+            return Response({'format': [f"Must be one of: {', '.join(IMPORT_FORMATS)}"]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        send_emails = str(request.data.get('send_emails', '')).lower() in ('1', 'true', 'yes')
+
+        importer = LeadImporter(chunk_size=settings.LEAD_IMPORT_CHUNK_SIZE, send_emails=send_emails)
+        try:
+            result = importer.run(parse_rows(upload.file, import_format))
+        except UnreadableFile as exc:
+            # Chunks before the unreadable part are already committed.
+            return Response({'file': [str(exc)], 'created': importer.created},
+                            status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            # For import_query_budget, which the middleware calls with the Django request.
+            request._request.import_chunks = importer.chunks
+        return Response(result, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
     def mark_reached_out(self, request, pk=None):
         lead = self.get_object()
-        lead.state = 'REACHED_OUT'
-        lead.save()
+        # UPDATE ... WHERE state != 'REACHED_OUT': a repeated or concurrent
+        # call changes nothing and leaves the stats rollups alone.
+        Lead.objects.filter(pk=lead.pk).transition(Lead.LeadState.REACHED_OUT)
         return Response({'status': 'Lead marked as REACHED_OUT'})
 
+    @action(detail=False, methods=['post'])
+    def transition(self, request):
+        """
+        Move many leads to ``state`` with one UPDATE. Leads are selected by
+        ``ids`` or, when omitted, by the list filters in the query string.
+        ``from_state`` guards against overwriting concurrent changes.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if 'ids' in data:
+            queryset = Lead.objects.filter(pk__in=data['ids'])
+        elif LeadFilterBackend().has_filters(request):
+            # Only real filters: a stray or empty parameter must not select every lead.
+            queryset = self.filter_queryset(Lead.objects.all())
+        else:
+            return Response({'detail': 'Provide ids or at least one list filter.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        updated = queryset.transition(data['state'], from_state=data.get('from_state'))
+        return Response({'updated': updated, 'count': len(updated)})
+
+    @action(detail=False, methods=['get'], url_path='resume-search', url_name='resume-search')
+    def resume_search(self, request):
+        """
+        Full-text search over processed resume text, best matches first.
+        ``q`` takes web-search syntax (words, "exact phrase", OR, -word);
+        each hit carries the lead, its rank and a highlighted snippet.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'q': ['This parameter is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        paginator = ResumeSearchPagination()
+        hits = paginator.paginate(request, lambda after, limit: search_resumes(text, after, limit))
+        add_snippets(hits, text)
+        return paginator.get_paginated_response(ResumeSearchHitSerializer(hits, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Lead counts per state and an intake histogram for leads created in
+        [start, end), in ``day`` (default) or ``hour`` buckets, read from the
+        stats rollups. ``recompute=true`` (staff only) recounts the window
+        from the lead table and corrects the rollups first.
+        """
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            return Response({'bucket': [f"Must be one of: {', '.join(BUCKETS)}"]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filters = LeadFilterBackend()
+        start, end = stats_window(
+            bucket,
+            start=filters.parse_moment(request.query_params, 'start'),
+            end=filters.parse_moment(request.query_params, 'end'),
+        )
+        buckets = bucket_count(start, end, bucket)
+        if buckets <= 0 or buckets > settings.LEAD_STATS_MAX_BUCKETS:
+            return Response({'detail': f'The window must span 1 to {settings.LEAD_STATS_MAX_BUCKETS} buckets.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        recompute = request.query_params.get('recompute', '').lower() in ('1', 'true', 'yes')
+        if recompute and not request.user.is_staff:
+            return Response({'detail': 'Only staff can recompute stats.'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(intake_stats(start, end, bucket, recompute=recompute))
+
     def update(self, request, *args, **kwargs):
         return Response({'detail': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 